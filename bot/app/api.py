@@ -1,31 +1,100 @@
 ﻿from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+import random
+from dataclasses import dataclass, field
 from typing import Any
 
 import aiohttp
 
-from app.config import settings
+from app.config import Settings, settings
+
+# GETs are safe to repeat; writes are sent once so a retry can't duplicate an order.
+_RETRY_METHODS = {"GET", "HEAD"}
+_RETRY_STATUSES = {502, 503, 504}
+
+
+def build_session(cfg: Settings) -> aiohttp.ClientSession:
+    """Long-lived keep-alive session shared by every backend call."""
+    connector = aiohttp.TCPConnector(
+        limit=cfg.api_pool_limit,
+        keepalive_timeout=cfg.api_keepalive_timeout,
+        ttl_dns_cache=cfg.api_dns_cache_ttl,
+    )
+    timeout = aiohttp.ClientTimeout(total=cfg.api_timeout, connect=cfg.api_connect_timeout)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+class ApiError(RuntimeError):
+    def __init__(self, status: int, text: str) -> None:
+        super().__init__(f"API {status}: {text}")
+        self.status = status
 
 
 @dataclass
 class ApiClient:
     base_url: str
     bot_token: str
-
-    async def _request(self, method: str, path: str, **kwargs: Any) -> Any:
+    cfg: Settings = field(default_factory=lambda: settings, repr=False)
+    _session: aiohttp.ClientSession | None = field(default=None, init=False, repr=False)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = build_session(self.cfg)
+        return self._session
+
+    async def start(self) -> None:
+        _ = self.session
+
+    async def aclose(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: spread retries of concurrent handlers instead of syncing them up.
+        return random.uniform(0, self.cfg.api_retry_backoff * (2**attempt))
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        timeout: float | None = None,
+        with_headers: bool = False,
+        **kwargs: Any,
+    ) -> Any:
         url = f"{self.base_url}{path}"
         headers = kwargs.pop("headers", {})
         headers["X-Bot-Token"] = self.bot_token
-        async with aiohttp.ClientSession() as session:
-            async with session.request(method, url, headers=headers, **kwargs) as resp:
-                if resp.status >= 400:
-                    text = await resp.text()
-                    raise RuntimeError(f"API {resp.status}: {text}")
-                content_type = resp.headers.get("Content-Type", "")
-                if "application/json" in content_type:
-                    return await resp.json()
-                return await resp.read()
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout, connect=self.cfg.api_connect_timeout)
+        retries = self.cfg.api_get_retries if method.upper() in _RETRY_METHODS else 0
+        attempt = 0
+        while True:
+            try:
+                body, resp_headers = await self._send(method, url, headers, **kwargs)
+                return (body, resp_headers) if with_headers else body
+            except ApiError as exc:
+                if exc.status not in _RETRY_STATUSES or attempt >= retries:
+                    raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= retries:
+                    raise
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def _send(self, method: str, url: str, headers: dict, **kwargs: Any) -> tuple[Any, Any]:
+        async with self.session.request(method, url, headers=headers, **kwargs) as resp:
+            if resp.status >= 400:
+                text = await resp.text()
+                raise ApiError(resp.status, text)
+            if resp.status == 304:
+                return None, resp.headers
+            content_type = resp.headers.get("Content-Type", "")
+            if "application/json" in content_type:
+                return await resp.json(), resp.headers
+            return await resp.read(), resp.headers
 
     async def create_order(self, payload: dict) -> dict:
         return await self._request("POST", "/api/orders", json=payload)
@@ -46,17 +115,48 @@ class ApiClient:
             params={"date_from": date_from, "date_to": date_to},
         )
 
-    async def export_csv(self) -> bytes:
-        return await self._request("GET", "/api/reports/csv")
+    async def export_csv(self, params: dict | None = None) -> bytes:
+        return await self._request("GET", "/api/reports/csv", params=params or {}, timeout=120)
 
-    async def export_xlsx(self) -> bytes:
-        return await self._request("GET", "/api/reports/xlsx")
+    async def export_xlsx(self, params: dict | None = None) -> bytes:
+        return await self._request("GET", "/api/reports/xlsx", params=params or {}, timeout=120)
 
     async def get_company_settings(self) -> dict:
         return await self._request("GET", "/api/company-settings")
 
-    async def list_branches_public(self) -> list[dict]:
-        return await self._request("GET", "/api/branches/public")
+    async def list_branches_public(self, etag: str | None = None) -> tuple[list[dict] | None, str | None]:
+        """Return ``(branches, etag)``; ``branches`` is None when ``etag`` is still current."""
+        headers = {"If-None-Match": etag} if etag else {}
+        body, resp_headers = await self._request(
+            "GET", "/api/branches/public", headers=headers, with_headers=True
+        )
+        return body, resp_headers.get("ETag") or etag
+
+    async def claim_notifications(self, limit: int, wait: float = 0) -> list[dict]:
+        """Lease due customer notifications, long-polling up to ``wait`` seconds for new ones."""
+        return await self._request(
+            "POST",
+            "/api/notifications/claim",
+            params={"limit": limit, "wait": wait},
+            timeout=wait + self.cfg.api_timeout,
+        )
+
+    async def ack_notifications(self, sent: list[int], failed: list[dict]) -> dict:
+        return await self._request("POST", "/api/notifications/ack", json={"sent": sent, "failed": failed})
+
+    async def create_support_ticket(self, payload: dict) -> dict:
+        return await self._request("POST", "/api/support-tickets", json=payload)
+
+    async def get_support_ticket(self, ticket_id: int) -> dict:
+        return await self._request("GET", f"/api/support-tickets/{ticket_id}")
+
+    async def list_support_tickets(self, params: dict) -> tuple[list[dict], int]:
+        """Return ``(tickets, total)``; ``total`` counts every ticket matching the filters."""
+        body, resp_headers = await self._request("GET", "/api/support-tickets", params=params, with_headers=True)
+        return body, int(resp_headers.get("X-Total-Count") or len(body))
+
+    async def update_support_ticket(self, ticket_id: int, payload: dict) -> dict:
+        return await self._request("POST", f"/api/support-tickets/{ticket_id}/update", json=payload)
 
     async def list_support_staff(self) -> list[dict]:
         return await self._request("GET", "/api/support-staff")
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+from app.api import ApiClient, api
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+BRANCHES_FALLBACK = [
+    {
+        "id": 1,
+        "name": "Белореченская",
+        "address": "ул. Белореченская, 28, 1 этаж, салон связи МОТИВ (ТЦ GOODMART)",
+        "schedule": "09:00–21:00",
+        "lat": 56.8168,
+        "lon": 60.5625,
+    },
+    {
+        "id": 2,
+        "name": "Дирижабль",
+        "address": "ТЦ «Дирижабль», 1 этаж, салон связи МОТИВ (ул. Академика Шварца, 17)",
+        "schedule": "10:00–22:00",
+        "lat": 56.7969,
+        "lon": 60.6268,
+    },
+    {
+        "id": 3,
+        "name": "Титова",
+        "address": "ул. Титова, 26, салон связи МОТИВ",
+        "schedule": "09:00–20:00",
+        "lat": 56.7798,
+        "lon": 60.6096,
+    },
+]
+
+
+def _fill_coordinates(branches: list[dict]) -> list[dict]:
+    """Fill missing coordinates from the fallback list by branch name."""
+    fallback_map = {b["name"].strip().lower(): b for b in BRANCHES_FALLBACK}
+    for branch in branches:
+        if branch.get("lat") is not None and branch.get("lon") is not None:
+            continue
+        fb = fallback_map.get((branch.get("name") or "").strip().lower())
+        if fb:
+            branch["lat"] = fb.get("lat")
+            branch["lon"] = fb.get("lon")
+    return branches
+
+
+class BranchDirectory:
+    """Process-wide branch list shared by every chat.
+
+    Within ``ttl`` the cached list is returned as is. Up to ``stale_ttl`` past
+    that, the stale list is returned while one background task revalidates it
+    with ``If-None-Match``. Older than that, callers wait for the refresh. When
+    the backend is unreachable the last known list (or the fallback) is kept,
+    and no new request is made for ``retry_interval`` seconds.
+    """
+
+    def __init__(self, client: ApiClient, ttl: float, stale_ttl: float, retry_interval: float) -> None:
+        self.client = client
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.retry_interval = retry_interval
+        self._branches: list[dict] | None = None
+        self._by_id: dict[int, dict] = {}
+        self._etag: str | None = None
+        self._fetched_at = 0.0
+        self._retry_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task[None] | None = None
+
+    async def get(self) -> list[dict]:
+        age = time.monotonic() - self._fetched_at
+        if self._branches is not None and age < self.ttl:
+            return self._branches
+        if self._branches is not None and age < self.ttl + self.stale_ttl:
+            self._schedule_refresh()
+            return self._branches
+        if time.monotonic() < self._retry_at:
+            return self._branches or BRANCHES_FALLBACK
+        await self.refresh()
+        return self._branches or BRANCHES_FALLBACK
+
+    async def get_by_id(self, branch_id: int | None) -> dict | None:
+        if branch_id is None:
+            return None
+        await self.get()
+        if self._by_id:
+            return self._by_id.get(int(branch_id))
+        return next((b for b in BRANCHES_FALLBACK if b["id"] == branch_id), None)
+
+    def _schedule_refresh(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh())
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            # Another caller may have refreshed while this one waited for the lock.
+            if self._branches is not None and time.monotonic() - self._fetched_at < self.ttl:
+                return
+            # A refresh that just failed is not repeated by every caller queued behind it.
+            if time.monotonic() < self._retry_at:
+                return
+            try:
+                data, etag = await self.client.list_branches_public(self._etag if self._branches else None)
+            except Exception:
+                logger.warning("Branch directory refresh failed", exc_info=True)
+                self._retry_at = time.monotonic() + self.retry_interval
+                return
+            if data is not None:
+                if not isinstance(data, list) or not data:
+                    logger.warning("Branch directory refresh returned no branches")
+                    self._retry_at = time.monotonic() + self.retry_interval
+                    return
+                self._branches = _fill_coordinates(data)
+                self._by_id = {int(b["id"]): b for b in self._branches if b.get("id") is not None}
+            self._etag = etag
+            self._fetched_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        self._fetched_at = 0.0
+        self._retry_at = 0.0
+
+
+branch_directory = BranchDirectory(
+    api, settings.branches_cache_ttl, settings.branches_stale_ttl, settings.branches_retry_interval
+)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Message
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, bursts up to ``capacity``.
+
+    ``acquire`` reserves a token before sleeping, so concurrent callers queue up
+    behind each other instead of all waking at once.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller for ``seconds`` (Telegram flood control)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens < 0:
+                await asyncio.sleep(-self._tokens / self.rate)
+                # A pause may have started while this caller was queued.
+                remaining = self._paused_until - time.monotonic()
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+            return
+
+
+@dataclass
+class BroadcastReport:
+    delivered: list[int] = field(default_factory=list)
+    failed: dict[int, str] = field(default_factory=dict)
+
+
+class BroadcastScheduler:
+    """Sends Telegram messages within the bot-wide and per-chat limits.
+
+    Every send takes a token from a shared bucket (about 30 messages per second
+    are allowed per bot) and keeps ``chat_interval`` seconds between messages
+    to the same chat. ``RetryAfter`` pauses the whole bucket and the message is
+    retried up to ``retries`` times. ``broadcast`` fans one message out
+    concurrently, so a slow or blocked recipient does not hold up the rest;
+    ``broadcast_later`` runs it as a tracked task, so it does not hold up the
+    handler either.
+    """
+
+    def __init__(self, rate: float, burst: float, chat_interval: float, concurrency: int, retries: int) -> None:
+        self.bucket = TokenBucket(rate, burst)
+        self.chat_interval = chat_interval
+        self.concurrency = concurrency
+        self.retries = retries
+        self.failed_total = 0
+        self._chat_next_at: dict[int, float] = {}
+        self._background: set[asyncio.Task[BroadcastReport]] = set()
+
+    async def _chat_slot(self, chat_id: int) -> None:
+        now = time.monotonic()
+        ready_at = max(now, self._chat_next_at.get(chat_id, 0.0))
+        self._chat_next_at[chat_id] = ready_at + self.chat_interval
+        if len(self._chat_next_at) > 1000:
+            self._chat_next_at = {k: v for k, v in self._chat_next_at.items() if v > now}
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+    async def send(self, bot: Bot, chat_id: int, text: str, retries: int | None = None, **kwargs: Any) -> Message:
+        """Send one message under the rate limits; the last error is re-raised."""
+        retries = self.retries if retries is None else retries
+        attempt = 0
+        while True:
+            await self._chat_slot(chat_id)
+            await self.bucket.acquire()
+            try:
+                return await bot.send_message(chat_id, text, **kwargs)
+            except TelegramRetryAfter as exc:
+                self.bucket.pause(exc.retry_after)
+                if attempt >= retries:
+                    raise
+            attempt += 1
+
+    async def broadcast(self, bot: Bot, chat_ids: Iterable[int], text: str, **kwargs: Any) -> BroadcastReport:
+        report = BroadcastReport()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(chat_id: int) -> None:
+            async with semaphore:
+                try:
+                    await self.send(bot, chat_id, text, **kwargs)
+                except Exception as exc:
+                    report.failed[chat_id] = str(exc) or exc.__class__.__name__
+                else:
+                    report.delivered.append(chat_id)
+
+        await asyncio.gather(*(deliver(chat_id) for chat_id in dict.fromkeys(chat_ids)))
+        if report.failed:
+            self.failed_total += len(report.failed)
+            logger.warning(
+                "Broadcast failed for %d of %d chats: %s",
+                len(report.failed),
+                len(report.failed) + len(report.delivered),
+                report.failed,
+            )
+        return report
+
+    def broadcast_later(
+        self, bot: Bot, chat_ids: Iterable[int], text: str, **kwargs: Any
+    ) -> asyncio.Task[BroadcastReport]:
+        """Start ``broadcast`` in the background; ``drain`` waits for every such task."""
+        task = asyncio.create_task(self.broadcast(bot, list(chat_ids), text, **kwargs))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def drain(self) -> None:
+        while self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+
+broadcaster = BroadcastScheduler(
+    settings.broadcast_rate,
+    settings.broadcast_burst,
+    settings.broadcast_chat_interval,
+    settings.broadcast_concurrency,
+    settings.broadcast_retries,
+)
@@ -18,6 +18,14 @@ def _parse_admin_ids(raw: str | None) -> set[int]:
     return {int(x.strip()) for x in raw.split(",") if x.strip().isdigit()}
 
 
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
 @dataclass
 class Settings:
     bot_token: str
@@ -32,6 +40,26 @@ class Settings:
     company_ogrn: str
     company_address: str
     company_phone: str
+    api_connect_timeout: float
+    api_timeout: float
+    api_pool_limit: int
+    api_keepalive_timeout: float
+    api_dns_cache_ttl: int
+    api_get_retries: int
+    api_retry_backoff: float
+    branches_cache_ttl: float
+    branches_stale_ttl: float
+    branches_retry_interval: float
+    notify_batch_size: int
+    notify_wait: float
+    broadcast_rate: float
+    broadcast_burst: float
+    broadcast_chat_interval: float
+    broadcast_concurrency: int
+    broadcast_retries: int
+    tickets_cache_size: int
+    tickets_cache_ttl: float
+    tickets_page_size: int
 
 
 settings = Settings(
@@ -47,4 +75,24 @@ settings = Settings(
     company_ogrn=os.getenv("COMPANY_OGRN", ""),
     company_address=os.getenv("COMPANY_ADDRESS", ""),
     company_phone=os.getenv("COMPANY_PHONE", ""),
+    api_connect_timeout=_env_float("API_CONNECT_TIMEOUT", 5),
+    api_timeout=_env_float("API_TIMEOUT", 20),
+    api_pool_limit=_env_int("API_POOL_LIMIT", 20),
+    api_keepalive_timeout=_env_float("API_KEEPALIVE_TIMEOUT", 30),
+    api_dns_cache_ttl=_env_int("API_DNS_CACHE_TTL", 300),
+    api_get_retries=_env_int("API_GET_RETRIES", 2),
+    api_retry_backoff=_env_float("API_RETRY_BACKOFF", 0.2),
+    branches_cache_ttl=_env_float("BRANCHES_CACHE_TTL", 300),
+    branches_stale_ttl=_env_float("BRANCHES_STALE_TTL", 3600),
+    branches_retry_interval=_env_float("BRANCHES_RETRY_INTERVAL", 30),
+    notify_batch_size=_env_int("NOTIFY_BATCH_SIZE", 50),
+    notify_wait=_env_float("NOTIFY_WAIT", 25),
+    broadcast_rate=_env_float("BROADCAST_RATE", 25),
+    broadcast_burst=_env_float("BROADCAST_BURST", 5),
+    broadcast_chat_interval=_env_float("BROADCAST_CHAT_INTERVAL", 1),
+    broadcast_concurrency=_env_int("BROADCAST_CONCURRENCY", 10),
+    broadcast_retries=_env_int("BROADCAST_RETRIES", 2),
+    tickets_cache_size=_env_int("TICKETS_CACHE_SIZE", 256),
+    tickets_cache_ttl=_env_float("TICKETS_CACHE_TTL", 30),
+    tickets_page_size=_env_int("TICKETS_PAGE_SIZE", 8),
 )
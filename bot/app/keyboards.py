@@ -221,6 +221,27 @@ def confirm_menu() -> ReplyKeyboardMarkup:
     )
 
 
+TICKET_STATUS_ICONS = {"open": "🆕", "in_progress": "🔧", "closed": "✅"}
+
+
+def ticket_inbox_menu(tickets: list[dict], offset: int, page_size: int, total: int) -> InlineKeyboardMarkup:
+    """One button per ticket plus prev/next buttons that page through the inbox in place."""
+    rows = []
+    for t in tickets:
+        icon = TICKET_STATUS_ICONS.get(t.get("status"), "")
+        name = (t.get("user_name") or str(t.get("user_id")))[:24]
+        rows.append([_ikb(text=f"{icon} #{t['id']} · {name}", callback_data=f"inbox:open:{t['id']}:{offset}")])
+    pages = max(1, -(-total // page_size))
+    nav = []
+    if offset > 0:
+        nav.append(_ikb(text="◀️", callback_data=f"inbox:page:{max(0, offset - page_size)}"))
+    nav.append(_ikb(text=f"{offset // page_size + 1}/{pages}", callback_data=f"inbox:page:{offset}"))
+    if offset + page_size < total:
+        nav.append(_ikb(text="▶️", callback_data=f"inbox:page:{offset + page_size}"))
+    rows.append(nav)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
 def map_links(lat: float | None = None, lon: float | None = None, address: str | None = None) -> InlineKeyboardMarkup:
     if lat is not None and lon is not None:
         two_gis = f"https://2gis.ru/ekaterinburg?m={lon},{lat}/17"
@@ -1,4 +1,5 @@
 ﻿import asyncio
+import html
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
@@ -10,8 +11,12 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Message, ReplyKeyboardRemove
 from aiogram.types.input_file import BufferedInputFile
 
-from app.api import api
+from app.api import ApiError, api
+from app.branches import branch_directory
+from app.broadcast import broadcaster
 from app.config import settings
+from app.notifications import status_notifier
+from app.tickets import ticket_store
 from app.keyboards import (
     admin_menu,
     add_staff_menu,
@@ -22,6 +27,7 @@ from app.keyboards import (
     issues_menu,
     main_menu,
     map_links,
+    ticket_inbox_menu,
 )
 
 
@@ -33,8 +39,6 @@ def is_staff(user_id: int | None) -> bool:
     return bool(user_id and (user_id in settings.admin_ids or user_id in STAFF_IDS))
 
 
-SUPPORT_TICKETS: dict[int, dict] = {}
-SUPPORT_COUNTER = 0
 STAFF_IDS = set(settings.support_staff_ids)
 
 
@@ -47,44 +51,17 @@ async def _refresh_staff_ids():
         STAFF_IDS = set(settings.support_staff_ids)
 
 
-def _support_ticket_kb(ticket_id: int):
+def _support_ticket_kb(ticket_id: int, inbox_offset: int | None = None):
     from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="✅ Взять", callback_data=f"ticket:take:{ticket_id}")],
-            [InlineKeyboardButton(text="💬 Ответить", callback_data=f"ticket:reply:{ticket_id}")],
-            [InlineKeyboardButton(text="✅ Закрыть", callback_data=f"ticket:close:{ticket_id}")],
-        ]
-    )
-
-
-BRANCHES_FALLBACK = [
-    {
-        "id": 1,
-        "name": "Белореченская",
-        "address": "ул. Белореченская, 28, 1 этаж, салон связи МОТИВ (ТЦ GOODMART)",
-        "schedule": "09:00–21:00",
-        "lat": 56.8168,
-        "lon": 60.5625,
-    },
-    {
-        "id": 2,
-        "name": "Дирижабль",
-        "address": "ТЦ «Дирижабль», 1 этаж, салон связи МОТИВ (ул. Академика Шварца, 17)",
-        "schedule": "10:00–22:00",
-        "lat": 56.7969,
-        "lon": 60.6268,
-    },
-    {
-        "id": 3,
-        "name": "Титова",
-        "address": "ул. Титова, 26, салон связи МОТИВ",
-        "schedule": "09:00–20:00",
-        "lat": 56.7798,
-        "lon": 60.6096,
-    },
-]
+    rows = [
+        [InlineKeyboardButton(text="✅ Взять", callback_data=f"ticket:take:{ticket_id}")],
+        [InlineKeyboardButton(text="💬 Ответить", callback_data=f"ticket:reply:{ticket_id}")],
+        [InlineKeyboardButton(text="✅ Закрыть", callback_data=f"ticket:close:{ticket_id}")],
+    ]
+    if inbox_offset is not None:
+        rows.append([InlineKeyboardButton(text="⬅️ К списку", callback_data=f"inbox:page:{inbox_offset}")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
 def _parse_branch_index(text: str) -> int | None:
@@ -112,23 +89,7 @@ def _resolve_branch_by_text(text: str, branches: list[dict]) -> dict | None:
 
 
 async def _load_branches() -> list[dict]:
-    try:
-        data = await api.list_branches_public()
-        if isinstance(data, list) and data:
-            # Fill missing coordinates from fallback by name.
-            fallback_map = {b["name"].strip().lower(): b for b in BRANCHES_FALLBACK}
-            for branch in data:
-                if branch.get("lat") is not None and branch.get("lon") is not None:
-                    continue
-                name = (branch.get("name") or "").strip().lower()
-                fb = fallback_map.get(name)
-                if fb:
-                    branch["lat"] = fb.get("lat")
-                    branch["lon"] = fb.get("lon")
-            return data
-    except Exception:
-        pass
-    return BRANCHES_FALLBACK
+    return await branch_directory.get()
 
 
 async def _cleanup_user_message(message: Message):
@@ -287,7 +248,6 @@ async def _set_contact_from_message(message: Message, state: FSMContext):
     phone = message.contact.phone_number or ""
     await state.update_data(client_name=name.strip() or "Клиент", client_phone=phone)
     branches = await _load_branches()
-    await state.update_data(branches=branches)
     await state.set_state(OrderStates.branch)
     await _send_step(message, state, "Выберите филиал:", reply_markup=branches_menu(branches))
 
@@ -307,7 +267,6 @@ async def manual_name_entered(message: Message, state: FSMContext):
 async def manual_phone_entered(message: Message, state: FSMContext):
     await state.update_data(client_phone=message.text)
     branches = await _load_branches()
-    await state.update_data(branches=branches)
     await state.set_state(OrderStates.branch)
     await _send_step(message, state, "Выберите филиал:", reply_markup=branches_menu(branches))
     await _cleanup_user_message(message)
@@ -325,18 +284,13 @@ async def branch_selected(message: Message, state: FSMContext):
         await _cleanup_user_message(message)
         return
 
-    data = await state.get_data()
-    branches = data.get("branches") or await _load_branches()
+    branches = await _load_branches()
     branch = _resolve_branch_by_text(text, branches)
     if not branch:
         await _send_step(message, state, "Выберите филиал кнопкой ниже:", reply_markup=branches_menu(branches))
         await _cleanup_user_message(message)
         return
-    await state.update_data(
-        branch_id=branch.get("id"),
-        branch_name=branch.get("name"),
-        branch_address=branch.get("address"),
-    )
+    await state.update_data(branch_id=branch.get("id"))
 
     lat = branch.get("lat")
     lon = branch.get("lon")
@@ -352,6 +306,7 @@ async def branch_selected(message: Message, state: FSMContext):
 
 async def send_confirmation(message: Message, state: FSMContext):
     data = await state.get_data()
+    branch = await branch_directory.get_by_id(data.get("branch_id")) or {}
     device_map = {"phone": "Смартфон", "laptop": "Ноутбук", "tablet": "Планшет"}
     text = (
         "Проверьте данные заявки:\n\n"
@@ -359,8 +314,8 @@ async def send_confirmation(message: Message, state: FSMContext):
         f"Модель: {data['model']}\n"
         f"Проблема: {data['problem_description']}\n"
         f"Контакт: {data['client_name']} / {data['client_phone']}\n"
-        f"Филиал: {data.get('branch_name', '')}\n"
-        f"Адрес: {data.get('branch_address', '')}\n\n"
+        f"Филиал: {branch.get('name', '')}\n"
+        f"Адрес: {branch.get('address', '')}\n\n"
         "Подтверждаете?"
     )
     await state.set_state(OrderStates.confirm)
@@ -397,7 +352,7 @@ async def confirm(message: Message, state: FSMContext):
 
     if text == "🔄 Исправить" or text == "⬅️ Назад":
         await state.set_state(OrderStates.branch)
-        branches = data.get("branches") or await _load_branches()
+        branches = await _load_branches()
         await _send_step(message, state, "Выберите филиал:", reply_markup=branches_menu(branches))
         await _cleanup_user_message(message)
         return
@@ -430,7 +385,7 @@ async def status_number_entered(message: Message, state: FSMContext):
 async def my_orders(message: Message, state: FSMContext):
     await state.clear()
     try:
-        orders = await api.list_orders({"client_telegram": str(message.from_user.id)})
+        orders = await api.list_orders({"client_telegram": str(message.from_user.id), "fields": "number,status"})
         if not orders:
             await message.answer("У вас пока нет заявок.")
             return
@@ -468,7 +423,6 @@ async def show_service_info(message: Message):
 
 async def show_addresses(message: Message, state: FSMContext):
     branches = await _load_branches()
-    await state.update_data(branches=branches)
     await state.set_state(AddressStates.branch)
     await message.answer("Выберите филиал, чтобы получить карту:", reply_markup=branches_menu(branches))
 
@@ -480,8 +434,7 @@ async def address_branch_selected(message: Message, state: FSMContext):
         await message.answer("Главное меню:", reply_markup=main_menu(is_admin(message.from_user.id), is_staff(message.from_user.id)))
         return
 
-    data = await state.get_data()
-    branches = data.get("branches") or await _load_branches()
+    branches = await _load_branches()
     branch = _resolve_branch_by_text(text, branches)
     if not branch:
         await message.answer("Выберите филиал кнопкой ниже:", reply_markup=branches_menu(branches))
@@ -510,29 +463,22 @@ async def support_start(message: Message, state: FSMContext):
 
 async def support_message(message: Message, state: FSMContext):
     text = message.text or ""
-    global SUPPORT_COUNTER
-    SUPPORT_COUNTER += 1
-    ticket_id = SUPPORT_COUNTER
-    SUPPORT_TICKETS[ticket_id] = {
-        "id": ticket_id,
-        "user_id": message.from_user.id,
-        "user_name": message.from_user.full_name or "",
-        "text": text,
-        "status": "open",
-        "assignee_id": None,
-    }
+    try:
+        ticket = await ticket_store.create(message.from_user.id, message.from_user.full_name or "", text)
+    except Exception as exc:
+        await message.answer(f"Не удалось отправить обращение: {exc}")
+        return
+    ticket_id = ticket["id"]
     notify_ids = set(settings.admin_ids) | set(STAFF_IDS)
-    for admin_id in notify_ids:
-        try:
-            await message.bot.send_message(
-                admin_id,
-                f"🆘 Обращение #{ticket_id}\n"
-                f"От: {message.from_user.full_name} (id {message.from_user.id})\n"
-                f"Текст: {text}",
-                reply_markup=_support_ticket_kb(ticket_id),
-            )
-        except Exception:
-            pass
+    # Staff alerts can wait out flood control; the customer's confirmation should not.
+    broadcaster.broadcast_later(
+        message.bot,
+        notify_ids,
+        f"🆘 Обращение #{ticket_id}\n"
+        f"От: {message.from_user.full_name} (id {message.from_user.id})\n"
+        f"Текст: {text}",
+        reply_markup=_support_ticket_kb(ticket_id),
+    )
     await state.clear()
     await message.answer(
         f"Обращение #{ticket_id} отправлено. Мы скоро ответим.",
@@ -553,36 +499,49 @@ async def support_ticket_action(call: CallbackQuery, state: FSMContext):
     except ValueError:
         await call.answer("Неверный тикет", show_alert=True)
         return
-    ticket = SUPPORT_TICKETS.get(ticket_id)
+    try:
+        ticket = await ticket_store.get(ticket_id)
+    except Exception as exc:
+        await call.answer(f"Ошибка: {exc}", show_alert=True)
+        return
     if not ticket:
         await call.answer("Тикет не найден", show_alert=True)
         return
 
     if action == "take":
-        if ticket["assignee_id"] and ticket["assignee_id"] != call.from_user.id:
-            await call.answer("Тикет уже взят", show_alert=True)
+        try:
+            ticket = await ticket_store.update(ticket_id, status="in_progress", assignee_id=call.from_user.id)
+        except ApiError as exc:
+            text = "Тикет уже взят" if exc.status == 409 else f"Ошибка: {exc}"
+            await call.answer(text, show_alert=True)
+            return
+        except Exception as exc:
+            await call.answer(f"Ошибка: {exc}", show_alert=True)
             return
-        ticket["assignee_id"] = call.from_user.id
-        ticket["status"] = "in_progress"
         await call.answer("Вы взяли обращение")
         try:
             await call.message.edit_text(
                 call.message.text + f"\n\nНазначен: {call.from_user.full_name} (id {call.from_user.id})",
-                reply_markup=_support_ticket_kb(ticket_id),
+                reply_markup=call.message.reply_markup or _support_ticket_kb(ticket_id),
             )
         except Exception:
             pass
         try:
-            await call.bot.send_message(ticket["user_id"], f"Ваше обращение #{ticket_id} принято в работу.")
+            await broadcaster.send(call.bot, ticket["user_id"], f"Ваше обращение #{ticket_id} принято в работу.")
         except Exception:
             pass
         return
 
     if action == "reply":
-        if ticket["assignee_id"] and ticket["assignee_id"] != call.from_user.id:
-            await call.answer("Тикет уже у другого сотрудника", show_alert=True)
+        try:
+            await ticket_store.update(ticket_id, assignee_id=call.from_user.id)
+        except ApiError as exc:
+            text = "Тикет уже у другого сотрудника" if exc.status == 409 else f"Ошибка: {exc}"
+            await call.answer(text, show_alert=True)
+            return
+        except Exception as exc:
+            await call.answer(f"Ошибка: {exc}", show_alert=True)
             return
-        ticket["assignee_id"] = call.from_user.id
         await state.set_state(SupportStaffStates.reply)
         await state.update_data(ticket_id=ticket_id)
         await call.answer("Введите ответ")
@@ -590,7 +549,11 @@ async def support_ticket_action(call: CallbackQuery, state: FSMContext):
         return
 
     if action == "close":
-        ticket["status"] = "closed"
+        try:
+            ticket = await ticket_store.update(ticket_id, status="closed")
+        except Exception as exc:
+            await call.answer(f"Ошибка: {exc}", show_alert=True)
+            return
         await call.answer("Обращение закрыто")
         try:
             await call.message.edit_text(
@@ -600,7 +563,7 @@ async def support_ticket_action(call: CallbackQuery, state: FSMContext):
         except Exception:
             pass
         try:
-            await call.bot.send_message(ticket["user_id"], f"Ваше обращение #{ticket_id} закрыто.")
+            await broadcaster.send(call.bot, ticket["user_id"], f"Ваше обращение #{ticket_id} закрыто.")
         except Exception:
             pass
         return
@@ -609,7 +572,12 @@ async def support_ticket_action(call: CallbackQuery, state: FSMContext):
 async def support_staff_reply(message: Message, state: FSMContext):
     data = await state.get_data()
     ticket_id = data.get("ticket_id")
-    ticket = SUPPORT_TICKETS.get(ticket_id)
+    try:
+        ticket = await ticket_store.get(int(ticket_id)) if ticket_id else None
+    except Exception as exc:
+        # Keep the reply state so the same text can be sent again once the backend is back.
+        await message.answer(f"Не удалось загрузить тикет: {exc}. Отправьте ответ ещё раз.")
+        return
     if not ticket:
         await message.answer("Тикет не найден.")
         await state.clear()
@@ -621,7 +589,8 @@ async def support_staff_reply(message: Message, state: FSMContext):
 
     reply_text = message.text or ""
     try:
-        await message.bot.send_message(
+        await broadcaster.send(
+            message.bot,
             ticket["user_id"],
             f"Ответ по обращению #{ticket_id}:\n{reply_text}",
         )
@@ -631,22 +600,85 @@ async def support_staff_reply(message: Message, state: FSMContext):
     await state.clear()
 
 
+def _inbox_page_text(tickets: list[dict], total: int) -> str:
+    lines = [f"🎧 Активных обращений: {total}", ""]
+    for t in tickets:
+        preview = (t.get("text") or "").replace("\n", " ")
+        if len(preview) > 60:
+            preview = preview[:60] + "…"
+        lines.append(f"#{t['id']} {html.escape(t.get('user_name') or '')}: {html.escape(preview)}")
+    return "\n".join(lines)
+
+
+def _ticket_text(ticket: dict) -> str:
+    return (
+        f"🆘 Обращение #{ticket['id']}\n"
+        f"От: {html.escape(ticket.get('user_name') or '')} (id {ticket['user_id']})\n"
+        f"Текст: {html.escape(ticket.get('text') or '')}\n"
+        f"Статус: {ticket['status']}"
+    )
+
+
 async def staff_tickets(message: Message, state: FSMContext):
     if not is_staff(message.from_user.id):
         return
-    open_tickets = [t for t in SUPPORT_TICKETS.values() if t["status"] != "closed"]
-    if not open_tickets:
+    page_size = settings.tickets_page_size
+    try:
+        tickets, total = await ticket_store.page_active(0, page_size)
+    except Exception as exc:
+        await message.answer(f"Ошибка: {exc}")
+        return
+    if not total:
         await message.answer("Активных обращений нет.")
         return
-    await message.answer(f"Активных обращений: {len(open_tickets)}")
-    for t in open_tickets:
-        await message.answer(
-            f"🆘 Обращение #{t['id']}\n"
-            f"От: {t['user_name']} (id {t['user_id']})\n"
-            f"Текст: {t['text']}\n"
-            f"Статус: {t['status']}",
-            reply_markup=_support_ticket_kb(t["id"]),
-        )
+    await message.answer(_inbox_page_text(tickets, total), reply_markup=ticket_inbox_menu(tickets, 0, page_size, total))
+
+
+async def staff_inbox_action(call: CallbackQuery):
+    """Page through the inbox or open a ticket by editing the inbox message in place."""
+    data = (call.data or "").split(":")
+    if len(data) < 3 or data[0] != "inbox":
+        return
+    if not is_staff(call.from_user.id):
+        await call.answer("Недостаточно прав", show_alert=True)
+        return
+    page_size = settings.tickets_page_size
+    try:
+        if data[1] == "open" and len(data) == 4:
+            ticket_id = int(data[2])
+            try:
+                ticket = await ticket_store.get(ticket_id)
+            except Exception as exc:
+                await call.answer(f"Ошибка: {exc}", show_alert=True)
+                return
+            if not ticket:
+                await call.answer("Тикет не найден", show_alert=True)
+                return
+            await call.message.edit_text(
+                _ticket_text(ticket),
+                reply_markup=_support_ticket_kb(ticket["id"], inbox_offset=int(data[3])),
+            )
+        elif data[1] == "page":
+            offset = max(0, int(data[2]))
+            tickets, total = await ticket_store.page_active(offset, page_size)
+            if not tickets and offset:
+                # The page emptied out since it was shown; fall back to the last one.
+                offset = max(0, (total - 1) // page_size * page_size)
+                tickets, total = await ticket_store.page_active(offset, page_size)
+            if not total:
+                await call.message.edit_text("Активных обращений нет.", reply_markup=None)
+            else:
+                await call.message.edit_text(
+                    _inbox_page_text(tickets, total),
+                    reply_markup=ticket_inbox_menu(tickets, offset, page_size, total),
+                )
+    except ValueError:
+        await call.answer("Неверная страница", show_alert=True)
+        return
+    except Exception:
+        # "message is not modified" and similar edit races are harmless here.
+        pass
+    await call.answer()
 
 
 async def add_staff_start(message: Message, state: FSMContext):
@@ -695,7 +727,8 @@ async def add_staff_contact(message: Message, state: FSMContext):
         except Exception:
             pass
         try:
-            await message.bot.send_message(
+            await broadcaster.send(
+                message.bot,
                 message.contact.user_id,
                 "Вы добавлены как сотрудник поддержки. Меню обновлено.",
                 reply_markup=main_menu(False, True),
@@ -729,7 +762,8 @@ async def add_staff_id(message: Message, state: FSMContext):
     except Exception:
         pass
     try:
-        await message.bot.send_message(
+        await broadcaster.send(
+            message.bot,
             int(text),
             "Вы добавлены как сотрудник поддержки. Меню обновлено.",
             reply_markup=main_menu(False, True),
@@ -804,7 +838,9 @@ async def admin_xlsx(message: Message):
 
 
 async def main():
+    await api.start()
     await _refresh_staff_ids()
+    await branch_directory.refresh()
     bot = Bot(token=settings.bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
     dp = Dispatcher()
 
@@ -838,6 +874,7 @@ async def main():
     dp.message.register(add_staff_contact, SupportStaffStates.add)
     dp.message.register(add_staff_id, SupportStaffStates.add_id)
     dp.callback_query.register(support_ticket_action, F.data.startswith("ticket:"))
+    dp.callback_query.register(staff_inbox_action, F.data.startswith("inbox:"))
 
     dp.message.register(admin_panel, F.text == "🛠 Админ‑панель")
     dp.message.register(admin_summary_today, F.text == "📊 Сводка (сегодня)")
@@ -847,7 +884,13 @@ async def main():
     dp.message.register(admin_xlsx, F.text == "⬇️ Скачать Excel")
     dp.message.register(admin_back, F.text == "⬅️ Назад")
 
-    await dp.start_polling(bot)
+    status_notifier.start(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await status_notifier.stop()
+        await broadcaster.drain()
+        await api.aclose()
 
 
 if __name__ == "__main__":
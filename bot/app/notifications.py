@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import html
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from app.api import ApiClient, api
+from app.broadcast import BroadcastScheduler, broadcaster
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# pixel-backend rejects the whole ack (422) if any NotificationFailure.error is longer.
+MAX_ERROR_LENGTH = 1000
+
+
+def _error_text(exc: Exception) -> str:
+    return (str(exc) or exc.__class__.__name__)[:MAX_ERROR_LENGTH]
+
+
+def format_status_message(payload: dict) -> str:
+    number = html.escape(str(payload.get("number") or ""))
+    status = html.escape(str(payload.get("status") or ""))
+    text = f"📦 Статус заявки {number} изменён: <b>{status}</b>"
+    if payload.get("model"):
+        text += f"\nМодель: {html.escape(str(payload['model']))}"
+    return text
+
+
+class StatusNotifier:
+    """Sends queued order-status notifications from the backend to customers.
+
+    Claims batches with a long poll, sends them through the shared broadcast
+    scheduler and acknowledges the batch, so failures are retried (or dropped
+    when the chat is gone) by the backend rather than here.
+    """
+
+    def __init__(self, client: ApiClient, scheduler: BroadcastScheduler, batch_size: int, wait: float) -> None:
+        self.client = client
+        self.scheduler = scheduler
+        self.batch_size = batch_size
+        self.wait = wait
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self, bot: Bot) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(bot))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self, bot: Bot) -> None:
+        while True:
+            try:
+                claimed = await self.client.claim_notifications(self.batch_size, self.wait)
+            except Exception:
+                logger.warning("Claiming notifications failed", exc_info=True)
+                await asyncio.sleep(5)
+                continue
+            if claimed:
+                await self.deliver(bot, claimed)
+
+    async def deliver(self, bot: Bot, notifications: list[dict]) -> None:
+        sent: list[int] = []
+        failed: list[dict] = []
+        semaphore = asyncio.Semaphore(self.scheduler.concurrency)
+
+        async def send(notification: dict) -> None:
+            chat_id = int(notification["chat_id"])
+            async with semaphore:
+                try:
+                    # The backend reschedules flood-controlled rows, so no local retries.
+                    await self.scheduler.send(bot, chat_id, format_status_message(notification["payload"]), retries=0)
+                except TelegramRetryAfter as exc:
+                    failed.append({"id": notification["id"], "error": _error_text(exc), "retry_after": exc.retry_after})
+                except (TelegramForbiddenError, TelegramBadRequest) as exc:
+                    failed.append({"id": notification["id"], "error": _error_text(exc), "permanent": True})
+                except Exception as exc:
+                    failed.append({"id": notification["id"], "error": _error_text(exc)})
+                else:
+                    sent.append(notification["id"])
+
+        await asyncio.gather(*(send(n) for n in notifications))
+        try:
+            await self.client.ack_notifications(sent, failed)
+        except Exception:
+            # Unacknowledged rows come back after their lease; a resend beats a lost update.
+            logger.warning("Acknowledging notifications failed", exc_info=True)
+
+
+status_notifier = StatusNotifier(api, broadcaster, settings.notify_batch_size, settings.notify_wait)
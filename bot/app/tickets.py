@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+
+from app.api import ApiClient, ApiError, api
+from app.config import settings
+
+
+class TicketStore:
+    """Support tickets stored in the backend, with a small write-through cache.
+
+    Every create and update goes to the backend first and the returned ticket is
+    cached, so a button press on a recent ticket needs no extra lookup. Cached
+    tickets expire after ``ttl`` seconds because other bot instances may change
+    them; claims are checked by the backend, not against the cache.
+    """
+
+    def __init__(self, client: ApiClient, size: int, ttl: float) -> None:
+        self.client = client
+        self.size = size
+        self.ttl = ttl
+        self._cache: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+
+    def _remember(self, ticket: dict) -> dict:
+        ticket_id = int(ticket["id"])
+        self._cache[ticket_id] = (time.monotonic(), ticket)
+        self._cache.move_to_end(ticket_id)
+        while len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+        return ticket
+
+    def invalidate(self, ticket_id: int) -> None:
+        self._cache.pop(ticket_id, None)
+
+    async def create(self, user_id: int, user_name: str, text: str) -> dict:
+        ticket = await self.client.create_support_ticket({"user_id": user_id, "user_name": user_name, "text": text})
+        return self._remember(ticket)
+
+    async def get(self, ticket_id: int) -> dict | None:
+        """The ticket, or None if the backend has no such ticket; other errors are raised."""
+        cached = self._cache.get(ticket_id)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+        try:
+            ticket = await self.client.get_support_ticket(ticket_id)
+        except ApiError as exc:
+            self.invalidate(ticket_id)
+            if exc.status == 404:
+                return None
+            raise
+        except Exception:
+            self.invalidate(ticket_id)
+            raise
+        return self._remember(ticket)
+
+    async def update(self, ticket_id: int, **changes: object) -> dict:
+        """Apply ``changes``; raises ``ApiError`` (409 when someone else holds the ticket)."""
+        try:
+            ticket = await self.client.update_support_ticket(ticket_id, changes)
+        except Exception:
+            self.invalidate(ticket_id)
+            raise
+        return self._remember(ticket)
+
+    async def page_active(self, offset: int, limit: int) -> tuple[list[dict], int]:
+        """One inbox page of unclosed tickets, oldest first, and the total count."""
+        tickets, total = await self.client.list_support_tickets(
+            {"status": "active", "offset": offset, "limit": limit}
+        )
+        for ticket in tickets:
+            self._remember(ticket)
+        return tickets, total
+
+
+ticket_store = TicketStore(api, settings.tickets_cache_size, settings.tickets_cache_ttl)
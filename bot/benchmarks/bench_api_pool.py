@@ -0,0 +1,82 @@
+"""Connection reuse and latency of the bot's shared backend session.
+
+"per-call" closes the session after every ApiClient call, which is what the old
+``async with aiohttp.ClientSession()`` block did; "shared" keeps one pooled
+session for the whole run. The call mix mirrors an order flow: branch lookups,
+a staff refresh and a status check.
+
+Run from bot/:  python -m benchmarks.bench_api_pool [--calls 600] [--concurrency 10]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.api import ApiClient
+from app.config import settings
+from benchmarks.stub_backend import StubBackend
+
+
+async def _call(api: ApiClient, idx: int) -> None:
+    step = idx % 4
+    if step in (0, 1):
+        await api.list_branches_public()
+    elif step == 2:
+        await api.list_support_staff()
+    else:
+        await api.get_order(f"PIX-202602-{idx:04d}")
+
+
+async def _run(api: ApiClient, calls: int, concurrency: int, per_call: bool) -> tuple[float, list[float]]:
+    latencies: list[float] = []
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for idx in range(calls):
+        queue.put_nowait(idx)
+
+    async def worker(client: ApiClient) -> None:
+        while not queue.empty():
+            idx = queue.get_nowait()
+            started = time.perf_counter()
+            await _call(client, idx)
+            latencies.append(time.perf_counter() - started)
+            if per_call:
+                await client.aclose()
+
+    started = time.perf_counter()
+    if per_call:
+        # One client per worker so closing a session never cuts off another worker's call.
+        clients = [ApiClient(api.base_url, api.bot_token) for _ in range(concurrency)]
+        await asyncio.gather(*(worker(c) for c in clients))
+    else:
+        await asyncio.gather(*(worker(api) for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub delay per request, seconds")
+    args = parser.parse_args()
+
+    async with StubBackend(latency=args.latency) as backend:
+        print(f"{args.calls} calls, concurrency {args.concurrency}")
+        for label, per_call in (("per-call", True), ("shared", False)):
+            api = ApiClient(backend.url, "bench", settings)
+            backend.reset()
+            elapsed, latencies = await _run(api, args.calls, args.concurrency, per_call)
+            await api.aclose()
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000
+            p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+            print(
+                f"{label:<9} {elapsed:6.2f}s  {args.calls / elapsed:7.1f} calls/s  "
+                f"p50 {p50:5.1f}ms  p99 {p99:5.1f}ms  "
+                f"over {len(backend.stats['connections'])} TCP connections"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""Support fan-out: sequential ``send_message`` loop vs the broadcast scheduler.
+
+A fake bot answers each send after ``--latency`` seconds, and every tenth
+recipient takes ``--slow`` seconds (a stalled chat). "sequential" is the old
+``for admin_id in notify_ids: await bot.send_message(...)`` loop. "scheduler"
+is ``broadcaster.broadcast``. The report shows when the median recipient got
+the message, the total time and the peak sends in any one-second window, which
+must stay under Telegram's ~30 msg/s.
+
+Run from bot/:  python -m benchmarks.bench_broadcast [--recipients 200]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.broadcast import BroadcastScheduler
+from app.config import settings
+
+
+class FakeBot:
+    def __init__(self, latency: float, slow: float) -> None:
+        self.latency = latency
+        self.slow = slow
+        self.sent_at: dict[int, float] = {}
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        await asyncio.sleep(self.slow if chat_id % 10 == 0 else self.latency)
+        self.sent_at[chat_id] = time.perf_counter()
+
+
+def _peak_per_second(stamps: list[float]) -> int:
+    stamps = sorted(stamps)
+    peak = start = 0
+    for end, stamp in enumerate(stamps):
+        while stamp - stamps[start] >= 1.0:
+            start += 1
+        peak = max(peak, end - start + 1)
+    return peak
+
+
+async def _run(mode: str, recipients: int, latency: float, slow: float) -> None:
+    bot = FakeBot(latency, slow)
+    chat_ids = list(range(1, recipients + 1))
+    started = time.perf_counter()
+    if mode == "sequential":
+        for chat_id in chat_ids:
+            await bot.send_message(chat_id, "🆘 Обращение")
+    else:
+        scheduler = BroadcastScheduler(
+            settings.broadcast_rate,
+            settings.broadcast_burst,
+            settings.broadcast_chat_interval,
+            settings.broadcast_concurrency,
+            settings.broadcast_retries,
+        )
+        await scheduler.broadcast(bot, chat_ids, "🆘 Обращение")
+    total = time.perf_counter() - started
+    delays = [stamp - started for stamp in bot.sent_at.values()]
+    print(
+        f"{mode:<10} median delivery {statistics.median(delays):6.2f}s  "
+        f"total {total:6.2f}s  peak {_peak_per_second(list(bot.sent_at.values()))} msg/s"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--slow", type=float, default=2.0)
+    args = parser.parse_args()
+    for mode in ("sequential", "scheduler"):
+        await _run(mode, args.recipients, args.latency, args.slow)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""Minimal in-process stub of the pixel-backend endpoints the bot calls.
+
+``StubBackend`` serves on a free local port inside the running event loop and
+counts requests and distinct client TCP connections, so benchmarks can show
+connection reuse. Optional ``latency`` adds a per-request delay.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+
+from aiohttp import web
+
+BRANCHES = [
+    {"id": 1, "name": "Белореченская", "address": "ул. Белореченская, 28", "schedule": "09:00–21:00"},
+    {"id": 2, "name": "Дирижабль", "address": "ул. Академика Шварца, 17", "schedule": "10:00–22:00"},
+    {"id": 3, "name": "Титова", "address": "ул. Титова, 26", "schedule": "09:00–20:00"},
+]
+
+
+def build_app(stats: dict, latency: float = 0.0) -> web.Application:
+    @web.middleware
+    async def track(request: web.Request, handler):
+        stats["requests"][f"{request.method} {request.match_info.route.resource.canonical}"] += 1
+        peer = request.transport.get_extra_info("peername") if request.transport else None
+        if peer:
+            stats["connections"].add(peer)
+        if latency:
+            await asyncio.sleep(latency)
+        return await handler(request)
+
+    async def branches_public(request: web.Request) -> web.Response:
+        return web.json_response(BRANCHES)
+
+    async def support_staff(request: web.Request) -> web.Response:
+        return web.json_response([{"telegram_id": 123456789, "name": "Bench"}])
+
+    async def get_order(request: web.Request) -> web.Response:
+        ref = request.match_info["ref"]
+        return web.json_response({"id": 1, "number": ref, "status": "new", "branch_id": 1, "model": "iPhone 13"})
+
+    app = web.Application(middlewares=[track])
+    app.router.add_get("/api/branches/public", branches_public)
+    app.router.add_get("/api/support-staff", support_staff)
+    app.router.add_get("/api/orders/{ref}", get_order)
+    return app
+
+
+class StubBackend:
+    def __init__(self, latency: float = 0.0) -> None:
+        self.stats: dict = {"requests": Counter(), "connections": set()}
+        self.latency = latency
+        self.port = 0
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def reset(self) -> None:
+        self.stats["requests"].clear()
+        self.stats["connections"].clear()
+
+    async def __aenter__(self) -> "StubBackend":
+        self._runner = web.AppRunner(build_app(self.stats, self.latency), keepalive_timeout=60)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import time
+from types import SimpleNamespace
+
+import aiohttp
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from app import main as main_module
+from app.api import ApiClient, ApiError
+from app.branches import BRANCHES_FALLBACK, BranchDirectory
+from app.broadcast import BroadcastScheduler, TokenBucket
+from app.notifications import MAX_ERROR_LENGTH, StatusNotifier, format_status_message
+from app.tickets import TicketStore
+
+
+class FakeBot:
+    """Records ``send_message`` calls; ``fail`` maps a chat id to errors raised on its next sends."""
+
+    def __init__(self, fail: dict[int, list[Exception]] | None = None) -> None:
+        self.fail = fail or {}
+        self.sent: list[tuple[int, str, float]] = []
+        self.attempts: list[int] = []
+        self.gate: asyncio.Event | None = None
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        self.attempts.append(chat_id)
+        errors = self.fail.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        if self.gate is not None:
+            await self.gate.wait()
+        self.sent.append((chat_id, text, time.monotonic()))
+        return SimpleNamespace(chat_id=chat_id, text=text)
+
+
+def _retry_after(chat_id: int, seconds: int = 1) -> TelegramRetryAfter:
+    return TelegramRetryAfter(SendMessage(chat_id=chat_id, text="x"), "Flood control exceeded", seconds)
+
+
+def _api_client(outcomes: list, calls: list[tuple[str, str]], retries: int = 2) -> ApiClient:
+    """ApiClient whose ``_send`` raises or returns ``outcomes`` in order."""
+    cfg = dataclasses.replace(main_module.settings, api_get_retries=retries, api_retry_backoff=0)
+    client = ApiClient("http://backend", "test-token", cfg)
+
+    async def fake_send(method, url, headers, **kwargs):
+        calls.append((method, url))
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome, {}
+
+    client._send = fake_send  # type: ignore[method-assign]
+    return client
+
+
+def _scheduler(**overrides) -> BroadcastScheduler:
+    options = {"rate": 1000.0, "burst": 1000.0, "chat_interval": 0.0, "concurrency": 10, "retries": 2}
+    options.update(overrides)
+    return BroadcastScheduler(**options)
+
+
+def test_token_bucket_paces_callers_after_the_burst():
+    async def scenario() -> float:
+        bucket = TokenBucket(rate=50, capacity=2)
+        started = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(7)))
+        return time.monotonic() - started
+
+    # Two tokens are free, the other five arrive at 50 per second.
+    assert 0.09 <= asyncio.run(scenario()) < 1
+
+
+def test_token_bucket_pause_holds_queued_callers():
+    async def scenario() -> float:
+        bucket = TokenBucket(rate=1000, capacity=1000)
+        bucket.pause(0.2)
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.19
+
+
+def test_broadcast_spaces_messages_to_one_chat():
+    bot = FakeBot()
+    scheduler = _scheduler(chat_interval=0.1)
+
+    async def scenario() -> None:
+        await asyncio.gather(*(scheduler.send(bot, 7, f"msg {idx}") for idx in range(3)))
+
+    asyncio.run(scenario())
+    times = [sent_at for _, _, sent_at in bot.sent]
+    assert len(times) == 3
+    assert all(later - earlier >= 0.09 for earlier, later in zip(times, times[1:]))
+
+
+def test_broadcast_pauses_for_flood_control_and_retries():
+    bot = FakeBot(fail={1: [_retry_after(1)]})
+    scheduler = _scheduler()
+
+    async def scenario():
+        started = time.monotonic()
+        report = await scheduler.broadcast(bot, [1, 2, 3, 2], "alert")
+        return started, report
+
+    started, report = asyncio.run(scenario())
+    assert sorted(report.delivered) == [1, 2, 3]
+    assert report.failed == {}
+    assert bot.attempts.count(1) == 2
+    assert bot.attempts.count(2) == 1
+    # RetryAfter is bot-wide, so every send queued behind it waits out the pause.
+    assert all(sent_at - started >= 0.95 for _, _, sent_at in bot.sent)
+
+
+def test_broadcast_reports_chats_that_exhaust_their_retries():
+    bot = FakeBot(fail={1: [_retry_after(1)], 2: [RuntimeError("chat not found")]})
+    scheduler = _scheduler(retries=0)
+
+    report = asyncio.run(scheduler.broadcast(bot, [1, 2, 3], "alert"))
+    assert report.delivered == [3]
+    assert set(report.failed) == {1, 2}
+    assert report.failed[2] == "chat not found"
+    assert scheduler.failed_total == 2
+
+
+def test_support_message_answers_before_staff_alerts_are_delivered(monkeypatch):
+    bot = FakeBot()
+    scheduler = _scheduler()
+    answers: list[str] = []
+
+    async def fake_create(user_id, user_name, text):
+        return {"id": 42, "user_id": user_id, "status": "new"}
+
+    async def answer(text, **kwargs):
+        answers.append(text)
+
+    async def clear():
+        return None
+
+    monkeypatch.setattr(main_module, "broadcaster", scheduler)
+    monkeypatch.setattr(main_module, "STAFF_IDS", {501, 502})
+    monkeypatch.setattr(main_module.settings, "admin_ids", set())
+    monkeypatch.setattr(main_module.ticket_store, "create", fake_create)
+    message = SimpleNamespace(
+        text="Не работает",
+        bot=bot,
+        from_user=SimpleNamespace(id=900, full_name="Клиент"),
+        answer=answer,
+    )
+
+    async def scenario() -> None:
+        bot.gate = asyncio.Event()
+        await asyncio.wait_for(main_module.support_message(message, SimpleNamespace(clear=clear)), timeout=1)
+        # The customer is answered while staff alerts are still held up.
+        assert answers == ["Обращение #42 отправлено. Мы скоро ответим."]
+        assert bot.sent == []
+        bot.gate.set()
+        await scheduler.drain()
+
+    asyncio.run(scenario())
+    assert sorted(chat_id for chat_id, _, _ in bot.sent) == [501, 502]
+    assert all("Обращение #42" in text for _, text, _ in bot.sent)
+
+
+def test_api_client_reuses_one_session_until_closed():
+    async def scenario() -> None:
+        client = ApiClient("http://backend", "test-token")
+        first = client.session
+        assert client.session is first
+        await client.aclose()
+        assert first.closed
+        second = client.session
+        assert second is not first
+        await client.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_api_client_retries_gets_on_gateway_and_connection_errors():
+    calls: list[tuple[str, str]] = []
+    client = _api_client([ApiError(503, "busy"), aiohttp.ClientConnectionError(), {"id": 1}], calls)
+
+    assert asyncio.run(client.get_order("1")) == {"id": 1}
+    assert calls == [("GET", "http://backend/api/orders/1")] * 3
+
+
+def test_api_client_gives_up_after_the_configured_retries():
+    calls: list[tuple[str, str]] = []
+    client = _api_client([ApiError(502, "bad gateway")] * 3, calls, retries=1)
+
+    with pytest.raises(ApiError) as exc_info:
+        asyncio.run(client.get_order("1"))
+    assert exc_info.value.status == 502
+    assert len(calls) == 2
+
+
+def test_api_client_does_not_retry_writes_or_client_errors():
+    calls: list[tuple[str, str]] = []
+    client = _api_client([ApiError(503, "busy"), ApiError(404, "not found")], calls)
+
+    with pytest.raises(ApiError):
+        asyncio.run(client.create_order({"model": "iPhone"}))
+    with pytest.raises(ApiError) as exc_info:
+        asyncio.run(client.get_order("missing"))
+    assert exc_info.value.status == 404
+    assert [method for method, _ in calls] == ["POST", "GET"]
+
+
+class FakeNotificationsClient:
+    def __init__(self, batches: list[list[dict]], ack_error: Exception | None = None) -> None:
+        self.batches = batches
+        self.ack_error = ack_error
+        self.acks: list[tuple[list[int], list[dict]]] = []
+
+    async def claim_notifications(self, limit: int, wait: float = 0) -> list[dict]:
+        if self.batches:
+            return self.batches.pop(0)
+        await asyncio.sleep(wait)
+        return []
+
+    async def ack_notifications(self, sent: list[int], failed: list[dict]) -> dict:
+        self.acks.append((sent, failed))
+        if self.ack_error is not None:
+            raise self.ack_error
+        return {"ok": True}
+
+
+def _notification(notification_id: int, chat_id: int) -> dict:
+    return {"id": notification_id, "chat_id": chat_id, "payload": {"number": f"A-{notification_id}", "status": "done"}}
+
+
+def test_format_status_message_escapes_order_fields():
+    text = format_status_message({"number": "A-1", "status": "<ready>", "model": "Pixel & Co"})
+    assert text == "📦 Статус заявки A-1 изменён: <b>&lt;ready&gt;</b>\nМодель: Pixel &amp; Co"
+
+
+def test_status_notifier_acks_sent_and_classifies_failures():
+    forbidden = TelegramForbiddenError(SendMessage(chat_id=11, text="x"), "bot was blocked by the user")
+    bot = FakeBot(fail={11: [forbidden], 12: [_retry_after(12, 5)]})
+    client = FakeNotificationsClient([])
+    notifier = StatusNotifier(client, _scheduler(), batch_size=10, wait=0)
+
+    asyncio.run(notifier.deliver(bot, [_notification(1, 10), _notification(2, 11), _notification(3, 12)]))
+
+    assert [chat_id for chat_id, _, _ in bot.sent] == [10]
+    # Flood control is left to the backend's schedule: one attempt, no local retry.
+    assert bot.attempts.count(12) == 1
+    [(sent, failed)] = client.acks
+    assert sent == [1]
+    failed_by_id = {entry["id"]: entry for entry in failed}
+    assert failed_by_id[2]["permanent"] is True
+    assert failed_by_id[3]["retry_after"] == 5
+    assert "permanent" not in failed_by_id[3]
+
+
+def test_status_notifier_truncates_long_errors_to_what_the_backend_accepts():
+    forbidden = TelegramForbiddenError(SendMessage(chat_id=11, text="x"), "blocked " * 300)
+    bot = FakeBot(fail={11: [forbidden], 12: [RuntimeError("x" * 5000)], 13: [RuntimeError()]})
+    client = FakeNotificationsClient([])
+    notifier = StatusNotifier(client, _scheduler(), batch_size=10, wait=0)
+
+    asyncio.run(notifier.deliver(bot, [_notification(idx + 1, 10 + idx) for idx in range(4)]))
+
+    [(sent, failed)] = client.acks
+    assert sent == [1]
+    errors = {entry["id"]: entry["error"] for entry in failed}
+    assert len(errors[2]) == len(errors[3]) == MAX_ERROR_LENGTH
+    assert errors[4] == "RuntimeError"
+
+
+def test_status_notifier_survives_a_failed_ack():
+    bot = FakeBot()
+    client = FakeNotificationsClient([], ack_error=RuntimeError("backend down"))
+    notifier = StatusNotifier(client, _scheduler(), batch_size=10, wait=0)
+
+    asyncio.run(notifier.deliver(bot, [_notification(1, 10)]))
+    assert len(client.acks) == 1
+    assert [chat_id for chat_id, _, _ in bot.sent] == [10]
+
+
+def test_status_notifier_claims_and_delivers_until_stopped():
+    bot = FakeBot()
+    client = FakeNotificationsClient([[_notification(1, 10)], [_notification(2, 11), _notification(3, 12)]])
+    notifier = StatusNotifier(client, _scheduler(), batch_size=10, wait=0.01)
+
+    async def scenario() -> None:
+        notifier.start(bot)
+        for _ in range(100):
+            if len(client.acks) == 2:
+                break
+            await asyncio.sleep(0.01)
+        await notifier.stop()
+
+    asyncio.run(scenario())
+    assert [sent for sent, _ in client.acks] == [[1], [2, 3]]
+    assert sorted(chat_id for chat_id, _, _ in bot.sent) == [10, 11, 12]
+
+
+def test_ticket_store_get_returns_none_only_for_missing_tickets():
+    calls: list[tuple[str, str]] = []
+    client = _api_client([ApiError(404, "Ticket not found"), ApiError(500, "database is locked")], calls, retries=0)
+    store = TicketStore(client, size=8, ttl=30)
+
+    assert asyncio.run(store.get(1)) is None
+    # An outage must not look like a missing ticket to staff.
+    with pytest.raises(ApiError) as exc_info:
+        asyncio.run(store.get(2))
+    assert exc_info.value.status == 500
+
+
+class FakeBranchesClient:
+    def __init__(self, outcomes: list) -> None:
+        self.outcomes = outcomes
+        self.calls = 0
+
+    async def list_branches_public(self, etag: str | None = None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome, '"v1"'
+
+
+def test_branch_directory_backs_off_after_a_failed_refresh():
+    branches = [{"id": 7, "name": "Новый", "lat": 1.0, "lon": 2.0}]
+    client = FakeBranchesClient([ApiError(503, "down"), [], branches])
+    directory = BranchDirectory(client, ttl=300, stale_ttl=3600, retry_interval=0.2)
+
+    async def scenario() -> None:
+        # Callers queued behind the failing request, and those right after it, reuse its outcome.
+        results = await asyncio.gather(*(directory.get() for _ in range(5)))
+        assert all(result == BRANCHES_FALLBACK for result in results)
+        assert await directory.get() == BRANCHES_FALLBACK
+        assert client.calls == 1
+
+        await asyncio.sleep(0.25)
+        # An empty body counts as a failed attempt too.
+        assert await directory.get() == BRANCHES_FALLBACK
+        assert await directory.get() == BRANCHES_FALLBACK
+        assert client.calls == 2
+
+        await asyncio.sleep(0.25)
+        assert await directory.get() == branches
+        assert await directory.get_by_id(7) == branches[0]
+        assert client.calls == 3
+
+    asyncio.run(scenario())
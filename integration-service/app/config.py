@@ -17,6 +17,7 @@ class Settings:
     webhook_basic_user: str
     webhook_basic_password: str
     sqlite_path: str
+    sqlite_threads: int
     zammad_base_url: str
     zammad_token: str
     zammad_customer_id: int
@@ -28,11 +29,39 @@ class Settings:
     zammad_user_tg_username_field: str
     zammad_user_tg_id_field: str
     zammad_erp_issue_field: str
+    zammad_customer_cache_ttl: float
+    zammad_customer_cache_size: int
     enable_erp_issue: bool
     erpnext_base_url: str
     erpnext_api_key: str
     erpnext_api_secret: str
     erpnext_issue_doctype: str
+    http_connect_timeout: float
+    http_read_timeout: float
+    http_pool_timeout: float
+    http_max_connections: int
+    http_max_keepalive_connections: int
+    http_keepalive_expiry: float
+    http2: bool
+    intake_workers: int
+    intake_poll_interval: float
+    intake_lease_seconds: float
+    intake_max_attempts: int
+    intake_backoff_base: float
+    intake_backoff_max: float
+    intake_defer_post_processing: bool
+    intake_batch_max_items: int
+    intake_batch_concurrency: int
+    breaker_window_seconds: float
+    breaker_min_calls: int
+    breaker_failure_rate: float
+    breaker_slow_call_seconds: float
+    breaker_slow_call_rate: float
+    breaker_open_seconds: float
+    upstream_concurrency_initial: int
+    upstream_concurrency_min: int
+    upstream_concurrency_max: int
+    upstream_retry_after_max: float
 
 
 def load_settings() -> Settings:
@@ -42,6 +71,7 @@ def load_settings() -> Settings:
         webhook_basic_user=os.getenv("WEBHOOK_BASIC_USER", ""),
         webhook_basic_password=os.getenv("WEBHOOK_BASIC_PASSWORD", ""),
         sqlite_path=os.getenv("SQLITE_PATH", default_db),
+        sqlite_threads=int(os.getenv("SQLITE_THREADS", "4")),
         zammad_base_url=os.getenv("ZAMMAD_BASE_URL", "http://127.0.0.1:8080"),
         zammad_token=os.getenv("ZAMMAD_TOKEN", ""),
         zammad_customer_id=int(os.getenv("ZAMMAD_CUSTOMER_ID", "1")),
@@ -53,9 +83,37 @@ def load_settings() -> Settings:
         zammad_user_tg_username_field=os.getenv("ZAMMAD_USER_TG_USERNAME_FIELD", ""),
         zammad_user_tg_id_field=os.getenv("ZAMMAD_USER_TG_ID_FIELD", ""),
         zammad_erp_issue_field=os.getenv("ZAMMAD_ERP_ISSUE_FIELD", "erp_issue_ref"),
+        zammad_customer_cache_ttl=float(os.getenv("ZAMMAD_CUSTOMER_CACHE_TTL", "86400")),
+        zammad_customer_cache_size=int(os.getenv("ZAMMAD_CUSTOMER_CACHE_SIZE", "10000")),
         enable_erp_issue=_as_bool(os.getenv("ENABLE_ERP_ISSUE"), default=False),
         erpnext_base_url=os.getenv("ERPNEXT_BASE_URL", "http://127.0.0.1:8081"),
         erpnext_api_key=os.getenv("ERPNEXT_API_KEY", ""),
         erpnext_api_secret=os.getenv("ERPNEXT_API_SECRET", ""),
         erpnext_issue_doctype=os.getenv("ERPNEXT_ISSUE_DOCTYPE", "Issue"),
+        http_connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+        http_read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", "20")),
+        http_pool_timeout=float(os.getenv("HTTP_POOL_TIMEOUT", "5")),
+        http_max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "50")),
+        http_max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        http_keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+        http2=_as_bool(os.getenv("HTTP2"), default=False),
+        intake_workers=int(os.getenv("INTAKE_WORKERS", "2")),
+        intake_poll_interval=float(os.getenv("INTAKE_POLL_INTERVAL", "2")),
+        intake_lease_seconds=float(os.getenv("INTAKE_LEASE_SECONDS", "120")),
+        intake_max_attempts=int(os.getenv("INTAKE_MAX_ATTEMPTS", "10")),
+        intake_backoff_base=float(os.getenv("INTAKE_BACKOFF_BASE", "5")),
+        intake_backoff_max=float(os.getenv("INTAKE_BACKOFF_MAX", "900")),
+        intake_defer_post_processing=_as_bool(os.getenv("INTAKE_DEFER_POST_PROCESSING"), default=True),
+        intake_batch_max_items=int(os.getenv("INTAKE_BATCH_MAX_ITEMS", "1000")),
+        intake_batch_concurrency=int(os.getenv("INTAKE_BATCH_CONCURRENCY", "8")),
+        breaker_window_seconds=float(os.getenv("BREAKER_WINDOW_SECONDS", "60")),
+        breaker_min_calls=int(os.getenv("BREAKER_MIN_CALLS", "10")),
+        breaker_failure_rate=float(os.getenv("BREAKER_FAILURE_RATE", "0.5")),
+        breaker_slow_call_seconds=float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "5")),
+        breaker_slow_call_rate=float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.8")),
+        breaker_open_seconds=float(os.getenv("BREAKER_OPEN_SECONDS", "30")),
+        upstream_concurrency_initial=int(os.getenv("UPSTREAM_CONCURRENCY_INITIAL", "10")),
+        upstream_concurrency_min=int(os.getenv("UPSTREAM_CONCURRENCY_MIN", "1")),
+        upstream_concurrency_max=int(os.getenv("UPSTREAM_CONCURRENCY_MAX", "50")),
+        upstream_retry_after_max=float(os.getenv("UPSTREAM_RETRY_AFTER_MAX", "300")),
     )
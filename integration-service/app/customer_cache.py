@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from app.config import Settings
+from app.db import db_executor
+
+
+@dataclass(frozen=True)
+class CachedCustomer:
+    user_id: int
+    payload_hash: str
+    stored_at: float
+
+
+def customer_payload_hash(user_payload: dict[str, Any]) -> str:
+    raw = json.dumps(user_payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CustomerCache:
+    """Customer email -> Zammad user id, with the hash of the last payload pushed.
+
+    Entries live in the ``zammad_customers`` table so they survive restarts; a
+    bounded in-memory LRU in front of it keeps repeat lookups off SQLite. Both
+    expire after ``zammad_customer_cache_ttl`` seconds.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self._entries: OrderedDict[str, CachedCustomer] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fresh(self, entry: CachedCustomer) -> bool:
+        return time.time() - entry.stored_at < self.settings.zammad_customer_cache_ttl
+
+    def _remember(self, email: str, entry: CachedCustomer) -> None:
+        self._entries[email] = entry
+        self._entries.move_to_end(email)
+        while len(self._entries) > max(1, self.settings.zammad_customer_cache_size):
+            self._entries.popitem(last=False)
+
+    async def aget(self, email: str) -> CachedCustomer | None:
+        """``get`` that answers memory hits inline and reads SQLite off the event loop."""
+        if self.settings.zammad_customer_cache_ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and self._fresh(entry):
+                self._entries.move_to_end(email)
+                return entry
+        return await db_executor.run(self.get, email)
+
+    async def aput(self, email: str, user_id: int, payload_hash: str) -> None:
+        await db_executor.run(self.put, email, user_id, payload_hash)
+
+    async def ainvalidate(self, email: str) -> None:
+        await db_executor.run(self.invalidate, email)
+
+    def get(self, email: str) -> CachedCustomer | None:
+        if self.settings.zammad_customer_cache_ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None:
+                if self._fresh(entry):
+                    self._entries.move_to_end(email)
+                    return entry
+                del self._entries[email]
+
+        with sqlite3.connect(self.settings.sqlite_path) as conn:
+            row = conn.execute(
+                "SELECT user_id, payload_hash, stored_at FROM zammad_customers WHERE email = ?",
+                (email,),
+            ).fetchone()
+        if row is None:
+            return None
+        entry = CachedCustomer(user_id=int(row[0]), payload_hash=str(row[1]), stored_at=float(row[2]))
+        if not self._fresh(entry):
+            return None
+        with self._lock:
+            self._remember(email, entry)
+        return entry
+
+    def put(self, email: str, user_id: int, payload_hash: str) -> None:
+        if self.settings.zammad_customer_cache_ttl <= 0:
+            return
+        entry = CachedCustomer(user_id=user_id, payload_hash=payload_hash, stored_at=time.time())
+        with sqlite3.connect(self.settings.sqlite_path) as conn:
+            conn.execute(
+                """
+                INSERT INTO zammad_customers(email, user_id, payload_hash, stored_at)
+                VALUES(?, ?, ?, ?)
+                ON CONFLICT(email) DO UPDATE SET
+                    user_id = excluded.user_id,
+                    payload_hash = excluded.payload_hash,
+                    stored_at = excluded.stored_at
+                """,
+                (email, user_id, payload_hash, entry.stored_at),
+            )
+            conn.execute(
+                "DELETE FROM zammad_customers WHERE stored_at < ?",
+                (entry.stored_at - self.settings.zammad_customer_cache_ttl,),
+            )
+            conn.commit()
+        with self._lock:
+            self._remember(email, entry)
+
+    def invalidate(self, email: str) -> None:
+        with self._lock:
+            self._entries.pop(email, None)
+        with sqlite3.connect(self.settings.sqlite_path) as conn:
+            conn.execute("DELETE FROM zammad_customers WHERE email = ?", (email,))
+            conn.commit()
@@ -1,10 +1,50 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import hashlib
 import json
 import sqlite3
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+class DBExecutor:
+    """Bounded thread pool for the blocking sqlite3 helpers in this module.
+
+    Async handlers ``await db_executor.run(fn, ...)`` instead of calling ``fn``
+    directly, so commits and fsyncs never stall the event loop.
+    """
+
+    def __init__(self, max_workers: int = 4) -> None:
+        self.max_workers = max_workers
+        self._executor: ThreadPoolExecutor | None = None
+
+    def start(self, max_workers: int | None = None) -> None:
+        if max_workers is not None and max_workers != self.max_workers:
+            self.shutdown()
+            self.max_workers = max_workers
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers), thread_name_prefix="sqlite")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        if self._executor is None:
+            self.start()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs)
+        )
+
+
+db_executor = DBExecutor()
 
 
 def init_db(sqlite_path: str) -> None:
@@ -36,6 +76,90 @@ def init_db(sqlite_path: str) -> None:
             END
             """
         )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ticket_links (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                zammad_ticket_id INTEGER,
+                zammad_ticket_number TEXT NOT NULL UNIQUE,
+                erpnext_issue TEXT,
+                created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS set_ticket_links_updated_at
+            AFTER UPDATE ON ticket_links
+            FOR EACH ROW
+            BEGIN
+                UPDATE ticket_links SET updated_at = datetime('now') WHERE id = OLD.id;
+            END
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS zammad_customers (
+                email TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                payload_hash TEXT NOT NULL,
+                stored_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_zammad_customers_stored_at ON zammad_customers(stored_at)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS intake_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT UNIQUE,
+                request_hash TEXT NOT NULL,
+                request_body TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                step TEXT NOT NULL DEFAULT 'customer',
+                state TEXT NOT NULL DEFAULT '{}',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TEXT NOT NULL DEFAULT (datetime('now')),
+                last_error TEXT,
+                response_body TEXT,
+                created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_intake_jobs_due ON intake_jobs(status, next_attempt_at)")
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS set_intake_jobs_updated_at
+            AFTER UPDATE ON intake_jobs
+            FOR EACH ROW
+            BEGIN
+                UPDATE intake_jobs SET updated_at = datetime('now') WHERE id = OLD.id;
+            END
+            """
+        )
+        user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if user_version < 1:
+            # Backfill links from intakes stored before ticket_links existed.
+            conn.execute(
+                """
+                INSERT INTO ticket_links(zammad_ticket_id, zammad_ticket_number, erpnext_issue)
+                SELECT
+                    json_extract(response_body, '$.zammad_ticket_id'),
+                    CAST(json_extract(response_body, '$.zammad_ticket_number') AS TEXT),
+                    json_extract(response_body, '$.erpnext_issue')
+                FROM intake_requests
+                WHERE status = 'success'
+                    AND json_valid(response_body)
+                    AND COALESCE(json_extract(response_body, '$.zammad_ticket_number'), '') != ''
+                ORDER BY id ASC
+                ON CONFLICT(zammad_ticket_number) DO UPDATE SET
+                    zammad_ticket_id = COALESCE(excluded.zammad_ticket_id, ticket_links.zammad_ticket_id),
+                    erpnext_issue = COALESCE(excluded.erpnext_issue, ticket_links.erpnext_issue)
+                """
+            )
+            conn.execute("PRAGMA user_version = 1")
         conn.commit()
 
 
@@ -70,31 +194,50 @@ def save_success(
     response_body: dict[str, Any],
 ) -> None:
     with sqlite3.connect(sqlite_path) as conn:
-        if idempotency_key:
-            conn.execute(
-                """
-                INSERT INTO intake_requests(idempotency_key, request_hash, request_body, response_body, status)
-                VALUES(?, ?, ?, ?, 'success')
-                ON CONFLICT(idempotency_key) DO UPDATE SET
-                    request_hash = excluded.request_hash,
-                    request_body = excluded.request_body,
-                    response_body = excluded.response_body,
-                    status = 'success',
-                    error_text = NULL
-                """,
-                (idempotency_key, request_hash, _json_dumps(request_body), _json_dumps(response_body)),
-            )
-        else:
-            conn.execute(
-                """
-                INSERT INTO intake_requests(idempotency_key, request_hash, request_body, response_body, status)
-                VALUES(NULL, ?, ?, ?, 'success')
-                """,
-                (request_hash, _json_dumps(request_body), _json_dumps(response_body)),
-            )
+        _save_success(conn, idempotency_key, request_hash, request_body, response_body)
         conn.commit()
 
 
+def _save_success(
+    conn: sqlite3.Connection,
+    idempotency_key: str | None,
+    request_hash: str,
+    request_body: dict[str, Any],
+    response_body: dict[str, Any],
+) -> None:
+    if idempotency_key:
+        conn.execute(
+            """
+            INSERT INTO intake_requests(idempotency_key, request_hash, request_body, response_body, status)
+            VALUES(?, ?, ?, ?, 'success')
+            ON CONFLICT(idempotency_key) DO UPDATE SET
+                request_hash = excluded.request_hash,
+                request_body = excluded.request_body,
+                response_body = excluded.response_body,
+                status = 'success',
+                error_text = NULL
+            """,
+            (idempotency_key, request_hash, _json_dumps(request_body), _json_dumps(response_body)),
+        )
+    else:
+        conn.execute(
+            """
+            INSERT INTO intake_requests(idempotency_key, request_hash, request_body, response_body, status)
+            VALUES(NULL, ?, ?, ?, 'success')
+            """,
+            (request_hash, _json_dumps(request_body), _json_dumps(response_body)),
+        )
+    ticket_number = str(response_body.get("zammad_ticket_number") or "")
+    if ticket_number:
+        ticket_id = response_body.get("zammad_ticket_id")
+        _upsert_ticket_link(
+            conn,
+            ticket_id if isinstance(ticket_id, int) else None,
+            ticket_number,
+            response_body.get("erpnext_issue") or None,
+        )
+
+
 def save_error(
     sqlite_path: str,
     *,
@@ -128,25 +271,277 @@ def save_error(
         conn.commit()
 
 
+def _upsert_ticket_link(
+    conn: sqlite3.Connection,
+    ticket_id: int | None,
+    ticket_number: str,
+    erpnext_issue: str | None,
+) -> None:
+    conn.execute(
+        """
+        INSERT INTO ticket_links(zammad_ticket_id, zammad_ticket_number, erpnext_issue)
+        VALUES(?, ?, ?)
+        ON CONFLICT(zammad_ticket_number) DO UPDATE SET
+            zammad_ticket_id = COALESCE(excluded.zammad_ticket_id, ticket_links.zammad_ticket_id),
+            erpnext_issue = COALESCE(excluded.erpnext_issue, ticket_links.erpnext_issue)
+        """,
+        (ticket_id, ticket_number, erpnext_issue),
+    )
+
+
+def save_ticket_link(
+    sqlite_path: str,
+    *,
+    ticket_id: int | None,
+    ticket_number: str,
+    erpnext_issue: str | None,
+) -> None:
+    with sqlite3.connect(sqlite_path) as conn:
+        _upsert_ticket_link(conn, ticket_id, ticket_number, erpnext_issue)
+        conn.commit()
+
+
 def find_erp_issue_by_ticket_number(sqlite_path: str, ticket_number: str) -> str | None:
     with sqlite3.connect(sqlite_path) as conn:
+        row = conn.execute(
+            "SELECT erpnext_issue FROM ticket_links WHERE zammad_ticket_number = ?",
+            (str(ticket_number),),
+        ).fetchone()
+    if row and row[0]:
+        return str(row[0])
+    return None
+
+
+_JOB_COLUMNS = """
+    id, idempotency_key, request_hash, request_body, status, step, state, attempts,
+    next_attempt_at, last_error, response_body
+"""
+
+
+def _job_from_row(row: sqlite3.Row | None) -> dict[str, Any] | None:
+    if not row:
+        return None
+    job = dict(row)
+    job["request_body"] = json.loads(job["request_body"])
+    job["state"] = json.loads(job["state"])
+    job["response_body"] = json.loads(job["response_body"]) if job["response_body"] else None
+    return job
+
+
+def _insert_intake_job(
+    conn: sqlite3.Connection,
+    idempotency_key: str | None,
+    request_hash: str,
+    request_body: dict[str, Any],
+    lease_seconds: float | None,
+) -> tuple[dict[str, Any], bool]:
+    cur = conn.execute(
+        """
+        INSERT INTO intake_jobs(idempotency_key, request_hash, request_body, status, next_attempt_at)
+        VALUES(?, ?, ?, ?, datetime('now', ?))
+        ON CONFLICT(idempotency_key) DO NOTHING
+        """,
+        (
+            idempotency_key,
+            request_hash,
+            _json_dumps(request_body),
+            "pending" if lease_seconds is None else "running",
+            f"+{int(lease_seconds or 0)} seconds",
+        ),
+    )
+    if idempotency_key:
+        row = conn.execute(
+            f"SELECT {_JOB_COLUMNS} FROM intake_jobs WHERE idempotency_key = ?", (idempotency_key,)
+        ).fetchone()
+    else:
+        row = conn.execute(f"SELECT {_JOB_COLUMNS} FROM intake_jobs WHERE id = last_insert_rowid()").fetchone()
+    return _job_from_row(row), cur.rowcount == 1  # type: ignore[return-value]
+
+
+def create_intake_job(
+    sqlite_path: str,
+    *,
+    idempotency_key: str | None,
+    request_hash: str,
+    request_body: dict[str, Any],
+    lease_seconds: float | None = None,
+) -> tuple[dict[str, Any], bool]:
+    """Queue a job, or return the existing job for ``idempotency_key``.
+
+    Returns ``(job, claimed)``. With ``lease_seconds``, a new job is inserted
+    already ``running`` under a lease held by the caller (``claimed`` is True),
+    so no worker can take it before the caller runs it. Otherwise new jobs are
+    ``pending`` and due immediately.
+    """
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.row_factory = sqlite3.Row
+        result = _insert_intake_job(conn, idempotency_key, request_hash, request_body, lease_seconds)
+        conn.commit()
+    return result
+
+
+def create_intake_jobs(
+    sqlite_path: str,
+    items: list[dict[str, Any]],
+    lease_seconds: float | None = None,
+) -> list[tuple[dict[str, Any] | None, dict[str, Any] | None, bool]]:
+    """Batch version of ``find_by_idempotency`` + ``create_intake_job`` in one transaction.
+
+    ``items`` hold ``idempotency_key``, ``request_hash`` and ``request_body``; the
+    result gives each item's stored ``intake_requests`` row (or None), its job and
+    whether the caller holds the job's lease. An item whose stored request is a
+    success with the same hash (a replay) or has a different hash (a conflict)
+    gets no new job: its job is the existing row for the key, if any.
+    """
+    results: list[tuple[dict[str, Any] | None, dict[str, Any] | None, bool]] = []
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.row_factory = sqlite3.Row
+        for item in items:
+            existing = None
+            if item["idempotency_key"]:
+                row = conn.execute(
+                    """
+                    SELECT id, idempotency_key, request_hash, request_body, response_body, status, error_text
+                    FROM intake_requests
+                    WHERE idempotency_key = ?
+                    """,
+                    (item["idempotency_key"],),
+                ).fetchone()
+                existing = dict(row) if row else None
+            if existing and (
+                existing["request_hash"] != item["request_hash"]
+                or (existing["status"] == "success" and existing["response_body"])
+            ):
+                # Same rule as the endpoint's replay check: answered from intake_requests, never run again.
+                row = conn.execute(
+                    f"SELECT {_JOB_COLUMNS} FROM intake_jobs WHERE idempotency_key = ?", (item["idempotency_key"],)
+                ).fetchone()
+                results.append((existing, _job_from_row(row), False))
+                continue
+            job, claimed = _insert_intake_job(
+                conn, item["idempotency_key"], item["request_hash"], item["request_body"], lease_seconds
+            )
+            results.append((existing, job, claimed))
+        conn.commit()
+    return results
+
+
+def get_intake_job(sqlite_path: str, job_id: int) -> dict[str, Any] | None:
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute(f"SELECT {_JOB_COLUMNS} FROM intake_jobs WHERE id = ?", (job_id,)).fetchone()
+    return _job_from_row(row)
+
+
+def claim_intake_job(sqlite_path: str, job_id: int, lease_seconds: float) -> dict[str, Any] | None:
+    """Lease one job for the caller; None if it is done or leased by someone else.
+
+    A dead job is revived: a client retrying it asks for another attempt.
+    """
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute(
+            f"""
+            UPDATE intake_jobs
+            SET status = 'running', next_attempt_at = datetime('now', ?)
+            WHERE id = ?
+                AND (status IN ('pending', 'dead')
+                     OR (status = 'running' AND next_attempt_at <= datetime('now')))
+            RETURNING {_JOB_COLUMNS}
+            """,
+            (f"+{int(lease_seconds)} seconds", job_id),
+        ).fetchone()
+        conn.commit()
+    return _job_from_row(row)
+
+
+def renew_intake_job_leases(sqlite_path: str, job_ids: list[int], lease_seconds: float) -> list[dict[str, Any]]:
+    """Extend leases the caller still holds; jobs whose lease ran out are left to ``claim_intake_job``."""
+    if not job_ids:
+        return []
+    placeholders = ", ".join("?" for _ in job_ids)
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.row_factory = sqlite3.Row
         rows = conn.execute(
-            """
-            SELECT response_body
-            FROM intake_requests
-            WHERE status = 'success' AND response_body IS NOT NULL
-            ORDER BY id DESC
-            """
+            f"""
+            UPDATE intake_jobs
+            SET next_attempt_at = datetime('now', ?)
+            WHERE id IN ({placeholders}) AND status = 'running' AND next_attempt_at > datetime('now')
+            RETURNING {_JOB_COLUMNS}
+            """,
+            (f"+{int(lease_seconds)} seconds", *job_ids),
         ).fetchall()
+        conn.commit()
+    return [_job_from_row(row) for row in rows]  # type: ignore[misc]
 
-    for (response_body,) in rows:
-        try:
-            data = json.loads(response_body)
-        except Exception:
-            continue
-        if str(data.get("zammad_ticket_number") or "") == str(ticket_number):
-            issue = data.get("erpnext_issue")
-            if issue:
-                return str(issue)
-            return None
-    return None
+
+def claim_due_intake_job(sqlite_path: str, lease_seconds: float) -> dict[str, Any] | None:
+    """Lease the next due job; ``running`` jobs whose lease ran out are taken over."""
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute(
+            f"""
+            UPDATE intake_jobs
+            SET status = 'running', next_attempt_at = datetime('now', ?)
+            WHERE id = (
+                SELECT id FROM intake_jobs
+                WHERE status IN ('pending', 'running') AND next_attempt_at <= datetime('now')
+                ORDER BY next_attempt_at ASC
+                LIMIT 1
+            )
+            RETURNING {_JOB_COLUMNS}
+            """,
+            (f"+{int(lease_seconds)} seconds",),
+        ).fetchone()
+        conn.commit()
+    return _job_from_row(row)
+
+
+def save_intake_job_step(sqlite_path: str, job_id: int, step: str, state: dict[str, Any]) -> None:
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.execute(
+            "UPDATE intake_jobs SET step = ?, state = ? WHERE id = ?",
+            (step, _json_dumps(state), job_id),
+        )
+        conn.commit()
+
+
+def save_intake_job_result(sqlite_path: str, job: dict[str, Any], response_body: dict[str, Any]) -> None:
+    """Publish a partial result (ticket created, post-processing pending) for replays and status reads."""
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.execute(
+            "UPDATE intake_jobs SET step = ?, state = ?, response_body = ? WHERE id = ?",
+            (job["step"], _json_dumps(job["state"]), _json_dumps(response_body), job["id"]),
+        )
+        if job["idempotency_key"]:
+            _save_success(conn, job["idempotency_key"], job["request_hash"], job["request_body"], response_body)
+        conn.commit()
+
+
+def complete_intake_job(sqlite_path: str, job: dict[str, Any], response_body: dict[str, Any]) -> None:
+    """Mark the job done and store the idempotent result and ticket link in one transaction."""
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.execute(
+            """
+            UPDATE intake_jobs
+            SET status = 'done', step = 'done', state = ?, response_body = ?, last_error = NULL,
+                attempts = attempts + 1
+            WHERE id = ?
+            """,
+            (_json_dumps(job["state"]), _json_dumps(response_body), job["id"]),
+        )
+        _save_success(conn, job["idempotency_key"], job["request_hash"], job["request_body"], response_body)
+        conn.commit()
+
+
+def fail_intake_job(sqlite_path: str, job_id: int, *, error_text: str, delay: float, dead: bool) -> None:
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.execute(
+            """
+            UPDATE intake_jobs
+            SET status = ?, attempts = attempts + 1, last_error = ?, next_attempt_at = datetime('now', ?)
+            WHERE id = ?
+            """,
+            ("dead" if dead else "pending", error_text[:1000], f"+{delay:.0f} seconds", job_id),
+        )
+        conn.commit()
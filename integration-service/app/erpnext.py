@@ -2,15 +2,12 @@
 
 from typing import Any
 
-import httpx
-
-from app.config import Settings
+from app.http import UpstreamClient
 from app.models import CloseSyncRequest, CreateSyncRequest, IntakeRequest
 
 
-class ERPNextClient:
-    def __init__(self, settings: Settings) -> None:
-        self.settings = settings
+class ERPNextClient(UpstreamClient):
+    upstream = "erpnext"
 
     def is_enabled(self) -> bool:
         return (
@@ -40,10 +37,9 @@ class ERPNextClient:
         }
 
         url = f"{self.settings.erpnext_base_url.rstrip('/')}/api/resource/{self.settings.erpnext_issue_doctype}"
-        async with httpx.AsyncClient(timeout=20) as client:
-            resp = await client.post(url, headers=headers, json=issue_payload)
-            resp.raise_for_status()
-            data = resp.json()
+        resp = await self.http.post(url, headers=headers, json=issue_payload)
+        resp.raise_for_status()
+        data = resp.json()
 
         issue_name = ((data or {}).get("data") or {}).get("name")
         return {"issue": issue_name, "raw": data}
@@ -72,17 +68,16 @@ class ERPNextClient:
             patch_data["custom_sc_net_profit"] = payload.net_profit
 
         url = f"{self.settings.erpnext_base_url.rstrip('/')}/api/resource/{self.settings.erpnext_issue_doctype}/{issue_name}"
-        async with httpx.AsyncClient(timeout=20) as client:
-            resp = await client.put(url, headers=headers, json=patch_data)
-            if resp.status_code >= 400:
-                # Fallback for installations without custom fields.
-                fallback_patch = {
-                    "status": "Closed",
-                    "description": self._build_close_description(payload),
-                }
-                resp = await client.put(url, headers=headers, json=fallback_patch)
-            resp.raise_for_status()
-            data = resp.json()
+        resp = await self.http.put(url, headers=headers, json=patch_data)
+        if resp.status_code >= 400:
+            # Fallback for installations without custom fields.
+            fallback_patch = {
+                "status": "Closed",
+                "description": self._build_close_description(payload),
+            }
+            resp = await self.http.put(url, headers=headers, json=fallback_patch)
+        resp.raise_for_status()
+        data = resp.json()
 
         return {"issue": issue_name, "updated": True, "raw": data}
 
@@ -99,10 +94,9 @@ class ERPNextClient:
             "description": self._build_create_description(payload),
         }
         url = f"{self.settings.erpnext_base_url.rstrip('/')}/api/resource/{self.settings.erpnext_issue_doctype}"
-        async with httpx.AsyncClient(timeout=20) as client:
-            resp = await client.post(url, headers=headers, json=issue_payload)
-            resp.raise_for_status()
-            data = resp.json()
+        resp = await self.http.post(url, headers=headers, json=issue_payload)
+        resp.raise_for_status()
+        data = resp.json()
 
         issue_name = ((data or {}).get("data") or {}).get("name")
         return {"issue": issue_name, "raw": data}
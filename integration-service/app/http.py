@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import httpx
+
+from app.config import Settings
+from app.resilience import GuardedTransport, UpstreamGuard
+
+
+def build_http_client(settings: Settings, guard: UpstreamGuard | None = None) -> httpx.AsyncClient:
+    """Long-lived keep-alive client shared by every call to one upstream.
+
+    With a ``guard``, every request goes through its circuit breaker and
+    concurrency limiter.
+    """
+    if settings.http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError as exc:
+            raise RuntimeError("HTTP2=true requires the 'h2' package (pip install httpx[http2])") from exc
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+    transport = None
+    if guard is not None:
+        transport = GuardedTransport(httpx.AsyncHTTPTransport(limits=limits, http2=settings.http2), guard)
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            connect=settings.http_connect_timeout,
+            read=settings.http_read_timeout,
+            write=settings.http_read_timeout,
+            pool=settings.http_pool_timeout,
+        ),
+        limits=limits,
+        http2=settings.http2,
+        transport=transport,
+    )
+
+
+class UpstreamClient:
+    """Base for upstream API clients that share one pooled ``httpx.AsyncClient``."""
+
+    upstream = "upstream"
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self.guard = UpstreamGuard(self.upstream, settings)
+        self._http: httpx.AsyncClient | None = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = build_http_client(self.settings, self.guard)
+        return self._http
+
+    async def start(self) -> None:
+        _ = self.http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
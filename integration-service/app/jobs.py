@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+from typing import Any
+
+from app.config import Settings
+from app.db import (
+    claim_due_intake_job,
+    complete_intake_job,
+    db_executor,
+    fail_intake_job,
+    save_intake_job_result,
+    save_intake_job_step,
+)
+from app.erpnext import ERPNextClient
+from app.models import IntakeRequest
+from app.zammad import ZammadClient
+
+logger = logging.getLogger(__name__)
+
+# Steps run in this order; a job resumes from the first one not yet persisted.
+INTAKE_STEPS = ("customer", "ticket", "erp_issue", "link")
+
+
+def intake_backoff(settings: Settings, attempts: int) -> float:
+    base = settings.intake_backoff_base * (2 ** (attempts - 1))
+    capped = min(base, settings.intake_backoff_max)
+    return capped / 2 + random.uniform(0, capped / 2)
+
+
+class IntakeJobRunner:
+    """Runs ``intake_jobs`` step by step and retries failed jobs in the background.
+
+    State is saved after every step, so a retry does not repeat upstream calls
+    that already succeeded (e.g. an ERPNext outage does not create a second
+    Zammad ticket). A job that fails ``INTAKE_MAX_ATTEMPTS`` times is ``dead``.
+    """
+
+    def __init__(self, settings: Settings, zammad: ZammadClient, erpnext: ERPNextClient) -> None:
+        self.settings = settings
+        self.zammad = zammad
+        self.erpnext = erpnext
+        self._tasks: list[asyncio.Task[None]] = []
+        self._background: set[asyncio.Task[None]] = set()
+        self._wakeup = asyncio.Event()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(max(1, self.settings.intake_workers))]
+
+    async def stop(self) -> None:
+        # Unfinished post-processing keeps its saved step; a worker resumes it once the lease expires.
+        tasks, self._tasks = [*self._tasks, *self._background], []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def drain(self) -> None:
+        """Wait for deferred post-processing started by ``execute`` to finish."""
+        while self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                processed = await self.run_due()
+            except Exception:
+                logger.exception("Intake job worker failed")
+                processed = False
+            if processed:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.settings.intake_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_due(self) -> bool:
+        """Claim and run one due job; returns False when none was due."""
+        job = await db_executor.run(
+            claim_due_intake_job, self.settings.sqlite_path, self.settings.intake_lease_seconds
+        )
+        if job is None:
+            return False
+        try:
+            await self.execute(job)
+        except Exception as exc:
+            logger.warning("Intake job %s failed at step %s: %s", job["id"], job["step"], exc)
+        return True
+
+    async def execute(self, job: dict[str, Any], respond_after: str | None = None) -> dict[str, Any]:
+        """Run a claimed job and return the intake response body.
+
+        With ``respond_after``, this returns as soon as that step is done. The
+        result so far is published for replays, and a tracked background task
+        runs the remaining steps under the same lease. If that task fails, the
+        job is retried like any other. On failure the job is rescheduled (or
+        marked dead) and the error re-raised.
+        """
+        stop = INTAKE_STEPS.index(respond_after) + 1 if respond_after else len(INTAKE_STEPS)
+        await self._run_steps(job, stop)
+        response_data = {
+            "success": True,
+            "idempotency_key": job["idempotency_key"],
+            "zammad_ticket_id": job["state"].get("ticket_id"),
+            "zammad_ticket_number": job["state"].get("ticket_number"),
+            "erpnext_issue": job["state"].get("erpnext_issue"),
+            "replayed": False,
+            "job_id": job["id"],
+            "complete": job["step"] == "done",
+        }
+        if job["step"] == "done":
+            await db_executor.run(complete_intake_job, self.settings.sqlite_path, job, response_data)
+            return response_data
+        await db_executor.run(save_intake_job_result, self.settings.sqlite_path, job, response_data)
+        task = asyncio.create_task(self._finish(job))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return response_data
+
+    async def _finish(self, job: dict[str, Any]) -> None:
+        try:
+            await self.execute(job)
+        except Exception as exc:
+            logger.warning("Intake job %s failed at step %s: %s", job["id"], job["step"], exc)
+
+    async def _run_steps(self, job: dict[str, Any], stop: int) -> None:
+        """Run steps up to index ``stop``, saving the state after each; ``job["step"]`` ends on the next one."""
+        payload = IntakeRequest(**job["request_body"])
+        state: dict[str, Any] = job["state"]
+        try:
+            start = INTAKE_STEPS.index(job["step"])
+            for index in range(start, stop):
+                await getattr(self, f"_step_{INTAKE_STEPS[index]}")(payload, state)
+                if index + 1 == len(INTAKE_STEPS):
+                    job["step"] = "done"
+                    break
+                job["step"] = INTAKE_STEPS[index + 1]
+                if index + 1 == stop:
+                    break  # the caller saves the step together with the partial result
+                await db_executor.run(save_intake_job_step, self.settings.sqlite_path, job["id"], job["step"], state)
+        except Exception as exc:
+            attempts = job["attempts"] + 1
+            job["attempts"] = attempts
+            await db_executor.run(
+                fail_intake_job,
+                self.settings.sqlite_path,
+                job["id"],
+                error_text=f"{job['step']}: {exc}",
+                # An open circuit or a Retry-After says when the upstream is worth trying again.
+                delay=max(intake_backoff(self.settings, attempts), getattr(exc, "retry_after", 0.0)),
+                dead=attempts >= self.settings.intake_max_attempts,
+            )
+            raise
+
+    async def _step_customer(self, payload: IntakeRequest, state: dict[str, Any]) -> None:
+        state["customer_id"] = await self.zammad.resolve_customer(payload)
+
+    async def _step_ticket(self, payload: IntakeRequest, state: dict[str, Any]) -> None:
+        result = await self.zammad.create_ticket(payload)
+        state["ticket_id"] = result.get("ticket_id")
+        state["ticket_number"] = result.get("ticket_number")
+
+    async def _step_erp_issue(self, payload: IntakeRequest, state: dict[str, Any]) -> None:
+        result = await self.erpnext.create_issue(payload, state.get("ticket_number"))
+        state["erpnext_issue"] = result.get("issue")
+
+    async def _step_link(self, payload: IntakeRequest, state: dict[str, Any]) -> None:
+        issue_ref = state.get("erpnext_issue")
+        if isinstance(issue_ref, str) and issue_ref:
+            ticket_id = state.get("ticket_id")
+            await self.zammad.set_ticket_erp_issue(
+                ticket_id if isinstance(ticket_id, int) else None,
+                issue_ref,
+                str(state.get("ticket_number") or ""),
+            )
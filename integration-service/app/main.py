@@ -1,34 +1,81 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
 import secrets
 from base64 import b64decode
-from typing import Annotated
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Annotated, Any
 
 from fastapi import Depends, FastAPI, Header, HTTPException, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import Field, ValidationError
 
 from app.config import Settings, load_settings
-from app.db import compute_hash, find_by_idempotency, find_erp_issue_by_ticket_number, init_db, save_error, save_success
+from app.db import (
+    claim_intake_job,
+    compute_hash,
+    create_intake_job,
+    create_intake_jobs,
+    db_executor,
+    find_by_idempotency,
+    find_erp_issue_by_ticket_number,
+    get_intake_job,
+    init_db,
+    renew_intake_job_leases,
+    save_error,
+    save_ticket_link,
+)
 from app.erpnext import ERPNextClient
+from app.jobs import IntakeJobRunner
 from app.models import (
     CloseSyncRequest,
     CloseSyncResponse,
     CreateSyncRequest,
     CreateSyncResponse,
+    IntakeBatchItem,
+    IntakeBatchRequest,
+    IntakeJobOut,
     IntakeRequest,
     IntakeResponse,
 )
+from app.singleflight import SingleFlight
 from app.zammad import ZammadClient
 
 app = FastAPI(title="Pixel SC Integration Service", version="0.1.0")
 settings = load_settings()
 zammad = ZammadClient(settings)
 erpnext = ERPNextClient(settings)
+intake_jobs = IntakeJobRunner(settings, zammad, erpnext)
+intake_flights: SingleFlight[tuple[dict[str, Any], dict[str, Any]]] = SingleFlight()
+logger = logging.getLogger(__name__)
+
+
+class BoundedIntakeBatchRequest(IntakeBatchRequest):
+    # The cap comes from settings, so oversized batches fail validation before any item is processed.
+    items: list[dict[str, Any]] = Field(min_length=1, max_length=settings.intake_batch_max_items)
 
 
 @app.on_event("startup")
 def on_startup() -> None:
     init_db(settings.sqlite_path)
+    db_executor.start(settings.sqlite_threads)
+
+
+@app.on_event("startup")
+async def open_upstream_clients() -> None:
+    await zammad.start()
+    await erpnext.start()
+    intake_jobs.start()
+
+
+@app.on_event("shutdown")
+async def close_upstream_clients() -> None:
+    await intake_jobs.stop()
+    await zammad.aclose()
+    await erpnext.aclose()
+    db_executor.shutdown()
 
 
 def require_token(authorization: Annotated[str | None, Header()] = None) -> None:
@@ -59,74 +106,281 @@ def require_token(authorization: Annotated[str | None, Header()] = None) -> None
 
 
 @app.get("/healthz")
-def healthz() -> dict[str, str]:
-    return {"status": "ok"}
+def healthz() -> dict[str, Any]:
+    upstreams = {client.upstream: client.guard.snapshot() for client in (zammad, erpnext)}
+    degraded = any(upstream["state"] != "closed" for upstream in upstreams.values())
+    return {"status": "degraded" if degraded else "ok", "upstreams": upstreams}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> str:
+    lines = [
+        "# HELP integration_upstream_circuit_state Circuit breaker state per upstream (1 for the current state).",
+        "# TYPE integration_upstream_circuit_state gauge",
+    ]
+    guards = [client.guard for client in (zammad, erpnext)]
+    for guard in guards:
+        for state in ("closed", "open", "half_open"):
+            value = int(guard.breaker.state == state)
+            lines.append(f'integration_upstream_circuit_state{{upstream="{guard.name}",state="{state}"}} {value}')
+    for metric, kind, help_text in (
+        ("opened_total", "counter", "Times the circuit breaker opened."),
+        ("rejected_total", "counter", "Calls failed fast by the circuit breaker or concurrency limiter."),
+        ("concurrency_limit", "gauge", "Current adaptive concurrency limit."),
+        ("in_flight", "gauge", "Calls currently in flight."),
+    ):
+        lines += [
+            f"# HELP integration_upstream_{metric} {help_text}",
+            f"# TYPE integration_upstream_{metric} {kind}",
+        ]
+        for guard in guards:
+            lines.append(f'integration_upstream_{metric}{{upstream="{guard.name}"}} {guard.snapshot()[metric]}')
+    return "\n".join(lines) + "\n"
+
 
+def _job_out(job: dict[str, Any]) -> IntakeJobOut:
+    return IntakeJobOut(
+        job_id=job["id"],
+        idempotency_key=job["idempotency_key"],
+        status=job["status"],
+        step=job["step"],
+        attempts=job["attempts"],
+        next_attempt_at=job["next_attempt_at"] if job["status"] != "done" else None,
+        last_error=job["last_error"],
+        result=IntakeResponse(**job["response_body"]) if job["response_body"] else None,
+    )
 
-@app.post("/api/intake", response_model=IntakeResponse, dependencies=[Depends(require_token)])
+
+@app.post(
+    "/api/intake",
+    response_model=IntakeResponse,
+    responses={202: {"model": IntakeJobOut}},
+    dependencies=[Depends(require_token)],
+)
 async def intake(
     payload: IntakeRequest,
     idempotency_key: Annotated[str | None, Header(alias="Idempotency-Key")] = None,
-) -> IntakeResponse:
+    prefer: Annotated[str | None, Header()] = None,
+) -> IntakeResponse | JSONResponse:
     body = payload.model_dump()
     body_hash = compute_hash(body)
 
     if idempotency_key:
-        existing = find_by_idempotency(settings.sqlite_path, idempotency_key)
-        if existing:
-            if existing["request_hash"] != body_hash:
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail="Idempotency-Key reused with different payload",
-                )
-            if existing["status"] == "success" and existing["response_body"]:
-                response_data = json.loads(existing["response_body"])
-                response_data["replayed"] = True
-                return IntakeResponse(**response_data)
+        existing = await db_executor.run(find_by_idempotency, settings.sqlite_path, idempotency_key)
+        replay = _replay(existing, body_hash) if existing else None
+        if replay:
+            return IntakeResponse(**replay)
 
-    try:
-        zammad_result = await zammad.create_ticket(payload)
-        erp_result = await erpnext.create_issue(payload, zammad_result.get("ticket_number"))
-        ticket_id_raw = zammad_result.get("ticket_id")
-        ticket_id = ticket_id_raw if isinstance(ticket_id_raw, int) else None
-        ticket_number = str(zammad_result.get("ticket_number") or "")
-        issue_ref = erp_result.get("issue")
-        if isinstance(issue_ref, str) and issue_ref:
-            await zammad.set_ticket_erp_issue(ticket_id, issue_ref, ticket_number)
-        response_data = {
-            "success": True,
-            "idempotency_key": idempotency_key,
-            "zammad_ticket_id": zammad_result.get("ticket_id"),
-            "zammad_ticket_number": zammad_result.get("ticket_number"),
-            "erpnext_issue": erp_result.get("issue"),
-            "replayed": False,
-        }
-        save_success(
+    if prefer and "respond-async" in prefer.lower():
+        job, _ = await db_executor.run(
+            create_intake_job,
             settings.sqlite_path,
             idempotency_key=idempotency_key,
             request_hash=body_hash,
             request_body=body,
-            response_body=response_data,
         )
-        return IntakeResponse(**response_data)
-    except HTTPException:
-        raise
-    except Exception as exc:
-        save_error(
+        _check_job_hash(job, body_hash)
+        if job["status"] != "done":
+            intake_jobs.notify()
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content=_job_out(job).model_dump(),
+                headers={"Location": f"/api/intake/jobs/{job['id']}"},
+            )
+        return IntakeResponse(**await _run_intake_job(job))
+
+    async def start() -> tuple[dict[str, Any], dict[str, Any]]:
+        # A new job is inserted under this request's lease, so no worker can claim it first.
+        job, claimed = await db_executor.run(
+            create_intake_job,
             settings.sqlite_path,
             idempotency_key=idempotency_key,
             request_hash=body_hash,
             request_body=body,
+            lease_seconds=settings.intake_lease_seconds,
+        )
+        _check_job_hash(job, body_hash)
+        return job, await _run_intake_job(job, claimed)
+
+    return IntakeResponse(**await _run_or_join(idempotency_key, body_hash, start))
+
+
+@app.post("/api/intake/batch", response_class=StreamingResponse, dependencies=[Depends(require_token)])
+async def intake_batch(payload: BoundedIntakeBatchRequest) -> StreamingResponse:
+    invalid: list[dict[str, Any]] = []
+    valid: list[tuple[int, str | None, dict[str, Any]]] = []
+    for index, raw in enumerate(payload.items):
+        try:
+            item = IntakeBatchItem.model_validate(raw)
+        except ValidationError as exc:
+            invalid.append({"index": index, "status": 422, "error": json.loads(exc.json(include_url=False))})
+            continue
+        valid.append((index, item.idempotency_key, item.model_dump(exclude={"idempotency_key"})))
+
+    # All idempotency lookups and job rows for the batch in one transaction. New rows start
+    # leased to this request; the leases of items still queued are renewed until they start.
+    bodies = [
+        {"idempotency_key": key, "request_hash": compute_hash(body), "request_body": body} for _, key, body in valid
+    ]
+    created = await db_executor.run(
+        create_intake_jobs, settings.sqlite_path, bodies, lease_seconds=settings.intake_lease_seconds
+    )
+    held = {job["id"] for _, job, claimed in created if job is not None and claimed}
+    waiting = set(held)
+    semaphore = asyncio.Semaphore(settings.intake_batch_concurrency)
+
+    async def keep_leases() -> None:
+        while waiting:
+            await asyncio.sleep(settings.intake_lease_seconds / 3)
+            await db_executor.run(
+                renew_intake_job_leases, settings.sqlite_path, list(waiting), settings.intake_lease_seconds
+            )
+
+    async def process(
+        index: int, entry: dict[str, Any], existing: dict[str, Any] | None, job: dict[str, Any] | None
+    ) -> dict[str, Any]:
+        line = {"index": index, "idempotency_key": entry["idempotency_key"], "job_id": job["id"] if job else None}
+        async with semaphore:
+            if job is not None:
+                waiting.discard(job["id"])
+            try:
+                # Items without a job are replays or conflicts; _replay answers both.
+                result = _replay(existing, entry["request_hash"]) if existing else None
+                if result is None:
+                    _check_job_hash(job, entry["request_hash"])
+                    # Repeats of a key within the batch share its row, and with it the batch's lease.
+                    result = await _run_or_join(
+                        entry["idempotency_key"], entry["request_hash"], lambda: _run_batch_job(job, job["id"] in held)
+                    )
+            except HTTPException as exc:
+                return {**line, "status": exc.status_code, "error": exc.detail}
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if task is not None and task.cancelling():
+                    raise
+                # The request leading the single flight for this key was cancelled, not this item.
+                return {**line, "status": 500, "error": "Intake was cancelled"}
+            except Exception as exc:
+                # One broken item (e.g. a sqlite error) must not cut the stream short for the others.
+                logger.exception("Batch intake item %s failed", index)
+                return {**line, "status": 500, "error": f"Internal error: {exc}"}
+        return {**line, "status": 200, "result": IntakeResponse(**result).model_dump()}
+
+    async def stream() -> AsyncIterator[str]:
+        tasks = [
+            asyncio.ensure_future(process(index, entry, existing, job))
+            for (index, _, _), entry, (existing, job, _) in zip(valid, bodies, created)
+        ]
+        renewer = asyncio.ensure_future(keep_leases())
+        try:
+            for line in invalid:
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+            for done in asyncio.as_completed(tasks):
+                yield json.dumps(await done, ensure_ascii=False) + "\n"
+        finally:
+            # Items not started when the client goes away go to the workers once their lease lapses.
+            renewer.cancel()
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def _replay(existing: dict[str, Any], body_hash: str) -> dict[str, Any] | None:
+    """Stored result for a repeated Idempotency-Key; 409 if the payload differs."""
+    if existing["request_hash"] != body_hash:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Idempotency-Key reused with different payload",
+        )
+    if existing["status"] == "success" and existing["response_body"]:
+        response_data = json.loads(existing["response_body"])
+        response_data["replayed"] = True
+        return response_data
+    return None
+
+
+def _check_job_hash(job: dict[str, Any], body_hash: str) -> None:
+    if job["request_hash"] != body_hash:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Idempotency-Key reused with different payload",
+        )
+
+
+async def _run_or_join(
+    idempotency_key: str | None,
+    body_hash: str,
+    start: Callable[[], Awaitable[tuple[dict[str, Any], dict[str, Any]]]],
+) -> dict[str, Any]:
+    """Run ``start`` (which returns the job and its result), or share the result of the in-flight run for the key."""
+    if not idempotency_key:
+        return (await start())[1]
+    # Concurrent retries of one key wait for the first request instead of racing it upstream.
+    (job, response_data), shared = await intake_flights.do(idempotency_key, start)
+    if shared:
+        _check_job_hash(job, body_hash)
+        response_data = {**response_data, "replayed": True}
+    return response_data
+
+
+async def _run_batch_job(job: dict[str, Any], held: bool) -> tuple[dict[str, Any], dict[str, Any]]:
+    if held:
+        # Give the item a full lease from now, not from when the batch was inserted. If the lease
+        # is gone (the job finished or a worker took over), fall back to claiming the job.
+        renewed = await db_executor.run(
+            renew_intake_job_leases, settings.sqlite_path, [job["id"]], settings.intake_lease_seconds
+        )
+        job, held = (renewed[0], True) if renewed else (job, False)
+    return job, await _run_intake_job(job, held)
+
+
+async def _run_intake_job(job: dict[str, Any], claimed: bool = False) -> dict[str, Any]:
+    """Run a job to its response; ``claimed`` means the caller already holds its lease."""
+    if job["status"] == "done" and job["response_body"]:
+        return {**job["response_body"], "replayed": True}
+    if not claimed:
+        leased = await db_executor.run(
+            claim_intake_job, settings.sqlite_path, job["id"], settings.intake_lease_seconds
+        )
+        if leased is None:
+            current = await db_executor.run(get_intake_job, settings.sqlite_path, job["id"])
+            if current and current["status"] == "done" and current["response_body"]:
+                return {**current["response_body"], "replayed": True}
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Intake is already in progress")
+        job = leased
+
+    try:
+        # Only the ticket is needed up front; the ERP issue and back-link follow in the background.
+        respond_after = "ticket" if settings.intake_defer_post_processing else None
+        return await intake_jobs.execute(job, respond_after=respond_after)
+    except Exception as exc:
+        await db_executor.run(
+            save_error,
+            settings.sqlite_path,
+            idempotency_key=job["idempotency_key"],
+            request_hash=job["request_hash"],
+            request_body=job["request_body"],
             error_text=str(exc),
         )
         raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Integration error: {exc}") from exc
 
 
+@app.get("/api/intake/jobs/{job_id}", response_model=IntakeJobOut, dependencies=[Depends(require_token)])
+async def intake_job_status(job_id: int) -> IntakeJobOut:
+    job = await db_executor.run(get_intake_job, settings.sqlite_path, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Intake job not found")
+    return _job_out(job)
+
+
 @app.post("/api/zammad/close-sync", response_model=CloseSyncResponse, dependencies=[Depends(require_token)])
 async def zammad_close_sync(payload: CloseSyncRequest) -> CloseSyncResponse:
     issue_name = payload.erp_issue_ref
     if not issue_name:
-        issue_name = find_erp_issue_by_ticket_number(settings.sqlite_path, payload.zammad_ticket_number)
+        issue_name = await db_executor.run(
+            find_erp_issue_by_ticket_number, settings.sqlite_path, payload.zammad_ticket_number
+        )
 
     if not issue_name:
         return CloseSyncResponse(
@@ -151,6 +405,13 @@ async def zammad_close_sync(payload: CloseSyncRequest) -> CloseSyncResponse:
 @app.post("/api/zammad/create-sync", response_model=CreateSyncResponse, dependencies=[Depends(require_token)])
 async def zammad_create_sync(payload: CreateSyncRequest) -> CreateSyncResponse:
     if payload.erp_issue_ref:
+        await db_executor.run(
+            save_ticket_link,
+            settings.sqlite_path,
+            ticket_id=payload.zammad_ticket_id,
+            ticket_number=payload.zammad_ticket_number,
+            erpnext_issue=payload.erp_issue_ref,
+        )
         return CreateSyncResponse(
             success=True,
             zammad_ticket_id=payload.zammad_ticket_id,
@@ -164,6 +425,13 @@ async def zammad_create_sync(payload: CreateSyncRequest) -> CreateSyncResponse:
         issue_ref = result.get("issue")
         if isinstance(issue_ref, str) and issue_ref:
             await zammad.set_ticket_erp_issue(payload.zammad_ticket_id, issue_ref, payload.zammad_ticket_number)
+            await db_executor.run(
+                save_ticket_link,
+                settings.sqlite_path,
+                ticket_id=payload.zammad_ticket_id,
+                ticket_number=payload.zammad_ticket_number,
+                erpnext_issue=issue_ref,
+            )
             return CreateSyncResponse(
                 success=True,
                 zammad_ticket_id=payload.zammad_ticket_id,
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Any, Literal
+
 from pydantic import BaseModel, Field
 
 
@@ -15,6 +17,15 @@ class IntakeRequest(BaseModel):
     tg_username: str | None = Field(default=None, max_length=64)
 
 
+class IntakeBatchItem(IntakeRequest):
+    idempotency_key: str | None = Field(default=None, max_length=255)
+
+
+class IntakeBatchRequest(BaseModel):
+    # Items are validated one by one, so a bad row is reported on its own result line.
+    items: list[dict[str, Any]] = Field(min_length=1)
+
+
 class IntakeResponse(BaseModel):
     success: bool
     idempotency_key: str | None
@@ -22,6 +33,20 @@ class IntakeResponse(BaseModel):
     zammad_ticket_number: str | None = None
     erpnext_issue: str | None = None
     replayed: bool = False
+    job_id: int | None = None
+    # False while the ERP issue / back-link are still being created in the background.
+    complete: bool = True
+
+
+class IntakeJobOut(BaseModel):
+    job_id: int
+    idempotency_key: str | None
+    status: Literal["pending", "running", "done", "dead"]
+    step: str
+    attempts: int
+    next_attempt_at: str | None = None
+    last_error: str | None = None
+    result: IntakeResponse | None = None
 
 
 class CloseSyncRequest(BaseModel):
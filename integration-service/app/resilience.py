@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+import httpx
+
+from app.config import Settings
+
+logger = logging.getLogger(__name__)
+
+# Concurrent failures count as one overload signal per interval, not one halving each.
+_DECREASE_INTERVAL = 1.0
+
+
+class UpstreamUnavailable(RuntimeError):
+    """Raised instead of calling an upstream that is known to be failing or overloaded."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: float) -> None:
+        super().__init__(f"{upstream} unavailable: {reason}, retry in {retry_after:.0f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: str | None) -> float:
+    """Seconds from a ``Retry-After`` header (delta-seconds or HTTP date); 0 if absent."""
+    if not value:
+        return 0.0
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over a sliding window of call outcomes.
+
+    The breaker opens when, over the last ``BREAKER_WINDOW_SECONDS`` and at least
+    ``BREAKER_MIN_CALLS`` calls, the failure rate or the slow-call rate reaches
+    its threshold. While open, calls fail fast. After ``BREAKER_OPEN_SECONDS``
+    (or the upstream's ``Retry-After``, if longer) a single probe is let through.
+    The probe's outcome closes the breaker or opens it again.
+    """
+
+    def __init__(self, name: str, settings: Settings) -> None:
+        self.name = name
+        self.window = settings.breaker_window_seconds
+        self.min_calls = settings.breaker_min_calls
+        self.failure_rate = settings.breaker_failure_rate
+        self.slow_call_seconds = settings.breaker_slow_call_seconds
+        self.slow_call_rate = settings.breaker_slow_call_rate
+        self.open_seconds = settings.breaker_open_seconds
+        self.state = "closed"
+        self.opened_total = 0
+        self.rejected_total = 0
+        self._calls: deque[tuple[float, bool, bool]] = deque()
+        self._open_until = 0.0
+        self._probing = False
+
+    def before_call(self) -> None:
+        now = time.monotonic()
+        if self.state == "open":
+            if now < self._open_until:
+                self.rejected_total += 1
+                raise UpstreamUnavailable(self.name, "circuit open", self._open_until - now)
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                self.rejected_total += 1
+                raise UpstreamUnavailable(self.name, "circuit half-open", 1.0)
+            self._probing = True
+
+    def abandon(self) -> None:
+        """The call ended without an upstream outcome (e.g. it was cancelled)."""
+        self._probing = False
+
+    def record(self, failed: bool, elapsed: float, retry_after: float = 0.0) -> None:
+        now = time.monotonic()
+        slow = elapsed >= self.slow_call_seconds
+        if self.state == "half_open":
+            self._probing = False
+            if failed or slow:
+                self._trip(now, retry_after)
+            else:
+                logger.info("Circuit for %s closed", self.name)
+                self.state = "closed"
+                self._calls.clear()
+            return
+        if self.state == "open":
+            return
+        self._calls.append((now, failed, slow))
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+        total = len(self._calls)
+        if total < self.min_calls:
+            return
+        failures = sum(1 for _, call_failed, _ in self._calls if call_failed)
+        slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+        if failures / total >= self.failure_rate or slow_calls / total >= self.slow_call_rate:
+            self._trip(now, retry_after)
+
+    def _trip(self, now: float, retry_after: float) -> None:
+        self.state = "open"
+        self.opened_total += 1
+        self._open_until = now + max(self.open_seconds, retry_after)
+        self._calls.clear()
+        logger.warning("Circuit for %s opened for %.0fs", self.name, self._open_until - now)
+
+
+class AIMDLimiter:
+    """Adaptive cap on concurrent calls to one upstream.
+
+    The limit grows by about one per ``limit`` successful calls (additive increase)
+    and halves on 429, 5xx or a transport error (multiplicative decrease). A
+    caller waits at most ``queue_timeout`` for a free slot. After ``Retry-After``,
+    new calls are rejected until the given time has passed.
+    """
+
+    def __init__(self, name: str, settings: Settings) -> None:
+        self.name = name
+        self.min_limit = max(1, settings.upstream_concurrency_min)
+        self.max_limit = max(self.min_limit, settings.upstream_concurrency_max)
+        self.limit = float(min(max(settings.upstream_concurrency_initial, self.min_limit), self.max_limit))
+        self.queue_timeout = settings.http_pool_timeout
+        self.max_retry_after = settings.upstream_retry_after_max
+        self.in_flight = 0
+        self.rejected_total = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._paused_until = 0.0
+        self._decreased_at = 0.0
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        if self._paused_until > now:
+            self.rejected_total += 1
+            raise UpstreamUnavailable(self.name, "rate limited", self._paused_until - now)
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return
+            self.rejected_total += 1
+            raise UpstreamUnavailable(self.name, "concurrency limit reached", 1.0) from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(None)
+            raise
+
+    def release(self, overloaded: bool | None) -> None:
+        """Free a slot; ``overloaded`` None means the call says nothing about upstream load."""
+        self.in_flight -= 1
+        if overloaded:
+            now = time.monotonic()
+            if now - self._decreased_at >= _DECREASE_INTERVAL:
+                self._decreased_at = now
+                self.limit = max(float(self.min_limit), self.limit / 2)
+        elif overloaded is not None:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+        self._wake()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + min(seconds, self.max_retry_after))
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            # Hand the slot over before the waiter runs, so no newcomer can take it.
+            self.in_flight += 1
+            waiter.set_result(None)
+
+
+class UpstreamGuard:
+    """Circuit breaker and concurrency limiter shared by every call to one upstream."""
+
+    def __init__(self, name: str, settings: Settings) -> None:
+        self.name = name
+        self.breaker = CircuitBreaker(name, settings)
+        self.limiter = AIMDLimiter(name, settings)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+            "opened_total": self.breaker.opened_total,
+            "rejected_total": self.breaker.rejected_total + self.limiter.rejected_total,
+        }
+
+
+class GuardedTransport(httpx.AsyncBaseTransport):
+    """Runs every request of an ``httpx.AsyncClient`` through an ``UpstreamGuard``."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, guard: UpstreamGuard) -> None:
+        self.inner = inner
+        self.guard = guard
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        breaker, limiter = self.guard.breaker, self.guard.limiter
+        breaker.before_call()
+        try:
+            await limiter.acquire()
+        except BaseException:
+            breaker.abandon()
+            raise
+        started = time.monotonic()
+        try:
+            response = await self.inner.handle_async_request(request)
+        except httpx.TransportError:
+            breaker.record(True, time.monotonic() - started)
+            limiter.release(True)
+            raise
+        except BaseException:
+            breaker.abandon()
+            limiter.release(None)
+            raise
+        overloaded = response.status_code == 429 or response.status_code >= 500
+        retry_after = parse_retry_after(response.headers.get("Retry-After")) if overloaded else 0.0
+        breaker.record(overloaded, time.monotonic() - started, retry_after)
+        if retry_after:
+            limiter.pause(retry_after)
+        limiter.release(overloaded)
+        return response
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """Coalesces concurrent calls that share a key onto one in-flight call.
+
+    The first caller for a key (the leader) runs ``fn``; callers that arrive
+    while it is running wait for the leader's result or exception instead of
+    repeating the work.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[str, asyncio.Future[T]] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """Return ``(result, shared)``; ``shared`` is True for followers."""
+        future = self._calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark the exception retrieved so a flight without followers is not logged.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
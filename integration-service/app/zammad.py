@@ -6,12 +6,17 @@ from typing import Any
 import httpx
 
 from app.config import Settings
+from app.customer_cache import CustomerCache, customer_payload_hash
+from app.http import UpstreamClient
 from app.models import IntakeRequest
 
 
-class ZammadClient:
+class ZammadClient(UpstreamClient):
+    upstream = "zammad"
+
     def __init__(self, settings: Settings) -> None:
-        self.settings = settings
+        super().__init__(settings)
+        self.customers = CustomerCache(settings)
 
     async def create_ticket(self, payload: IntakeRequest) -> dict[str, Any]:
         if not self.settings.zammad_token:
@@ -33,37 +38,25 @@ class ZammadClient:
             "Content-Type": "application/json",
         }
 
-        async with httpx.AsyncClient(timeout=20) as client:
-            customer_id = await self._resolve_customer_id(client, headers, payload)
-            request_data = {
-                "title": f"[Pixel SC] {payload.device} - {payload.customer_name}",
-                "group": self.settings.zammad_group,
-                "customer_id": customer_id,
-                "priority_id": self.settings.zammad_priority,
-                "state": self.settings.zammad_state,
-                "article": {
-                    "subject": "Intake from Telegram bot",
-                    "body": description,
-                    "type": "note",
-                    "internal": True,
-                },
-            }
-            # Map Telegram intake details to Zammad custom ticket attributes.
-            request_data["device_type"] = payload.device_type or ""
-            request_data["device_model"] = payload.model or ""
-            request_data["declared_issue"] = payload.problem
-            request_data["service_point"] = payload.service_point
-            if self.settings.zammad_intake_channel_field:
-                request_data[self.settings.zammad_intake_channel_field] = (
-                    self.settings.zammad_channel_telegram_value
-                )
+        client = self.http
+        customer_id, from_cache = await self._resolve_customer_id(client, headers, payload)
+        request_data = self._build_ticket_payload(payload, description, customer_id)
+        resp = await client.post(
+            f"{self.settings.zammad_base_url.rstrip('/')}/api/v1/tickets",
+            headers=headers,
+            json=request_data,
+        )
+        if from_cache and resp.status_code in (404, 422):
+            # The cached customer may have been deleted or merged in Zammad.
+            await self.customers.ainvalidate(self._build_customer_email(payload))
+            customer_id, _ = await self._resolve_customer_id(client, headers, payload)
             resp = await client.post(
                 f"{self.settings.zammad_base_url.rstrip('/')}/api/v1/tickets",
                 headers=headers,
-                json=request_data,
+                json=self._build_ticket_payload(payload, description, customer_id),
             )
-            resp.raise_for_status()
-            data = resp.json()
+        resp.raise_for_status()
+        data = resp.json()
 
         return {
             "ticket_id": data.get("id"),
@@ -71,6 +64,46 @@ class ZammadClient:
             "raw": data,
         }
 
+    async def resolve_customer(self, payload: IntakeRequest) -> int | None:
+        """Find or create the ticket's customer ahead of ``create_ticket``.
+
+        The id lands in the customer cache, so the ticket call that follows is a
+        single request. Returns None when Zammad is not configured.
+        """
+        if not self.settings.zammad_token:
+            return None
+        headers = {
+            "Authorization": f"Token token={self.settings.zammad_token}",
+            "Content-Type": "application/json",
+        }
+        customer_id, _ = await self._resolve_customer_id(self.http, headers, payload)
+        return customer_id
+
+    def _build_ticket_payload(self, payload: IntakeRequest, description: str, customer_id: int) -> dict[str, Any]:
+        request_data = {
+            "title": f"[Pixel SC] {payload.device} - {payload.customer_name}",
+            "group": self.settings.zammad_group,
+            "customer_id": customer_id,
+            "priority_id": self.settings.zammad_priority,
+            "state": self.settings.zammad_state,
+            "article": {
+                "subject": "Intake from Telegram bot",
+                "body": description,
+                "type": "note",
+                "internal": True,
+            },
+        }
+        # Map Telegram intake details to Zammad custom ticket attributes.
+        request_data["device_type"] = payload.device_type or ""
+        request_data["device_model"] = payload.model or ""
+        request_data["declared_issue"] = payload.problem
+        request_data["service_point"] = payload.service_point
+        if self.settings.zammad_intake_channel_field:
+            request_data[self.settings.zammad_intake_channel_field] = (
+                self.settings.zammad_channel_telegram_value
+            )
+        return request_data
+
     async def set_ticket_erp_issue(
         self,
         ticket_id: int | None,
@@ -89,29 +122,29 @@ class ZammadClient:
             "Content-Type": "application/json",
         }
         patch_payload = {self.settings.zammad_erp_issue_field: issue_ref}
-        async with httpx.AsyncClient(timeout=20) as client:
-            resolved_ticket_id = ticket_id
-            if resolved_ticket_id is None and ticket_number:
-                resolved_ticket_id = await self._find_ticket_id_by_number(client, headers, ticket_number)
+        client = self.http
+        resolved_ticket_id = ticket_id
+        if resolved_ticket_id is None and ticket_number:
+            resolved_ticket_id = await self._find_ticket_id_by_number(client, headers, ticket_number)
 
-            if resolved_ticket_id is None:
-                return
+        if resolved_ticket_id is None:
+            return
 
-            resp = await client.put(
-                f"{self.settings.zammad_base_url.rstrip('/')}/api/v1/tickets/{resolved_ticket_id}",
-                headers=headers,
-                json=patch_payload,
-            )
-            if resp.status_code == 404 and ticket_number:
-                # Fallback: ticket id in payload may be stale, resolve by number.
-                fallback_id = await self._find_ticket_id_by_number(client, headers, ticket_number)
-                if fallback_id is not None and fallback_id != resolved_ticket_id:
-                    resp = await client.put(
-                        f"{self.settings.zammad_base_url.rstrip('/')}/api/v1/tickets/{fallback_id}",
-                        headers=headers,
-                        json=patch_payload,
-                    )
-            resp.raise_for_status()
+        resp = await client.put(
+            f"{self.settings.zammad_base_url.rstrip('/')}/api/v1/tickets/{resolved_ticket_id}",
+            headers=headers,
+            json=patch_payload,
+        )
+        if resp.status_code == 404 and ticket_number:
+            # Fallback: ticket id in payload may be stale, resolve by number.
+            fallback_id = await self._find_ticket_id_by_number(client, headers, ticket_number)
+            if fallback_id is not None and fallback_id != resolved_ticket_id:
+                resp = await client.put(
+                    f"{self.settings.zammad_base_url.rstrip('/')}/api/v1/tickets/{fallback_id}",
+                    headers=headers,
+                    json=patch_payload,
+                )
+        resp.raise_for_status()
 
     async def _find_ticket_id_by_number(
         self,
@@ -145,17 +178,23 @@ class ZammadClient:
         client: httpx.AsyncClient,
         headers: dict[str, str],
         payload: IntakeRequest,
-    ) -> int:
+    ) -> tuple[int, bool]:
+        """Return the Zammad user id and whether it was served from cache without a round trip."""
         email = self._build_customer_email(payload)
         user_payload = self._build_customer_payload(payload, email)
+        payload_hash = customer_payload_hash(user_payload)
+
+        cached = await self.customers.aget(email)
+        if cached is not None:
+            if cached.payload_hash == payload_hash:
+                return cached.user_id, True
+            if await self._update_customer(client, headers, cached.user_id, email, user_payload, payload_hash):
+                return cached.user_id, False
+
         user_id = await self._find_user_id_by_email(client, headers, email)
         if user_id is not None:
-            await client.put(
-                f"{self.settings.zammad_base_url.rstrip('/')}/api/v1/users/{user_id}",
-                headers=headers,
-                json=user_payload,
-            )
-            return user_id
+            await self._update_customer(client, headers, user_id, email, user_payload, payload_hash)
+            return user_id, False
 
         create_resp = await client.post(
             f"{self.settings.zammad_base_url.rstrip('/')}/api/v1/users",
@@ -165,15 +204,38 @@ class ZammadClient:
         if create_resp.status_code >= 400:
             existing_id = await self._find_user_id_by_email(client, headers, email)
             if existing_id is not None:
-                return existing_id
+                return existing_id, False
             # Keep old behavior as fallback if dynamic customer creation fails.
-            return self.settings.zammad_customer_id
+            return self.settings.zammad_customer_id, False
 
         create_data = create_resp.json()
         created_id = create_data.get("id")
         if isinstance(created_id, int):
-            return created_id
-        return self.settings.zammad_customer_id
+            await self.customers.aput(email, created_id, payload_hash)
+            return created_id, False
+        return self.settings.zammad_customer_id, False
+
+    async def _update_customer(
+        self,
+        client: httpx.AsyncClient,
+        headers: dict[str, str],
+        user_id: int,
+        email: str,
+        user_payload: dict[str, Any],
+        payload_hash: str,
+    ) -> bool:
+        """PUT the customer payload; returns False if the user no longer exists."""
+        resp = await client.put(
+            f"{self.settings.zammad_base_url.rstrip('/')}/api/v1/users/{user_id}",
+            headers=headers,
+            json=user_payload,
+        )
+        if resp.status_code == 404:
+            await self.customers.ainvalidate(email)
+            return False
+        if resp.status_code < 400:
+            await self.customers.aput(email, user_id, payload_hash)
+        return True
 
     async def _find_user_id_by_email(
         self,
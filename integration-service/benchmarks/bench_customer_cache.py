@@ -0,0 +1,63 @@
+"""Upstream round trips per intake for returning customers, with and without the customer cache.
+
+Run from integration-service/:  python -m benchmarks.bench_customer_cache [--intakes 300 --latency 0.01]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from app.config import load_settings
+from app.db import init_db
+from app.models import IntakeRequest
+from app.zammad import ZammadClient
+from benchmarks.fake_zammad import FakeUpstream
+
+
+def _payload(idx: int, customers: int) -> IntakeRequest:
+    return IntakeRequest(
+        customer_name=f"Bench {idx % customers}",
+        phone="+79990000000",
+        device="iPhone 13",
+        problem="Does not power on",
+        service_point="Belorechenskaya",
+        tg_user_id=100000 + idx % customers,
+        tg_username="bench",
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--intakes", type=int, default=300)
+    parser.add_argument("--customers", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.01, help="fake upstream latency per request, seconds")
+    args = parser.parse_args()
+
+    with FakeUpstream(latency=args.latency) as upstream, tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.intakes} intakes from {args.customers} customers, {args.latency * 1000:.0f} ms upstream latency")
+        for label, ttl in (("no cache", 0.0), ("cache", 86400.0)):
+            settings = load_settings()
+            settings.zammad_base_url = upstream.url
+            settings.zammad_token = "bench"
+            settings.sqlite_path = str(Path(tmp) / f"{label.replace(' ', '_')}.db")
+            settings.zammad_customer_cache_ttl = ttl
+            init_db(settings.sqlite_path)
+            zammad = ZammadClient(settings)
+            upstream.reset()
+            started = time.perf_counter()
+            for idx in range(args.intakes):
+                await zammad.create_ticket(_payload(idx, args.customers))
+            elapsed = time.perf_counter() - started
+            await zammad.aclose()
+            requests = sum(upstream.stats["requests"].values())
+            print(
+                f"{label:<9} {elapsed:6.2f}s  {requests / args.intakes:4.2f} requests/intake  "
+                f"{dict(upstream.stats['requests'])}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+"""Event-loop lag and throughput of /api/intake with SQLite on and off the loop.
+
+"inline" calls the blocking sqlite3 helpers directly from the async handler,
+as the service used to; "executor" runs them on the bounded ``db_executor``
+pool. A probe task sleeps 1 ms in a loop and records how late it wakes up,
+which is how long every other request on the worker was stalled.
+
+Run from integration-service/:  python -m benchmarks.bench_event_loop [--intakes 400] [--concurrency 40]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+import httpx
+
+from app import main as main_module
+from app.customer_cache import CustomerCache
+from app.db import db_executor, init_db
+from benchmarks.fake_zammad import FakeUpstream
+
+
+async def _inline(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+async def _probe(lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+
+async def _run(intakes: int, concurrency: int, label: str) -> None:
+    transport = httpx.ASGITransport(app=main_module.app)
+    headers = {"Authorization": f"Bearer {main_module.settings.integration_token}"}
+    semaphore = asyncio.Semaphore(concurrency)
+    lags: list[float] = []
+    stop = asyncio.Event()
+
+    async def one(client: httpx.AsyncClient, idx: int) -> None:
+        async with semaphore:
+            resp = await client.post(
+                "/api/intake",
+                headers={**headers, "Idempotency-Key": f"{label}-{idx}"},
+                json={
+                    "customer_name": f"Bench {idx}",
+                    "phone": "+79990000000",
+                    "device": "iPhone 13",
+                    "problem": "Does not power on",
+                    "service_point": "Belorechenskaya",
+                    "tg_user_id": 100000 + idx,
+                },
+            )
+            resp.raise_for_status()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        probe = asyncio.create_task(_probe(lags, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client, idx) for idx in range(intakes)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] * 1000
+    print(
+        f"{label:<9} {elapsed:6.2f}s  {intakes / elapsed:7.1f} intakes/s  "
+        f"loop lag p50 {statistics.median(lags) * 1000:6.2f}ms  p99 {p99:6.2f}ms  max {lags[-1] * 1000:6.2f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--intakes", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.005, help="fake upstream delay per request, seconds")
+    args = parser.parse_args()
+
+    settings = main_module.settings
+    with FakeUpstream(latency=args.latency) as upstream, tempfile.TemporaryDirectory() as tmp:
+        settings.zammad_base_url = upstream.url
+        settings.zammad_token = "bench"
+        settings.integration_token = "bench"
+        settings.enable_erp_issue = False
+        print(f"{args.intakes} intakes, concurrency {args.concurrency}")
+        for label, inline in (("inline", True), ("executor", False)):
+            settings.sqlite_path = str(Path(tmp) / f"{label}.db")
+            init_db(settings.sqlite_path)
+            # Each run starts from a cold customer cache on its own database.
+            main_module.zammad.customers = CustomerCache(settings)
+            db_executor.start(settings.sqlite_threads)
+            if inline:
+                with mock.patch.object(db_executor, "run", _inline):
+                    await _run(args.intakes, args.concurrency, label)
+            else:
+                await _run(args.intakes, args.concurrency, label)
+        await main_module.zammad.aclose()
+        db_executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""Connection reuse of the shared upstream client against a local fake Zammad.
+
+"per-call" closes the client before every ZammadClient method call, which is what
+the old ``async with httpx.AsyncClient(...)`` blocks did; "shared" keeps one pooled
+client for the whole run.
+
+Run from integration-service/:  python -m benchmarks.bench_http_pool [--intakes 300]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from app.config import load_settings
+from app.db import init_db
+from app.models import IntakeRequest
+from app.zammad import ZammadClient
+from benchmarks.fake_zammad import FakeUpstream
+
+
+def _payload(idx: int) -> IntakeRequest:
+    return IntakeRequest(
+        customer_name=f"Bench {idx}",
+        phone="+79990000000",
+        device="iPhone 13",
+        problem="Does not power on",
+        service_point="Belorechenskaya",
+        tg_user_id=100000 + idx % 50,
+        tg_username="bench",
+    )
+
+
+async def _run(zammad: ZammadClient, intakes: int, per_call: bool) -> float:
+    started = time.perf_counter()
+    for idx in range(intakes):
+        if per_call:
+            await zammad.aclose()
+        result = await zammad.create_ticket(_payload(idx))
+        if per_call:
+            await zammad.aclose()
+        await zammad.set_ticket_erp_issue(result["ticket_id"], f"ISS-{idx}", result["ticket_number"])
+    return time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--intakes", type=int, default=300)
+    args = parser.parse_args()
+
+    with FakeUpstream() as upstream, tempfile.TemporaryDirectory() as tmp:
+        settings = load_settings()
+        settings.zammad_base_url = upstream.url
+        settings.zammad_token = "bench"
+        settings.sqlite_path = str(Path(tmp) / "bench.db")
+        # Measure connection reuse alone; bench_customer_cache covers the cache.
+        settings.zammad_customer_cache_ttl = 0
+        init_db(settings.sqlite_path)
+        print(f"{args.intakes} sequential intakes")
+        for label, per_call in (("per-call", True), ("shared", False)):
+            zammad = ZammadClient(settings)
+            upstream.reset()
+            elapsed = await _run(zammad, args.intakes, per_call)
+            await zammad.aclose()
+            requests = sum(upstream.stats["requests"].values())
+            print(
+                f"{label:<9} {elapsed:6.2f}s  {args.intakes / elapsed:7.1f} intakes/s  "
+                f"{requests} requests over {len(upstream.stats['connections'])} TCP connections"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
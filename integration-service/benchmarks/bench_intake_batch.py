@@ -0,0 +1,102 @@
+"""Bulk ingestion: one ``POST /api/intake`` per order vs ``POST /api/intake/batch``.
+
+Drives the app in-process against a local fake Zammad that adds ``--latency``
+seconds to every request. "single" sends the orders one request at a time, the
+way a migration script calling ``/api/intake`` in a loop does. "batch" sends
+them in ``--batch-size`` chunks to ``/api/intake/batch`` and reads the NDJSON
+stream; items run ``INTAKE_BATCH_CONCURRENCY`` at a time on the shared clients.
+
+Run from integration-service/:  python -m benchmarks.bench_intake_batch [--items 1000]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from app import main as main_module
+from benchmarks.fake_zammad import FakeUpstream
+
+HEADERS = {"Authorization": "Bearer bench"}
+
+
+def _item(label: str, idx: int) -> dict:
+    return {
+        "customer_name": f"Bench {idx}",
+        "phone": "+79990000000",
+        "device": "iPhone 13",
+        "problem": "Does not power on",
+        "service_point": "Belorechenskaya",
+        "tg_user_id": 100000 + idx % 50,
+        "idempotency_key": f"{label}-{idx}",
+    }
+
+
+async def _single(client: httpx.AsyncClient, items: list[dict]) -> Counter:
+    statuses: Counter = Counter()
+    for item in items:
+        body = dict(item)
+        key = body.pop("idempotency_key")
+        resp = await client.post("/api/intake", json=body, headers={**HEADERS, "Idempotency-Key": key})
+        statuses[resp.status_code] += 1
+    return statuses
+
+
+async def _batch(client: httpx.AsyncClient, items: list[dict], batch_size: int) -> Counter:
+    statuses: Counter = Counter()
+    for start in range(0, len(items), batch_size):
+        chunk = items[start : start + batch_size]
+        async with client.stream("POST", "/api/intake/batch", json={"items": chunk}, headers=HEADERS) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if line:
+                    statuses[json.loads(line)["status"]] += 1
+    return statuses
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    with FakeUpstream(latency=args.latency) as upstream, tempfile.TemporaryDirectory() as tmp:
+        settings = main_module.settings
+        settings.integration_token = "bench"
+        settings.sqlite_path = str(Path(tmp) / "bench.db")
+        settings.zammad_base_url = upstream.url
+        settings.zammad_token = "bench"
+        main_module.on_startup()
+        await main_module.open_upstream_clients()
+        transport = httpx.ASGITransport(app=main_module.app)
+        print(
+            f"{args.items} intakes against a fake Zammad ({args.latency * 1000:.0f}ms per request), "
+            f"batch concurrency {settings.intake_batch_concurrency}"
+        )
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for label in ("single", "batch"):
+                items = [_item(label, idx) for idx in range(args.items)]
+                upstream.reset()
+                started = time.perf_counter()
+                if label == "single":
+                    statuses = await _single(client, items)
+                else:
+                    statuses = await _batch(client, items, args.batch_size)
+                await main_module.intake_jobs.drain()
+                elapsed = time.perf_counter() - started
+                print(
+                    f"{label:<7} {elapsed:6.2f}s  {args.items / elapsed:7.1f} intakes/s  "
+                    f"statuses {dict(statuses)}  upstream requests {sum(upstream.stats['requests'].values())}"
+                )
+        await main_module.close_upstream_clients()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""Intake response latency: full pipeline vs responding once the Zammad ticket exists.
+
+Drives ``POST /api/intake`` in-process against a local fake Zammad/ERPNext that
+adds ``--latency`` seconds to every request. "inline" is the old flow
+(``INTAKE_DEFER_POST_PROCESSING=false``): the handler waits for the customer,
+ticket, ERP issue and back-link calls. "deferred" returns after the ticket, and
+the ERP issue and back-link finish in background tasks, which are drained
+(and checked) before the next mode runs. The fake shares this process's CPU, so
+with a very small ``--latency`` the run measures CPU, not upstream waiting.
+
+Run from integration-service/:  python -m benchmarks.bench_intake_latency [--intakes 200]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from app import main as main_module
+from benchmarks.fake_zammad import FakeUpstream
+
+
+def _payload(idx: int) -> dict:
+    return {
+        "customer_name": f"Bench {idx}",
+        "phone": "+79990000000",
+        "device": "iPhone 13",
+        "problem": "Does not power on",
+        "service_point": "Belorechenskaya",
+        "tg_user_id": 100000 + idx % 50,
+    }
+
+
+async def _run(client: httpx.AsyncClient, label: str, intakes: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one(idx: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            resp = await client.post(
+                "/api/intake",
+                json=_payload(idx),
+                headers={"Authorization": "Bearer bench", "Idempotency-Key": f"{label}-{idx}"},
+            )
+            latencies.append(time.perf_counter() - started)
+            resp.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(idx) for idx in range(intakes)))
+    responded = time.perf_counter() - started
+    await main_module.intake_jobs.drain()
+    finished = time.perf_counter() - started
+    with sqlite3.connect(main_module.settings.sqlite_path) as conn:
+        done = conn.execute(
+            "SELECT COUNT(*) FROM intake_jobs WHERE status = 'done' AND idempotency_key LIKE ?", (f"{label}-%",)
+        ).fetchone()[0]
+    p99 = statistics.quantiles(latencies, n=100)[98]
+    print(
+        f"{label:<9} p50 {statistics.median(latencies) * 1000:7.1f}ms  p99 {p99 * 1000:7.1f}ms  "
+        f"all responded {responded:5.2f}s  all linked {finished:5.2f}s  done {done}/{intakes}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--intakes", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with FakeUpstream(latency=args.latency) as upstream, tempfile.TemporaryDirectory() as tmp:
+        settings = main_module.settings
+        settings.integration_token = "bench"
+        settings.sqlite_path = str(Path(tmp) / "bench.db")
+        settings.zammad_base_url = upstream.url
+        settings.zammad_token = "bench"
+        settings.enable_erp_issue = True
+        settings.erpnext_base_url = upstream.url
+        settings.erpnext_api_key = "bench"
+        settings.erpnext_api_secret = "bench"
+        main_module.on_startup()
+        await main_module.open_upstream_clients()
+        transport = httpx.ASGITransport(app=main_module.app)
+        print(
+            f"{args.intakes} intakes, {args.concurrency} concurrent, "
+            f"{args.latency * 1000:.0f}ms per upstream request"
+        )
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for label, deferred in (("inline", False), ("deferred", True)):
+                settings.intake_defer_post_processing = deferred
+                await _run(client, label, args.intakes, args.concurrency)
+        await main_module.close_upstream_clients()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""Close-sync issue lookup: JSON scan over intake history vs the ticket_links index.
+
+Run from integration-service/:  python -m benchmarks.bench_ticket_links [--intakes 1000000]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from app.db import find_erp_issue_by_ticket_number, init_db
+
+
+def _legacy_lookup(sqlite_path: str, ticket_number: str) -> str | None:
+    # The previous implementation: parse every successful response in Python.
+    with sqlite3.connect(sqlite_path) as conn:
+        rows = conn.execute(
+            """
+            SELECT response_body
+            FROM intake_requests
+            WHERE status = 'success' AND response_body IS NOT NULL
+            ORDER BY id DESC
+            """
+        ).fetchall()
+    for (response_body,) in rows:
+        data = json.loads(response_body)
+        if str(data.get("zammad_ticket_number") or "") == str(ticket_number):
+            return data.get("erpnext_issue") or None
+    return None
+
+
+def _seed(sqlite_path: str, intakes: int) -> None:
+    init_db(sqlite_path)
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.executemany(
+            """
+            INSERT INTO intake_requests(idempotency_key, request_hash, request_body, response_body, status)
+            VALUES(?, 'h', '{}', ?, 'success')
+            """,
+            (
+                (
+                    f"bench-{idx}",
+                    json.dumps(
+                        {
+                            "success": True,
+                            "zammad_ticket_id": idx,
+                            "zammad_ticket_number": str(10000 + idx),
+                            "erpnext_issue": f"ISS-{idx:07d}",
+                        }
+                    ),
+                )
+                for idx in range(intakes)
+            ),
+        )
+        # Rerun the migration so ticket_links is backfilled from the seeded history.
+        conn.execute("PRAGMA user_version = 0")
+        conn.commit()
+    started = time.perf_counter()
+    init_db(sqlite_path)
+    print(f"backfill of {intakes} intakes: {time.perf_counter() - started:.2f}s")
+
+
+def _time(lookup, sqlite_path: str, numbers: list[str]) -> float:
+    started = time.perf_counter()
+    for number in numbers:
+        assert lookup(sqlite_path, number)
+    return (time.perf_counter() - started) / len(numbers) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--intakes", type=int, default=200_000)
+    parser.add_argument("--lookups", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_path = str(Path(tmp) / "bench.db")
+        _seed(sqlite_path, args.intakes)
+        # Oldest tickets are the worst case for the newest-first scan.
+        numbers = [str(10000 + idx) for idx in range(args.lookups)]
+        legacy_ms = _time(_legacy_lookup, sqlite_path, numbers)
+        indexed_ms = _time(find_erp_issue_by_ticket_number, sqlite_path, numbers)
+    print(f"json scan:    {legacy_ms:9.2f} ms/lookup")
+    print(f"ticket_links: {indexed_ms:9.2f} ms/lookup")
+
+
+if __name__ == "__main__":
+    main()
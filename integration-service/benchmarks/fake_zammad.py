@@ -0,0 +1,107 @@
+"""Minimal in-process fake of the Zammad/ERPNext endpoints used by integration-service.
+
+``FakeUpstream`` runs uvicorn in a background thread on a free local port and
+counts requests and distinct client TCP connections, so benchmarks can show
+connection reuse. Optional ``latency`` adds a per-request delay.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import re
+import socket
+import threading
+import time
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+_ID_SUFFIX = re.compile(r"/\d+$")
+
+
+def build_app(stats: dict, latency: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    ids = itertools.count(1000)
+
+    @app.middleware("http")
+    async def track(request: Request, call_next):
+        route = _ID_SUFFIX.sub("/{id}", request.url.path)
+        stats["requests"][f"{request.method} {route}"] += 1
+        if request.client:
+            stats["connections"].add((request.client.host, request.client.port))
+        if latency:
+            await asyncio.sleep(latency)
+        return await call_next(request)
+
+    @app.get("/api/v1/users/search")
+    async def users_search(query: str):
+        email = query.split(":", 1)[-1]
+        user_id = stats["users"].get(email)
+        return [{"id": user_id, "email": email}] if user_id else []
+
+    @app.post("/api/v1/users")
+    async def users_create(request: Request):
+        body = await request.json()
+        user_id = next(ids)
+        stats["users"][body.get("email")] = user_id
+        return {"id": user_id}
+
+    @app.put("/api/v1/users/{user_id}")
+    async def users_update(user_id: int):
+        return {"id": user_id}
+
+    @app.post("/api/v1/tickets")
+    async def tickets_create():
+        ticket_id = next(ids)
+        return {"id": ticket_id, "number": str(60000 + ticket_id)}
+
+    @app.put("/api/v1/tickets/{ticket_id}")
+    async def tickets_update(ticket_id: int):
+        return {"id": ticket_id}
+
+    @app.get("/api/v1/tickets/search")
+    async def tickets_search(query: str):
+        return []
+
+    @app.post("/api/resource/{doctype}")
+    async def erp_create(doctype: str):
+        return {"data": {"name": f"ISS-2026-{next(ids):05d}"}}
+
+    return app
+
+
+class FakeUpstream:
+    def __init__(self, latency: float = 0.0) -> None:
+        self.stats: dict = {"requests": Counter(), "connections": set(), "users": {}}
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        self.port = sock.getsockname()[1]
+        sock.close()
+        config = uvicorn.Config(
+            build_app(self.stats, latency),
+            host="127.0.0.1",
+            port=self.port,
+            log_level="warning",
+            timeout_keep_alive=60,
+        )
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def reset(self) -> None:
+        self.stats["requests"].clear()
+        self.stats["connections"].clear()
+
+    def __enter__(self) -> "FakeUpstream":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
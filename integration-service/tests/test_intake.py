@@ -1,18 +1,43 @@
 ﻿from __future__ import annotations
 
 from pathlib import Path
+import asyncio
 import base64
+import dataclasses
+import json
+import sqlite3
+import threading
+import time
+
+import httpx
 
 from fastapi.testclient import TestClient
 
 from app import main as main_module
+from app.customer_cache import CustomerCache
+from app.db import (
+    claim_due_intake_job,
+    compute_hash,
+    find_erp_issue_by_ticket_number,
+    init_db,
+    save_success,
+    save_ticket_link,
+)
+from app.http import build_http_client
+from app.models import IntakeRequest
+from app.resilience import GuardedTransport, UpstreamUnavailable
+from app.zammad import ZammadClient
 
 
 def _client(tmp_path: Path) -> TestClient:
     db_path = tmp_path / "integration-test.db"
     main_module.settings.sqlite_path = str(db_path)  # type: ignore[misc]
     main_module.settings.integration_token = "test-token"  # type: ignore[misc]
+    # Each TestClient request runs on its own event loop, so deferred tasks would not finish.
+    main_module.settings.intake_defer_post_processing = False  # type: ignore[misc]
     main_module.on_startup()
+    # The module-level client outlives each test's database, so its customer LRU must not.
+    main_module.zammad.customers = CustomerCache(main_module.settings)
     return TestClient(main_module.app)
 
 
@@ -171,6 +196,78 @@ def test_close_sync_updates_erp_issue(monkeypatch, tmp_path: Path):
     assert body["erpnext_issue"] == "ISS-2026-00099"
 
 
+def test_close_sync_resolves_issue_from_ticket_links(monkeypatch, tmp_path: Path):
+    async def fake_zammad_create(payload):
+        return {"ticket_id": 303, "ticket_number": "67303"}
+
+    async def fake_erp_create(payload, zammad_ticket_number):
+        return {"issue": "ISS-2026-00303"}
+
+    async def fake_set_ticket_erp_issue(ticket_id, issue_ref, ticket_number=None):
+        return None
+
+    async def fake_sync_close(issue_name, payload):
+        return {"issue": issue_name, "updated": True}
+
+    monkeypatch.setattr(main_module.zammad, "create_ticket", fake_zammad_create)
+    monkeypatch.setattr(main_module.zammad, "set_ticket_erp_issue", fake_set_ticket_erp_issue)
+    monkeypatch.setattr(main_module.erpnext, "create_issue", fake_erp_create)
+    monkeypatch.setattr(main_module.erpnext, "sync_close", fake_sync_close)
+
+    client = _client(tmp_path)
+    headers = {"Authorization": "Bearer test-token"}
+    intake = {
+        "customer_name": "Ivan",
+        "phone": "+79990000000",
+        "device": "iPhone 13",
+        "problem": "Does not power on",
+        "service_point": "Belorechenskaya",
+        "tg_user_id": 123,
+    }
+    assert client.post("/api/intake", json=intake, headers=headers).status_code == 200
+
+    resp = client.post(
+        "/api/zammad/close-sync",
+        json={"zammad_ticket_number": "67303", "status": "Closed"},
+        headers=headers,
+    )
+    assert resp.status_code == 200
+    assert resp.json()["erpnext_issue"] == "ISS-2026-00303"
+
+    with sqlite3.connect(main_module.settings.sqlite_path) as conn:
+        plan = " ".join(
+            str(row[-1])
+            for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT erpnext_issue FROM ticket_links WHERE zammad_ticket_number = ?",
+                ("67303",),
+            )
+        )
+    assert "USING INDEX" in plan
+
+
+def test_ticket_links_backfilled_from_existing_intakes(tmp_path: Path):
+    db_path = str(tmp_path / "legacy.db")
+    init_db(db_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM ticket_links")
+        conn.execute("PRAGMA user_version = 0")
+        for idx, (number, issue) in enumerate([("500", "ISS-OLD"), ("501", None), ("500", "ISS-NEW")]):
+            conn.execute(
+                """
+                INSERT INTO intake_requests(idempotency_key, request_hash, request_body, response_body, status)
+                VALUES(?, 'h', '{}', ?, 'success')
+                """,
+                (f"legacy-{idx}", json.dumps({"zammad_ticket_number": number, "erpnext_issue": issue})),
+            )
+        conn.commit()
+
+    init_db(db_path)
+
+    assert find_erp_issue_by_ticket_number(db_path, "500") == "ISS-NEW"
+    assert find_erp_issue_by_ticket_number(db_path, "501") is None
+    assert find_erp_issue_by_ticket_number(db_path, "999") is None
+
+
 def test_close_sync_skips_when_issue_not_found(monkeypatch, tmp_path: Path):
     async def fake_sync_close(issue_name, payload):
         raise AssertionError("sync_close should not be called")
@@ -222,6 +319,7 @@ def test_create_sync_creates_issue_and_writes_back(monkeypatch, tmp_path: Path):
     assert body["created"] is True
     assert body["erpnext_issue"] == "ISS-2026-00123"
     assert calls == [(999, "ISS-2026-00123", "67999")]
+    assert find_erp_issue_by_ticket_number(main_module.settings.sqlite_path, "67999") == "ISS-2026-00123"
 
 
 def test_create_sync_skips_if_erp_issue_exists(monkeypatch, tmp_path: Path):
@@ -248,3 +346,641 @@ def test_create_sync_skips_if_erp_issue_exists(monkeypatch, tmp_path: Path):
     assert body["success"] is True
     assert body["created"] is False
     assert body["erpnext_issue"] == "ISS-2026-00999"
+
+
+def test_upstream_client_is_pooled_and_reused():
+    settings = main_module.settings
+    http = build_http_client(settings)
+    assert http.timeout.connect == settings.http_connect_timeout
+    assert http.timeout.read == settings.http_read_timeout
+    asyncio.run(http.aclose())
+
+    zammad = ZammadClient(settings)
+    first = zammad.http
+    assert zammad.http is first
+    asyncio.run(zammad.aclose())
+    assert first.is_closed
+    assert zammad.http is not first
+    asyncio.run(zammad.aclose())
+
+
+def test_zammad_customer_cache_skips_search_and_unchanged_put(tmp_path: Path):
+    settings = dataclasses.replace(
+        main_module.settings,
+        sqlite_path=str(tmp_path / "cache.db"),
+        zammad_token="zammad-token",
+        zammad_base_url="http://zammad.test",
+    )
+    init_db(settings.sqlite_path)
+    calls: list[tuple[str, str]] = []
+    deleted_users: set[int] = set()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append((request.method, request.url.path))
+        if request.url.path == "/api/v1/users/search":
+            return httpx.Response(200, json=[])
+        if request.url.path == "/api/v1/users":
+            return httpx.Response(201, json={"id": 70 + len(deleted_users)})
+        if request.url.path.startswith("/api/v1/users/"):
+            user_id = int(request.url.path.rsplit("/", 1)[1])
+            return httpx.Response(404 if user_id in deleted_users else 200, json={})
+        return httpx.Response(201, json={"id": 1, "number": "1"})
+
+    payload = IntakeRequest(
+        customer_name="Ivan",
+        phone="+79990000000",
+        device="iPhone 13",
+        problem="Does not power on",
+        service_point="Belorechenskaya",
+        tg_user_id=123,
+    )
+
+    async def scenario() -> None:
+        zammad = ZammadClient(settings)
+        zammad._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        await zammad.create_ticket(payload)
+        assert [path for _, path in calls] == ["/api/v1/users/search", "/api/v1/users", "/api/v1/tickets"]
+
+        calls.clear()
+        await zammad.create_ticket(payload)
+        assert calls == [("POST", "/api/v1/tickets")]
+
+        # A fresh client (e.g. after a restart) reads the cache back from SQLite.
+        restarted = ZammadClient(settings)
+        restarted._http = zammad.http
+        calls.clear()
+        changed = payload.model_copy(update={"phone": "+79991111111"})
+        await restarted.create_ticket(changed)
+        assert calls == [("PUT", "/api/v1/users/70"), ("POST", "/api/v1/tickets")]
+
+        deleted_users.add(70)
+        calls.clear()
+        await restarted.create_ticket(payload)
+        assert calls == [
+            ("PUT", "/api/v1/users/70"),
+            ("GET", "/api/v1/users/search"),
+            ("POST", "/api/v1/users"),
+            ("POST", "/api/v1/tickets"),
+        ]
+        assert restarted.customers.get("tg_123@local.invalid").user_id == 71
+        await zammad.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_db_helpers_run_off_the_event_loop(tmp_path: Path):
+    from app.db import db_executor
+
+    db_executor.start(2)
+    db_path = str(tmp_path / "executor.db")
+    init_db(db_path)
+
+    async def scenario() -> None:
+        worker_thread = await db_executor.run(threading.get_ident)
+        assert worker_thread != threading.get_ident()
+        await asyncio.gather(
+            *(
+                db_executor.run(save_ticket_link, db_path, ticket_id=idx, ticket_number=str(idx), erpnext_issue=f"ISS-{idx}")
+                for idx in range(20)
+            )
+        )
+        assert await db_executor.run(find_erp_issue_by_ticket_number, db_path, "5") == "ISS-5"
+
+    asyncio.run(scenario())
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM ticket_links").fetchone()[0] == 20
+
+
+def test_intake_job_resumes_after_erp_failure_without_new_ticket(monkeypatch, tmp_path: Path):
+    tickets: list[str] = []
+    erp_calls: list[str | None] = []
+    links: list[tuple[int | None, str, str | None]] = []
+
+    async def fake_zammad_create(payload):
+        tickets.append(payload.customer_name)
+        return {"ticket_id": 404, "ticket_number": "67404"}
+
+    async def fake_erp_create(payload, zammad_ticket_number):
+        erp_calls.append(zammad_ticket_number)
+        if len(erp_calls) == 1:
+            raise RuntimeError("ERPNext is down")
+        return {"issue": "ISS-2026-00404"}
+
+    async def fake_set_ticket_erp_issue(ticket_id, issue_ref, ticket_number=None):
+        links.append((ticket_id, issue_ref, ticket_number))
+
+    monkeypatch.setattr(main_module.zammad, "create_ticket", fake_zammad_create)
+    monkeypatch.setattr(main_module.zammad, "set_ticket_erp_issue", fake_set_ticket_erp_issue)
+    monkeypatch.setattr(main_module.erpnext, "create_issue", fake_erp_create)
+    monkeypatch.setattr(main_module.settings, "intake_backoff_base", 0)
+
+    client = _client(tmp_path)
+    headers = {"Authorization": "Bearer test-token", "Idempotency-Key": "resume-1"}
+    payload = {
+        "customer_name": "Ivan",
+        "phone": "+79990000000",
+        "device": "iPhone 13",
+        "problem": "Does not power on",
+        "service_point": "Belorechenskaya",
+        "tg_user_id": 123,
+    }
+    failed = client.post("/api/intake", json=payload, headers=headers)
+    assert failed.status_code == 502
+
+    with sqlite3.connect(main_module.settings.sqlite_path) as conn:
+        job_id, job_status, step, attempts = conn.execute(
+            "SELECT id, status, step, attempts FROM intake_jobs WHERE idempotency_key = 'resume-1'"
+        ).fetchone()
+    assert (job_status, step, attempts) == ("pending", "erp_issue", 1)
+
+    assert asyncio.run(main_module.intake_jobs.run_due()) is True
+    assert tickets == ["Ivan"]
+    assert erp_calls == ["67404", "67404"]
+    assert links == [(404, "ISS-2026-00404", "67404")]
+
+    job = client.get(f"/api/intake/jobs/{job_id}", headers=headers).json()
+    assert job["status"] == "done"
+    assert job["result"]["erpnext_issue"] == "ISS-2026-00404"
+
+    replay = client.post("/api/intake", json=payload, headers=headers)
+    assert replay.status_code == 200
+    assert replay.json()["replayed"] is True
+    assert replay.json()["zammad_ticket_number"] == "67404"
+    assert find_erp_issue_by_ticket_number(main_module.settings.sqlite_path, "67404") == "ISS-2026-00404"
+
+
+def test_intake_async_mode_returns_job_and_dead_letters(monkeypatch, tmp_path: Path):
+    async def fake_zammad_create(payload):
+        raise RuntimeError("Zammad is down")
+
+    monkeypatch.setattr(main_module.zammad, "create_ticket", fake_zammad_create)
+    monkeypatch.setattr(main_module.settings, "intake_backoff_base", 0)
+    monkeypatch.setattr(main_module.settings, "intake_max_attempts", 2)
+
+    client = _client(tmp_path)
+    headers = {"Authorization": "Bearer test-token", "Idempotency-Key": "async-1", "Prefer": "respond-async"}
+    payload = {
+        "customer_name": "Ivan",
+        "phone": "+79990000000",
+        "device": "iPhone 13",
+        "problem": "Does not power on",
+        "service_point": "Belorechenskaya",
+        "tg_user_id": 123,
+    }
+    accepted = client.post("/api/intake", json=payload, headers=headers)
+    assert accepted.status_code == 202
+    job = accepted.json()
+    assert job["status"] == "pending"
+    assert accepted.headers["Location"] == f"/api/intake/jobs/{job['job_id']}"
+
+    again = client.post("/api/intake", json=payload, headers=headers)
+    assert again.json()["job_id"] == job["job_id"]
+    conflict = client.post("/api/intake", json={**payload, "phone": "+70000000000"}, headers=headers)
+    assert conflict.status_code == 409
+
+    assert asyncio.run(main_module.intake_jobs.run_due()) is True
+    assert asyncio.run(main_module.intake_jobs.run_due()) is True
+    assert asyncio.run(main_module.intake_jobs.run_due()) is False
+
+    status = client.get(f"/api/intake/jobs/{job['job_id']}", headers=headers).json()
+    assert status["status"] == "dead"
+    assert status["attempts"] == 2
+    assert status["step"] == "ticket"
+    assert "Zammad is down" in status["last_error"]
+
+
+def test_concurrent_duplicate_intakes_share_one_upstream_call(monkeypatch, tmp_path: Path):
+    tickets: list[str] = []
+
+    async def fake_zammad_create(payload):
+        tickets.append(payload.customer_name)
+        await asyncio.sleep(0.2)
+        return {"ticket_id": 505, "ticket_number": "67505"}
+
+    async def fake_erp_create(payload, zammad_ticket_number):
+        return {"issue": None}
+
+    monkeypatch.setattr(main_module.zammad, "create_ticket", fake_zammad_create)
+    monkeypatch.setattr(main_module.erpnext, "create_issue", fake_erp_create)
+
+    _client(tmp_path)
+    headers = {"Authorization": "Bearer test-token", "Idempotency-Key": "storm-1"}
+    payload = {
+        "customer_name": "Ivan",
+        "phone": "+79990000000",
+        "device": "iPhone 13",
+        "problem": "Does not power on",
+        "service_point": "Belorechenskaya",
+        "tg_user_id": 123,
+    }
+
+    async def scenario() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=main_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                *(client.post("/api/intake", json=payload, headers=headers) for _ in range(5))
+            )
+
+    responses = asyncio.run(scenario())
+    assert [resp.status_code for resp in responses] == [200] * 5
+    assert {resp.json()["zammad_ticket_number"] for resp in responses} == {"67505"}
+    assert sorted(resp.json()["replayed"] for resp in responses) == [False, True, True, True, True]
+    assert tickets == ["Ivan"]
+    assert len(main_module.intake_flights) == 0
+
+
+def test_worker_polling_between_insert_and_run_cannot_take_a_sync_intake(monkeypatch, tmp_path: Path):
+    async def fake_zammad_create(payload):
+        return {"ticket_id": 506, "ticket_number": "67506"}
+
+    async def fake_erp_create(payload, zammad_ticket_number):
+        return {"issue": None}
+
+    monkeypatch.setattr(main_module.zammad, "create_ticket", fake_zammad_create)
+    monkeypatch.setattr(main_module.erpnext, "create_issue", fake_erp_create)
+    worker_claims: list[dict | None] = []
+    real_create = main_module.create_intake_job
+
+    def create_then_worker_polls(*args, **kwargs):
+        job = real_create(*args, **kwargs)
+        # A background worker wakes up right after the row is committed.
+        worker_claims.append(claim_due_intake_job(main_module.settings.sqlite_path, 60))
+        return job
+
+    monkeypatch.setattr(main_module, "create_intake_job", create_then_worker_polls)
+    client = _client(tmp_path)
+    resp = client.post(
+        "/api/intake",
+        json={
+            "customer_name": "Ivan",
+            "phone": "+79990000000",
+            "device": "iPhone 13",
+            "problem": "Does not power on",
+            "service_point": "Belorechenskaya",
+            "tg_user_id": 123,
+        },
+        headers={"Authorization": "Bearer test-token", "Idempotency-Key": "race-1"},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["zammad_ticket_number"] == "67506"
+    assert worker_claims == [None]
+
+
+def _guarded_zammad(tmp_path: Path, handler, **overrides) -> ZammadClient:
+    settings = dataclasses.replace(
+        main_module.settings,
+        sqlite_path=str(tmp_path / "guard.db"),
+        zammad_token="zammad-token",
+        zammad_base_url="http://zammad.test",
+        **overrides,
+    )
+    zammad = ZammadClient(settings)
+    zammad._http = httpx.AsyncClient(transport=GuardedTransport(httpx.MockTransport(handler), zammad.guard))
+    return zammad
+
+
+def test_circuit_breaker_fails_fast_and_recovers_through_probe(tmp_path: Path):
+    upstream = {"down": True, "calls": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        upstream["calls"] += 1
+        return httpx.Response(503 if upstream["down"] else 200, json={})
+
+    zammad = _guarded_zammad(
+        tmp_path, handler, breaker_min_calls=4, breaker_failure_rate=0.5, breaker_open_seconds=0.2
+    )
+
+    async def scenario() -> None:
+        for _ in range(4):
+            try:
+                await zammad.set_ticket_erp_issue(1, "ISS-1")
+            except httpx.HTTPStatusError:
+                pass
+        assert zammad.guard.breaker.state == "open"
+
+        try:
+            await zammad.set_ticket_erp_issue(1, "ISS-1")
+        except UpstreamUnavailable as exc:
+            assert 0 < exc.retry_after <= 0.2
+        else:
+            raise AssertionError("open circuit should fail fast")
+        assert upstream["calls"] == 4
+
+        await asyncio.sleep(0.25)
+        upstream["down"] = False
+        await zammad.set_ticket_erp_issue(1, "ISS-1")
+        assert zammad.guard.breaker.state == "closed"
+        assert upstream["calls"] == 5
+        await zammad.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_limiter_honours_retry_after_and_caps_concurrency(tmp_path: Path):
+    upstream = {"limited": True, "calls": 0, "active": 0, "peak": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        upstream["calls"] += 1
+        if upstream["limited"]:
+            return httpx.Response(429, headers={"Retry-After": "2"}, json={})
+        upstream["active"] += 1
+        upstream["peak"] = max(upstream["peak"], upstream["active"])
+        await asyncio.sleep(0.05)
+        upstream["active"] -= 1
+        return httpx.Response(200, json={})
+
+    zammad = _guarded_zammad(
+        tmp_path, handler, breaker_min_calls=100, upstream_concurrency_initial=8, upstream_concurrency_min=2
+    )
+
+    async def scenario() -> None:
+        try:
+            await zammad.set_ticket_erp_issue(1, "ISS-1")
+        except httpx.HTTPStatusError:
+            pass
+        assert zammad.guard.limiter.limit == 4
+        try:
+            await zammad.set_ticket_erp_issue(1, "ISS-1")
+        except UpstreamUnavailable as exc:
+            assert 1 < exc.retry_after <= 2
+        else:
+            raise AssertionError("Retry-After should pause calls")
+        assert upstream["calls"] == 1
+
+        upstream["limited"] = False
+        zammad.guard.limiter._paused_until = 0.0
+        # With 8 calls the limit only passes 5 once fewer than 4 are left, so the peak is exact.
+        await asyncio.gather(*(zammad.set_ticket_erp_issue(idx, "ISS-1") for idx in range(8)))
+        assert upstream["peak"] == 4
+        assert zammad.guard.limiter.in_flight == 0
+        assert zammad.guard.limiter.limit > 4
+        await zammad.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_slow_upstream_opens_circuit_and_shows_on_health(monkeypatch, tmp_path: Path):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.03)
+        return httpx.Response(200, json={})
+
+    zammad = _guarded_zammad(tmp_path, handler, breaker_min_calls=3, breaker_slow_call_seconds=0.01)
+
+    async def scenario() -> None:
+        for _ in range(3):
+            await zammad.set_ticket_erp_issue(1, "ISS-1")
+        await zammad.aclose()
+
+    asyncio.run(scenario())
+    assert zammad.guard.breaker.state == "open"
+
+    monkeypatch.setattr(main_module.zammad, "guard", zammad.guard)
+    client = _client(tmp_path)
+    health = client.get("/healthz").json()
+    assert health["status"] == "degraded"
+    assert health["upstreams"]["zammad"]["state"] == "open"
+    assert health["upstreams"]["erpnext"]["state"] == "closed"
+    metrics = client.get("/metrics").text
+    assert 'integration_upstream_circuit_state{upstream="zammad",state="open"} 1' in metrics
+    assert 'integration_upstream_opened_total{upstream="zammad"} 1' in metrics
+
+
+def test_intake_responds_after_ticket_and_defers_erp_post_processing(monkeypatch, tmp_path: Path):
+    links: list[tuple[int | None, str, str | None]] = []
+    erp_released = asyncio.Event()
+
+    async def fake_zammad_create(payload):
+        return {"ticket_id": 606, "ticket_number": "67606"}
+
+    async def fake_erp_create(payload, zammad_ticket_number):
+        await erp_released.wait()
+        return {"issue": "ISS-2026-00606"}
+
+    async def fake_set_ticket_erp_issue(ticket_id, issue_ref, ticket_number=None):
+        links.append((ticket_id, issue_ref, ticket_number))
+
+    monkeypatch.setattr(main_module.zammad, "create_ticket", fake_zammad_create)
+    monkeypatch.setattr(main_module.zammad, "set_ticket_erp_issue", fake_set_ticket_erp_issue)
+    monkeypatch.setattr(main_module.erpnext, "create_issue", fake_erp_create)
+
+    _client(tmp_path)
+    monkeypatch.setattr(main_module.settings, "intake_defer_post_processing", True)
+    headers = {"Authorization": "Bearer test-token", "Idempotency-Key": "defer-1"}
+    payload = {
+        "customer_name": "Ivan",
+        "phone": "+79990000000",
+        "device": "iPhone 13",
+        "problem": "Does not power on",
+        "service_point": "Belorechenskaya",
+        "tg_user_id": 123,
+    }
+
+    async def scenario() -> None:
+        transport = httpx.ASGITransport(app=main_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post("/api/intake", json=payload, headers=headers)
+            assert resp.status_code == 200
+            body = resp.json()
+            assert body["zammad_ticket_number"] == "67606"
+            assert body["erpnext_issue"] is None
+            assert body["complete"] is False
+
+            job = (await client.get(f"/api/intake/jobs/{body['job_id']}", headers=headers)).json()
+            assert (job["status"], job["step"]) == ("running", "erp_issue")
+            assert job["result"]["zammad_ticket_number"] == "67606"
+            replay = (await client.post("/api/intake", json=payload, headers=headers)).json()
+            assert (replay["replayed"], replay["zammad_ticket_number"]) == (True, "67606")
+
+            erp_released.set()
+            await main_module.intake_jobs.drain()
+            job = (await client.get(f"/api/intake/jobs/{body['job_id']}", headers=headers)).json()
+            assert job["status"] == "done"
+            assert job["result"]["erpnext_issue"] == "ISS-2026-00606"
+            replay = (await client.post("/api/intake", json=payload, headers=headers)).json()
+            assert replay["erpnext_issue"] == "ISS-2026-00606"
+            assert replay["complete"] is True
+
+    asyncio.run(scenario())
+    assert links == [(606, "ISS-2026-00606", "67606")]
+    assert find_erp_issue_by_ticket_number(main_module.settings.sqlite_path, "67606") == "ISS-2026-00606"
+
+
+def test_intake_batch_streams_per_item_results(monkeypatch, tmp_path: Path):
+    tickets: list[str] = []
+
+    async def fake_zammad_create(payload):
+        tickets.append(payload.customer_name)
+        return {"ticket_id": 700 + len(tickets), "ticket_number": str(67700 + len(tickets))}
+
+    async def fake_erp_create(payload, zammad_ticket_number):
+        return {"issue": None}
+
+    monkeypatch.setattr(main_module.zammad, "create_ticket", fake_zammad_create)
+    monkeypatch.setattr(main_module.erpnext, "create_issue", fake_erp_create)
+
+    client = _client(tmp_path)
+    headers = {"Authorization": "Bearer test-token"}
+    base = {
+        "phone": "+79990000000",
+        "device": "iPhone 13",
+        "problem": "Does not power on",
+        "service_point": "Belorechenskaya",
+        "tg_user_id": 123,
+    }
+    earlier = client.post(
+        "/api/intake", json={**base, "customer_name": "Earlier"}, headers={**headers, "Idempotency-Key": "b-0"}
+    )
+    assert earlier.status_code == 200
+
+    items = [
+        {**base, "customer_name": "Earlier", "idempotency_key": "b-0"},
+        {**base, "customer_name": "Anna", "idempotency_key": "b-1"},
+        {**base, "customer_name": "Anna", "idempotency_key": "b-1"},
+        {**base, "customer_name": "Boris", "idempotency_key": "b-2"},
+        {**base, "customer_name": "Changed", "idempotency_key": "b-0"},
+        {"customer_name": "No phone", "idempotency_key": "b-3"},
+    ]
+    resp = client.post("/api/intake/batch", json={"items": items}, headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = {line["index"]: line for line in map(json.loads, resp.text.splitlines())}
+    assert sorted(lines) == [0, 1, 2, 3, 4, 5]
+
+    assert lines[0]["status"] == 200 and lines[0]["result"]["replayed"] is True
+    assert lines[0]["result"]["zammad_ticket_number"] == earlier.json()["zammad_ticket_number"]
+    assert lines[1]["status"] == lines[2]["status"] == 200
+    assert lines[1]["result"]["zammad_ticket_number"] == lines[2]["result"]["zammad_ticket_number"]
+    assert lines[1]["job_id"] == lines[2]["job_id"]
+    assert lines[3]["status"] == 200
+    assert lines[4]["status"] == 409
+    assert lines[5]["status"] == 422
+    assert sorted(tickets) == ["Anna", "Boris", "Earlier"]
+
+    too_many = [{**base, "customer_name": "Bulk"}] * (main_module.settings.intake_batch_max_items + 1)
+    assert client.post("/api/intake/batch", json={"items": too_many}, headers=headers).status_code == 422
+
+
+def test_intake_batch_keeps_queued_items_from_workers_past_one_lease(monkeypatch, tmp_path: Path):
+    tickets: list[str] = []
+
+    async def slow_zammad_create(payload):
+        tickets.append(payload.customer_name)
+        await asyncio.sleep(0.3)
+        return {"ticket_id": 800 + len(tickets), "ticket_number": str(67800 + len(tickets))}
+
+    async def fake_erp_create(payload, zammad_ticket_number):
+        return {"issue": None}
+
+    monkeypatch.setattr(main_module.zammad, "create_ticket", slow_zammad_create)
+    monkeypatch.setattr(main_module.erpnext, "create_issue", fake_erp_create)
+    _client(tmp_path)
+    # Ten items one at a time take longer than a single lease.
+    monkeypatch.setattr(main_module.settings, "intake_lease_seconds", 2)
+    monkeypatch.setattr(main_module.settings, "intake_batch_concurrency", 1)
+    monkeypatch.setattr(main_module.settings, "intake_poll_interval", 0.1)
+    items = [
+        {
+            "customer_name": f"Bulk {idx}",
+            "phone": "+79990000000",
+            "device": "iPhone 13",
+            "problem": "Does not power on",
+            "service_point": "Belorechenskaya",
+            "tg_user_id": 123,
+            "idempotency_key": f"slow-{idx}",
+        }
+        for idx in range(10)
+    ]
+
+    async def scenario() -> list[dict]:
+        main_module.intake_jobs.start()
+        try:
+            transport = httpx.ASGITransport(app=main_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+                resp = await client.post(
+                    "/api/intake/batch", json={"items": items}, headers={"Authorization": "Bearer test-token"}
+                )
+            return [json.loads(line) for line in resp.text.splitlines()]
+        finally:
+            await main_module.intake_jobs.stop()
+
+    lines = asyncio.run(scenario())
+    assert [line["status"] for line in lines] == [200] * 10
+    assert sorted(tickets) == sorted(item["customer_name"] for item in items)
+
+
+def test_intake_batch_reports_unexpected_item_errors_and_finishes_the_stream(monkeypatch, tmp_path: Path):
+    async def fake_zammad_create(payload):
+        return {"ticket_id": 901, "ticket_number": "67901"}
+
+    async def fake_erp_create(payload, zammad_ticket_number):
+        return {"issue": None}
+
+    real_renew = main_module.renew_intake_job_leases
+
+    def flaky_renew(sqlite_path, job_ids, lease_seconds):
+        if job_ids == [1]:
+            raise sqlite3.OperationalError("database is locked")
+        return real_renew(sqlite_path, job_ids, lease_seconds)
+
+    monkeypatch.setattr(main_module.zammad, "create_ticket", fake_zammad_create)
+    monkeypatch.setattr(main_module.erpnext, "create_issue", fake_erp_create)
+    monkeypatch.setattr(main_module, "renew_intake_job_leases", flaky_renew)
+    client = _client(tmp_path)
+    base = {
+        "phone": "+79990000000",
+        "device": "iPhone 13",
+        "problem": "Does not power on",
+        "service_point": "Belorechenskaya",
+        "tg_user_id": 123,
+    }
+    items = [{**base, "customer_name": f"Item {idx}", "idempotency_key": f"err-{idx}"} for idx in range(3)]
+    resp = client.post("/api/intake/batch", json={"items": items}, headers={"Authorization": "Bearer test-token"})
+    assert resp.status_code == 200
+    lines = {line["index"]: line for line in map(json.loads, resp.text.splitlines())}
+    assert lines[0]["status"] == 500 and "database is locked" in lines[0]["error"]
+    assert lines[1]["status"] == lines[2]["status"] == 200
+
+
+def test_intake_batch_does_not_queue_jobs_for_legacy_replays_or_conflicts(monkeypatch, tmp_path: Path):
+    tickets: list[str] = []
+
+    async def fake_zammad_create(payload):
+        tickets.append(payload.customer_name)
+        return {"ticket_id": 950, "ticket_number": "67950"}
+
+    monkeypatch.setattr(main_module.zammad, "create_ticket", fake_zammad_create)
+    client = _client(tmp_path)
+    base = {
+        "phone": "+79990000000",
+        "device": "iPhone 13",
+        "problem": "Does not power on",
+        "service_point": "Belorechenskaya",
+        "tg_user_id": 123,
+    }
+    # Keys stored before intake jobs existed have an intake_requests row and no job.
+    for key, name in (("legacy-1", "Old"), ("legacy-2", "Stored")):
+        body = IntakeRequest(**{**base, "customer_name": name}).model_dump()
+        save_success(
+            main_module.settings.sqlite_path,
+            idempotency_key=key,
+            request_hash=compute_hash(body),
+            request_body=body,
+            response_body={"success": True, "idempotency_key": key, "zammad_ticket_number": f"5000{key[-1]}"},
+        )
+
+    items = [
+        {**base, "customer_name": "Old", "idempotency_key": "legacy-1"},
+        {**base, "customer_name": "Changed", "idempotency_key": "legacy-2"},
+    ]
+    resp = client.post("/api/intake/batch", json={"items": items}, headers={"Authorization": "Bearer test-token"})
+    lines = {line["index"]: line for line in map(json.loads, resp.text.splitlines())}
+    assert lines[0]["status"] == 200 and lines[0]["result"]["replayed"] is True
+    assert lines[0]["result"]["zammad_ticket_number"] == "50001"
+    assert lines[1]["status"] == 409
+    assert lines[0]["job_id"] is None and lines[1]["job_id"] is None
+
+    with sqlite3.connect(main_module.settings.sqlite_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM intake_jobs").fetchone()[0] == 0
+    # Nothing is left for a worker to pick up once a lease would have lapsed.
+    assert claim_due_intake_job(main_module.settings.sqlite_path, 60) is None
+    assert tickets == []
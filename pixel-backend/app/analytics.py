@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime, time, timedelta
+
+from app.db import minor_units_sql, to_sql_datetime
+
+_RAW_TOTALS = f"""
+    SELECT COUNT(*) AS orders,
+           COALESCE(SUM({minor_units_sql("price")}), 0) AS revenue_minor,
+           COALESCE(SUM({minor_units_sql("cost")}), 0) AS costs_minor
+    FROM orders
+    WHERE created_at >= ? AND created_at {{upper_op}} ?
+"""
+
+
+def _raw_totals(conn: sqlite3.Connection, lower: str, upper: str, *, inclusive: bool) -> tuple[int, int, int]:
+    row = conn.execute(_RAW_TOTALS.format(upper_op="<=" if inclusive else "<"), (lower, upper)).fetchone()
+    return int(row["orders"]), int(row["revenue_minor"]), int(row["costs_minor"])
+
+
+def summarize_orders(conn: sqlite3.Connection, dt_from: datetime, dt_to: datetime) -> tuple[int, float, float]:
+    """Count orders and sum price/cost for ``dt_from <= created_at <= dt_to``.
+
+    Whole days inside the range come from ``orders_daily_rollup``; only the
+    partial days at the edges are read from ``orders`` via its created_at index.
+    Money is summed in integer kopecks, so both paths agree to the kopeck.
+    """
+    lower = to_sql_datetime(dt_from)
+    upper = to_sql_datetime(dt_to)
+    if lower > upper:
+        return 0, 0.0, 0.0
+    start = datetime.fromisoformat(lower)
+    end = datetime.fromisoformat(upper)
+
+    first_day = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+    last_day = end.date() if end.time() == time(23, 59, 59) else end.date() - timedelta(days=1)
+    if first_day > last_day:
+        orders, revenue, costs = _raw_totals(conn, lower, upper, inclusive=True)
+        return orders, revenue / 100, costs / 100
+
+    row = conn.execute(
+        """
+        SELECT COALESCE(SUM(orders), 0) AS orders,
+               COALESCE(SUM(revenue_minor), 0) AS revenue_minor,
+               COALESCE(SUM(costs_minor), 0) AS costs_minor
+        FROM orders_daily_rollup
+        WHERE day BETWEEN ? AND ?
+        """,
+        (first_day.isoformat(), last_day.isoformat()),
+    ).fetchone()
+    orders, revenue, costs = int(row["orders"]), int(row["revenue_minor"]), int(row["costs_minor"])
+
+    head_end = to_sql_datetime(datetime.combine(first_day, time.min))
+    if lower < head_end:
+        head = _raw_totals(conn, lower, head_end, inclusive=False)
+        orders, revenue, costs = orders + head[0], revenue + head[1], costs + head[2]
+    tail_start = to_sql_datetime(datetime.combine(last_day + timedelta(days=1), time.min))
+    if tail_start <= upper:
+        tail = _raw_totals(conn, tail_start, upper, inclusive=True)
+        orders, revenue, costs = orders + tail[0], revenue + tail[1], costs + tail[2]
+    return orders, revenue / 100, costs / 100
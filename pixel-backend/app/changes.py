@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+
+def fetch_order_changes(conn: sqlite3.Connection, since: int, limit: int) -> list[sqlite3.Row]:
+    """Orders inserted or updated after ``since``, in ``row_version`` order."""
+    return conn.execute(
+        "SELECT * FROM orders WHERE row_version > ? ORDER BY row_version ASC LIMIT ?",
+        (since, limit),
+    ).fetchall()
+
+
+class ChangeNotifier:
+    """Wakes long-polling change-feed requests once a write has committed.
+
+    ``notify()`` is called from the SQLite writer thread; each listener's event
+    is set on its own event loop.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._listeners: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    @contextmanager
+    def listen(self) -> Iterator[asyncio.Event]:
+        entry = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._listeners.add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                self._listeners.discard(entry)
+
+    def notify(self) -> None:
+        with self._lock:
+            listeners = list(self._listeners)
+        for loop, event in listeners:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(event.set)
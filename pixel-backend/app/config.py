@@ -9,6 +9,11 @@ from pathlib import Path
 class Settings:
     bot_api_token: str
     sqlite_path: str
+    sqlite_readers: int
+    sqlite_busy_timeout_ms: int
+    sqlite_mmap_size: int
+    sqlite_cache_size_kb: int
+    sqlite_write_batch_size: int
     timezone: str
     integration_url: str
     integration_token: str
@@ -17,6 +22,18 @@ class Settings:
     company_ogrn: str
     company_address: str
     company_phone: str
+    report_batch_size: int
+    outbox_poll_interval: float
+    outbox_batch_size: int
+    outbox_max_attempts: int
+    outbox_backoff_base: float
+    outbox_backoff_max: float
+    outbox_lease_seconds: float
+    changes_max_wait: float
+    notification_lease_seconds: float
+    notification_max_attempts: int
+    notification_backoff_base: float
+    notification_backoff_max: float
 
 
 def load_settings() -> Settings:
@@ -24,6 +41,11 @@ def load_settings() -> Settings:
     return Settings(
         bot_api_token=os.getenv("BOT_API_TOKEN", ""),
         sqlite_path=os.getenv("SQLITE_PATH", default_db),
+        sqlite_readers=int(os.getenv("SQLITE_READERS", "4")),
+        sqlite_busy_timeout_ms=int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        sqlite_mmap_size=int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        sqlite_cache_size_kb=int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024))),
+        sqlite_write_batch_size=int(os.getenv("SQLITE_WRITE_BATCH_SIZE", "64")),
         timezone=os.getenv("TIMEZONE", "Asia/Yekaterinburg"),
         integration_url=os.getenv("INTEGRATION_URL", "http://integration-service:8090"),
         integration_token=os.getenv("INTEGRATION_TOKEN", ""),
@@ -32,5 +54,17 @@ def load_settings() -> Settings:
         company_ogrn=os.getenv("COMPANY_OGRN", ""),
         company_address=os.getenv("COMPANY_ADDRESS", ""),
         company_phone=os.getenv("COMPANY_PHONE", ""),
+        report_batch_size=int(os.getenv("REPORT_BATCH_SIZE", "500")),
+        outbox_poll_interval=float(os.getenv("OUTBOX_POLL_INTERVAL", "2")),
+        outbox_batch_size=int(os.getenv("OUTBOX_BATCH_SIZE", "20")),
+        outbox_max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "12")),
+        outbox_backoff_base=float(os.getenv("OUTBOX_BACKOFF_BASE", "2")),
+        outbox_backoff_max=float(os.getenv("OUTBOX_BACKOFF_MAX", "600")),
+        outbox_lease_seconds=float(os.getenv("OUTBOX_LEASE_SECONDS", "60")),
+        changes_max_wait=float(os.getenv("CHANGES_MAX_WAIT", "30")),
+        notification_lease_seconds=float(os.getenv("NOTIFICATION_LEASE_SECONDS", "60")),
+        notification_max_attempts=int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "8")),
+        notification_backoff_base=float(os.getenv("NOTIFICATION_BACKOFF_BASE", "5")),
+        notification_backoff_max=float(os.getenv("NOTIFICATION_BACKOFF_MAX", "900")),
     )
 
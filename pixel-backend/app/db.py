@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import sqlite3
-from datetime import datetime
+from contextlib import closing
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
@@ -33,6 +34,29 @@ BRANCH_SEED = [
 ]
 
 
+PHONE_SEPARATORS = "+-() ."
+
+_BUMP_ORDERS_VERSION = """
+                INSERT INTO table_versions(name, version) VALUES('orders', 1)
+                ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = datetime('now');"""
+
+
+def _phone_digits_sql(expr: str) -> str:
+    """SQL expression stripping the usual phone separators from ``expr``."""
+    for char in PHONE_SEPARATORS:
+        expr = f"replace({expr}, '{char}', '')"
+    return expr
+
+
+def minor_units_sql(expr: str) -> str:
+    """SQL expression for a money amount ``expr`` in integer minor units (kopecks).
+
+    Money sums kept as integers add and subtract exactly; REAL sums drift once
+    amounts have fractions.
+    """
+    return f"CAST(round({expr} * 100) AS INTEGER)"
+
+
 def get_conn(sqlite_path: str) -> sqlite3.Connection:
     conn = sqlite3.connect(sqlite_path, check_same_thread=False)
     conn.row_factory = sqlite3.Row
@@ -42,7 +66,25 @@ def get_conn(sqlite_path: str) -> sqlite3.Connection:
 def init_db(sqlite_path: str) -> None:
     db_file = Path(sqlite_path)
     db_file.parent.mkdir(parents=True, exist_ok=True)
-    with get_conn(sqlite_path) as conn:
+    with closing(get_conn(sqlite_path)) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        fts_exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'orders_fts'"
+        ).fetchone()
+        order_columns = {row["name"] for row in conn.execute("PRAGMA table_info(orders)")}
+        if order_columns and "row_version" not in order_columns:
+            conn.execute("ALTER TABLE orders ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0")
+        rollup_columns = {row["name"] for row in conn.execute("PRAGMA table_info(orders_daily_rollup)")}
+        if rollup_columns and "revenue_minor" not in rollup_columns:
+            # The first rollup kept REAL sums; drop it and rebuild it below from orders.
+            conn.executescript(
+                """
+                DROP TRIGGER IF EXISTS orders_rollup_insert;
+                DROP TRIGGER IF EXISTS orders_rollup_update;
+                DROP TRIGGER IF EXISTS orders_rollup_delete;
+                DROP TABLE orders_daily_rollup;
+                """
+            )
         conn.executescript(
             """
             CREATE TABLE IF NOT EXISTS branches (
@@ -54,6 +96,33 @@ def init_db(sqlite_path: str) -> None:
                 lon REAL
             );
 
+            CREATE TABLE IF NOT EXISTS table_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+            );
+
+            CREATE TRIGGER IF NOT EXISTS branches_version_insert
+            AFTER INSERT ON branches
+            BEGIN
+                INSERT INTO table_versions(name, version) VALUES('branches', 1)
+                ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = datetime('now');
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS branches_version_update
+            AFTER UPDATE ON branches
+            BEGIN
+                INSERT INTO table_versions(name, version) VALUES('branches', 1)
+                ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = datetime('now');
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS branches_version_delete
+            AFTER DELETE ON branches
+            BEGIN
+                INSERT INTO table_versions(name, version) VALUES('branches', 1)
+                ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = datetime('now');
+            END;
+
             CREATE TABLE IF NOT EXISTS support_staff (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 telegram_id INTEGER UNIQUE NOT NULL,
@@ -61,6 +130,30 @@ def init_db(sqlite_path: str) -> None:
                 created_at TEXT NOT NULL DEFAULT (datetime('now'))
             );
 
+            CREATE TABLE IF NOT EXISTS support_tickets (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                user_name TEXT NOT NULL DEFAULT '',
+                text TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'open',
+                assignee_id INTEGER,
+                created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+            );
+
+            -- Only unclosed tickets are indexed, so the inbox query is O(open tickets).
+            CREATE INDEX IF NOT EXISTS idx_support_tickets_active
+            ON support_tickets(id) WHERE status != 'closed';
+            CREATE INDEX IF NOT EXISTS idx_support_tickets_status ON support_tickets(status, id);
+            CREATE INDEX IF NOT EXISTS idx_support_tickets_assignee ON support_tickets(assignee_id, status, id);
+
+            CREATE TRIGGER IF NOT EXISTS set_support_tickets_updated_at
+            AFTER UPDATE ON support_tickets
+            FOR EACH ROW
+            BEGIN
+                UPDATE support_tickets SET updated_at = datetime('now') WHERE id = OLD.id;
+            END;
+
             CREATE TABLE IF NOT EXISTS orders (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 number TEXT UNIQUE NOT NULL,
@@ -80,17 +173,200 @@ def init_db(sqlite_path: str) -> None:
                 erpnext_issue TEXT,
                 price REAL NOT NULL DEFAULT 0,
                 cost REAL NOT NULL DEFAULT 0,
+                row_version INTEGER NOT NULL DEFAULT 0,
                 FOREIGN KEY(branch_id) REFERENCES branches(id)
             );
 
-            CREATE TRIGGER IF NOT EXISTS set_orders_updated_at
+            -- Every insert or update stamps the row with the next value of the 'orders'
+            -- counter in table_versions; GET /api/orders/changes reads rows past a version.
+            DROP TRIGGER IF EXISTS set_orders_updated_at;
+            CREATE TRIGGER set_orders_updated_at
             AFTER UPDATE ON orders
             FOR EACH ROW
+            WHEN NEW.row_version = OLD.row_version
             BEGIN
-                UPDATE orders SET updated_at = datetime('now') WHERE id = OLD.id;
+                {bump_orders_version}
+                UPDATE orders
+                SET updated_at = datetime('now'),
+                    row_version = (SELECT version FROM table_versions WHERE name = 'orders')
+                WHERE id = OLD.id;
             END;
-            """
+
+            CREATE TRIGGER IF NOT EXISTS orders_row_version_insert
+            AFTER INSERT ON orders
+            FOR EACH ROW
+            BEGIN
+                {bump_orders_version}
+                UPDATE orders
+                SET row_version = (SELECT version FROM table_versions WHERE name = 'orders')
+                WHERE id = NEW.id;
+            END;
+
+            CREATE INDEX IF NOT EXISTS idx_orders_row_version ON orders(row_version);
+
+            CREATE INDEX IF NOT EXISTS idx_orders_client_telegram ON orders(client_telegram, id);
+            CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status, id);
+            CREATE INDEX IF NOT EXISTS idx_orders_branch ON orders(branch_id, id);
+            CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at);
+
+            CREATE TABLE IF NOT EXISTS orders_daily_rollup (
+                day TEXT NOT NULL,
+                branch_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                orders INTEGER NOT NULL DEFAULT 0,
+                revenue_minor INTEGER NOT NULL DEFAULT 0,
+                costs_minor INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY(day, branch_id, status)
+            );
+
+            CREATE TRIGGER IF NOT EXISTS orders_rollup_insert
+            AFTER INSERT ON orders
+            FOR EACH ROW
+            BEGIN
+                INSERT INTO orders_daily_rollup(day, branch_id, status, orders, revenue_minor, costs_minor)
+                VALUES(date(NEW.created_at), NEW.branch_id, NEW.status, 1, {new_price}, {new_cost})
+                ON CONFLICT(day, branch_id, status) DO UPDATE SET
+                    orders = orders + 1,
+                    revenue_minor = revenue_minor + excluded.revenue_minor,
+                    costs_minor = costs_minor + excluded.costs_minor;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS orders_rollup_update
+            AFTER UPDATE OF created_at, branch_id, status, price, cost ON orders
+            FOR EACH ROW
+            BEGIN
+                UPDATE orders_daily_rollup
+                SET orders = orders - 1,
+                    revenue_minor = revenue_minor - {old_price},
+                    costs_minor = costs_minor - {old_cost}
+                WHERE day = date(OLD.created_at) AND branch_id = OLD.branch_id AND status = OLD.status;
+                DELETE FROM orders_daily_rollup
+                WHERE day = date(OLD.created_at) AND branch_id = OLD.branch_id AND status = OLD.status
+                    AND orders <= 0;
+                INSERT INTO orders_daily_rollup(day, branch_id, status, orders, revenue_minor, costs_minor)
+                VALUES(date(NEW.created_at), NEW.branch_id, NEW.status, 1, {new_price}, {new_cost})
+                ON CONFLICT(day, branch_id, status) DO UPDATE SET
+                    orders = orders + 1,
+                    revenue_minor = revenue_minor + excluded.revenue_minor,
+                    costs_minor = costs_minor + excluded.costs_minor;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS orders_rollup_delete
+            AFTER DELETE ON orders
+            FOR EACH ROW
+            BEGIN
+                UPDATE orders_daily_rollup
+                SET orders = orders - 1,
+                    revenue_minor = revenue_minor - {old_price},
+                    costs_minor = costs_minor - {old_cost}
+                WHERE day = date(OLD.created_at) AND branch_id = OLD.branch_id AND status = OLD.status;
+                DELETE FROM orders_daily_rollup
+                WHERE day = date(OLD.created_at) AND branch_id = OLD.branch_id AND status = OLD.status
+                    AND orders <= 0;
+            END;
+
+            CREATE TABLE IF NOT EXISTS order_sequences (
+                period TEXT PRIMARY KEY,
+                last_value INTEGER NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS integration_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_id INTEGER NOT NULL,
+                idempotency_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TEXT NOT NULL DEFAULT (datetime('now')),
+                last_error TEXT,
+                created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+                FOREIGN KEY(order_id) REFERENCES orders(id)
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_integration_outbox_due
+            ON integration_outbox(status, next_attempt_at);
+
+            CREATE TABLE IF NOT EXISTS order_notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TEXT NOT NULL DEFAULT (datetime('now')),
+                last_error TEXT,
+                created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+                FOREIGN KEY(order_id) REFERENCES orders(id)
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_order_notifications_due
+            ON order_notifications(status, next_attempt_at);
+
+            -- Contentless trigram index: matches any 3+ character substring, case-insensitively.
+            -- client_phone is indexed as digits only so "+7 (999) 123-45-67" matches "1234567".
+            CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+                number, client_name, client_phone, model, problem_description,
+                content='', tokenize='trigram'
+            );
+
+            CREATE TRIGGER IF NOT EXISTS orders_fts_insert
+            AFTER INSERT ON orders
+            BEGIN
+                INSERT INTO orders_fts(rowid, number, client_name, client_phone, model, problem_description)
+                VALUES(NEW.id, NEW.number, NEW.client_name, {new_phone}, NEW.model, NEW.problem_description);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS orders_fts_update
+            AFTER UPDATE OF number, client_name, client_phone, model, problem_description ON orders
+            BEGIN
+                INSERT INTO orders_fts(orders_fts, rowid, number, client_name, client_phone, model, problem_description)
+                VALUES('delete', OLD.id, OLD.number, OLD.client_name, {old_phone}, OLD.model, OLD.problem_description);
+                INSERT INTO orders_fts(rowid, number, client_name, client_phone, model, problem_description)
+                VALUES(NEW.id, NEW.number, NEW.client_name, {new_phone}, NEW.model, NEW.problem_description);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS orders_fts_delete
+            AFTER DELETE ON orders
+            BEGIN
+                INSERT INTO orders_fts(orders_fts, rowid, number, client_name, client_phone, model, problem_description)
+                VALUES('delete', OLD.id, OLD.number, OLD.client_name, {old_phone}, OLD.model, OLD.problem_description);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS set_integration_outbox_updated_at
+            AFTER UPDATE ON integration_outbox
+            FOR EACH ROW
+            BEGIN
+                UPDATE integration_outbox SET updated_at = datetime('now') WHERE id = OLD.id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS set_order_notifications_updated_at
+            AFTER UPDATE ON order_notifications
+            FOR EACH ROW
+            BEGIN
+                UPDATE order_notifications SET updated_at = datetime('now') WHERE id = OLD.id;
+            END;
+            """.format(
+                new_phone=_phone_digits_sql("NEW.client_phone"),
+                old_phone=_phone_digits_sql("OLD.client_phone"),
+                bump_orders_version=_BUMP_ORDERS_VERSION,
+                new_price=minor_units_sql("NEW.price"),
+                new_cost=minor_units_sql("NEW.cost"),
+                old_price=minor_units_sql("OLD.price"),
+                old_cost=minor_units_sql("OLD.cost"),
+            )
         )
+        if not fts_exists:
+            # Index orders written before orders_fts existed.
+            conn.execute(
+                f"""
+                INSERT INTO orders_fts(rowid, number, client_name, client_phone, model, problem_description)
+                SELECT id, number, client_name, {_phone_digits_sql("client_phone")}, model, problem_description
+                FROM orders
+                """
+            )
         for branch in BRANCH_SEED:
             conn.execute(
                 """
@@ -100,20 +376,84 @@ def init_db(sqlite_path: str) -> None:
                 """,
                 branch,
             )
+        # Stamp orders written before row_version existed, oldest first.
+        conn.execute(
+            """
+            UPDATE orders SET row_version = id
+            WHERE row_version = 0 AND NOT EXISTS (SELECT 1 FROM table_versions WHERE name = 'orders')
+            """
+        )
+        conn.execute(
+            """
+            INSERT INTO table_versions(name, version)
+            SELECT 'orders', COALESCE(MAX(row_version), 0) FROM orders WHERE true
+            ON CONFLICT(name) DO NOTHING
+            """
+        )
+        # Branches seeded before the version triggers existed still need a version row.
+        conn.execute("INSERT INTO table_versions(name, version) VALUES('branches', 1) ON CONFLICT(name) DO NOTHING")
+        # Build the rollup for orders written before the rollup triggers existed.
+        conn.execute(
+            f"""
+            INSERT INTO orders_daily_rollup(day, branch_id, status, orders, revenue_minor, costs_minor)
+            SELECT date(created_at), branch_id, status, COUNT(*),
+                   SUM({minor_units_sql("price")}), SUM({minor_units_sql("cost")})
+            FROM orders
+            WHERE NOT EXISTS (SELECT 1 FROM orders_daily_rollup)
+            GROUP BY date(created_at), branch_id, status
+            """
+        )
+        # Carry counters over from numbers issued before order_sequences existed.
+        conn.execute(
+            """
+            INSERT INTO order_sequences(period, last_value)
+            SELECT substr(number, 5, 6), MAX(CAST(substr(number, 12) AS INTEGER))
+            FROM orders
+            WHERE number GLOB 'PIX-[0-9][0-9][0-9][0-9][0-9][0-9]-*'
+            GROUP BY substr(number, 5, 6)
+            ON CONFLICT(period) DO UPDATE SET last_value = MAX(last_value, excluded.last_value)
+            """
+        )
         conn.commit()
 
 
 def next_order_number(conn: sqlite3.Connection) -> str:
-    prefix = datetime.now().strftime("PIX-%Y%m-")
-    row = conn.execute(
-        "SELECT number FROM orders WHERE number LIKE ? ORDER BY id DESC LIMIT 1",
-        (f"{prefix}%",),
-    ).fetchone()
-    if row and row["number"]:
-        last_seq = int(row["number"].split("-")[-1])
+    """Allocate the next ``PIX-YYYYMM-NNNN`` number inside the caller's write transaction."""
+    period = datetime.now().strftime("%Y%m")
+    rows = conn.execute(
+        "UPDATE order_sequences SET last_value = last_value + 1 WHERE period = ? RETURNING last_value",
+        (period,),
+    ).fetchall()
+    if rows:
+        value = int(rows[0]["last_value"])
     else:
-        last_seq = 0
-    return f"{prefix}{last_seq + 1:04d}"
+        # First order of the month starts a new counter.
+        rows = conn.execute(
+            """
+            INSERT INTO order_sequences(period, last_value) VALUES(?, 1)
+            ON CONFLICT(period) DO UPDATE SET last_value = last_value + 1
+            RETURNING last_value
+            """,
+            (period,),
+        ).fetchall()
+        value = int(rows[0]["last_value"])
+    return f"PIX-{period}-{value:04d}"
+
+
+def table_version(conn: sqlite3.Connection, name: str) -> tuple[int, datetime]:
+    """Return ``(version, updated_at)`` of a trigger-versioned table such as ``branches``."""
+    row = conn.execute("SELECT version, updated_at FROM table_versions WHERE name = ?", (name,)).fetchone()
+    if not row:
+        return 0, datetime(1970, 1, 1, tzinfo=timezone.utc)
+    updated_at = datetime.fromisoformat(row["updated_at"]).replace(tzinfo=timezone.utc)
+    return int(row["version"]), updated_at
+
+
+def to_sql_datetime(value: datetime) -> str:
+    """Format ``value`` the way ``datetime('now')`` stores ``created_at`` (UTC, no 'T')."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
 
 
 def row_to_dict(row: sqlite3.Row | None) -> dict[str, Any] | None:
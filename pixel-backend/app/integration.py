@@ -12,12 +12,16 @@ class IntegrationClient:
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
 
-    async def create_intake(self, payload: dict[str, Any]) -> dict[str, Any] | None:
+    async def create_intake(
+        self,
+        payload: dict[str, Any],
+        idempotency_key: str | None = None,
+    ) -> dict[str, Any] | None:
         if not self.settings.integration_url or not self.settings.integration_token:
             return None
         headers = {
             "Authorization": f"Bearer {self.settings.integration_token}",
-            "Idempotency-Key": str(uuid4()),
+            "Idempotency-Key": idempotency_key or str(uuid4()),
         }
         async with httpx.AsyncClient(timeout=20) as client:
             resp = await client.post(
@@ -1,34 +1,71 @@
 from __future__ import annotations
 
-import csv
-import io
+import asyncio
+import sqlite3
+from collections.abc import Sequence
 from datetime import datetime
-from typing import Annotated
+from email.utils import format_datetime
+from typing import Annotated, Literal
 
 from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response, status
-from openpyxl import Workbook
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
+from app.analytics import summarize_orders
+from app.changes import ChangeNotifier, fetch_order_changes
 from app.config import Settings, load_settings
-from app.db import get_conn, init_db, next_order_number
+from app.db import init_db, next_order_number, table_version, to_sql_datetime
 from app.integration import IntegrationClient
+from app.notifications import (
+    claim_notifications,
+    enqueue_status_notification,
+    notification_depth,
+    record_notification_results,
+)
+from app.outbox import OutboxDispatcher, enqueue_intake, outbox_depth
+from app.pool import SQLitePool
+from app.reports import ReportFilters, gzip_chunks, iter_csv, iter_file, spool_xlsx
 from app.schemas import (
     AnalyticsSummary,
     BranchOut,
+    NotificationAck,
+    NotificationOut,
+    OrderChanges,
     OrderCreate,
+    OrderListItem,
     OrderOut,
     OrderUpdate,
     SupportStaffCreate,
     SupportStaffOut,
+    SupportTicketCreate,
+    SupportTicketOut,
+    SupportTicketUpdate,
 )
+from app.search import MIN_TERM_LENGTH, RANK_WINDOW, build_match_query, search_orders
 
 app = FastAPI(title="Pixel SC Backend", version="0.1.0")
 settings = load_settings()
 integration_client = IntegrationClient(settings)
+db = SQLitePool(settings)
+outbox_dispatcher = OutboxDispatcher(settings, integration_client, db)
+db_commits = ChangeNotifier()
+db.add_commit_listener(db_commits.notify)
 
 
 @app.on_event("startup")
 def startup() -> None:
     init_db(settings.sqlite_path)
+    db.open(settings.sqlite_path)
+
+
+@app.on_event("startup")
+async def start_background_tasks() -> None:
+    outbox_dispatcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks() -> None:
+    await outbox_dispatcher.stop()
+    db.close()
 
 
 def require_bot_token(x_bot_token: Annotated[str | None, Header()] = None) -> None:
@@ -41,93 +78,233 @@ def healthz() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> str:
+    depth = await db.read(outbox_depth)
+    lines = [
+        "# HELP pixel_integration_outbox_depth Integration outbox entries not yet delivered.",
+        "# TYPE pixel_integration_outbox_depth gauge",
+    ]
+    for outbox_status, count in sorted(depth.items()):
+        lines.append(f'pixel_integration_outbox_depth{{status="{outbox_status}"}} {count}')
+    notifications = await db.read(notification_depth)
+    lines += [
+        "# HELP pixel_order_notifications_depth Customer notifications not yet sent.",
+        "# TYPE pixel_order_notifications_depth gauge",
+    ]
+    for notification_status, count in sorted(notifications.items()):
+        lines.append(f'pixel_order_notifications_depth{{status="{notification_status}"}} {count}')
+    lines += [
+        "# HELP pixel_sqlite_write_batches_total Write transactions committed by the group-commit writer.",
+        "# TYPE pixel_sqlite_write_batches_total counter",
+        f"pixel_sqlite_write_batches_total {db.write_batches}",
+        "# HELP pixel_sqlite_write_ops_total Write operations applied by the group-commit writer.",
+        "# TYPE pixel_sqlite_write_ops_total counter",
+        f"pixel_sqlite_write_ops_total {db.write_ops}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _insert_order(conn: sqlite3.Connection, payload: OrderCreate) -> sqlite3.Row:
+    branch = conn.execute("SELECT * FROM branches WHERE id = ?", (payload.branch_id,)).fetchone()
+    if not branch:
+        raise HTTPException(status_code=404, detail="Branch not found")
+    number = next_order_number(conn)
+    cur = conn.execute(
+        """
+        INSERT INTO orders(
+            number, status, branch_id, branch_name, branch_address, client_name, client_phone,
+            client_telegram, device_type, model, problem_description
+        ) VALUES(?, 'new', ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            number,
+            payload.branch_id,
+            branch["name"],
+            branch["address"],
+            payload.client_name,
+            payload.client_phone,
+            payload.client_telegram,
+            payload.device_type,
+            payload.model,
+            payload.problem_description,
+        ),
+    )
+    order_id = cur.lastrowid
+    intake_payload = {
+        "customer_name": payload.client_name,
+        "phone": payload.client_phone,
+        "device": f"{payload.device_type} {(payload.model or '').strip()}".strip(),
+        "device_type": payload.device_type,
+        "model": (payload.model or "").strip() or None,
+        "problem": payload.problem_description,
+        "service_point": branch["name"],
+        "tg_user_id": int(payload.client_telegram) if payload.client_telegram.isdigit() else 0,
+        "tg_username": (payload.tg_username or "").lstrip("@"),
+    }
+    # Order and intake request commit together; the dispatcher fills in
+    # zammad_ticket_number / erpnext_issue once the integration answers.
+    enqueue_intake(conn, order_id, intake_payload)
+    return conn.execute("SELECT * FROM orders WHERE id = ?", (order_id,)).fetchone()
+
+
 @app.post("/api/orders", response_model=OrderOut, dependencies=[Depends(require_bot_token)])
 async def create_order(payload: OrderCreate) -> OrderOut:
-    with get_conn(settings.sqlite_path) as conn:
-        branch = conn.execute("SELECT * FROM branches WHERE id = ?", (payload.branch_id,)).fetchone()
-        if not branch:
-            raise HTTPException(status_code=404, detail="Branch not found")
-        number = next_order_number(conn)
-        cur = conn.execute(
-            """
-            INSERT INTO orders(
-                number, status, branch_id, branch_name, branch_address, client_name, client_phone,
-                client_telegram, device_type, model, problem_description
-            ) VALUES(?, 'new', ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                number,
-                payload.branch_id,
-                branch["name"],
-                branch["address"],
-                payload.client_name,
-                payload.client_phone,
-                payload.client_telegram,
-                payload.device_type,
-                payload.model,
-                payload.problem_description,
-            ),
+    row = await db.write(_insert_order, payload)
+    outbox_dispatcher.notify()
+    return OrderOut(**dict(row))
+
+
+ORDER_FIELDS = tuple(OrderListItem.model_fields)
+
+
+def _fetch_all(conn: sqlite3.Connection, sql: str, params: Sequence[object] = ()) -> list[sqlite3.Row]:
+    return conn.execute(sql, params).fetchall()
+
+
+@app.get(
+    "/api/orders/search",
+    response_model=list[OrderListItem],
+    response_model_exclude_unset=True,
+    dependencies=[Depends(require_bot_token)],
+)
+async def search_orders_endpoint(
+    response: Response,
+    q: str = Query(min_length=1, max_length=200),
+    sort: Literal["rank", "recent"] = Query(default="rank"),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0, le=10_000),
+) -> list[OrderListItem]:
+    match = build_match_query(q)
+    if match is None:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Search terms must be at least {MIN_TERM_LENGTH} characters",
         )
-        order_id = cur.lastrowid
-        conn.commit()
-
-        intake_payload = {
-            "customer_name": payload.client_name,
-            "phone": payload.client_phone,
-            "device": f"{payload.device_type} {(payload.model or '').strip()}".strip(),
-            "device_type": payload.device_type,
-            "model": (payload.model or "").strip() or None,
-            "problem": payload.problem_description,
-            "service_point": branch["name"],
-            "tg_user_id": int(payload.client_telegram) if payload.client_telegram.isdigit() else 0,
-            "tg_username": (payload.tg_username or "").lstrip("@"),
-        }
-        zammad_ticket_number = None
-        erpnext_issue = None
-        try:
-            intake_result = await integration_client.create_intake(intake_payload)
-            if intake_result:
-                zammad_ticket_number = intake_result.get("zammad_ticket_number")
-                erpnext_issue = intake_result.get("erpnext_issue")
-        except Exception:
-            pass
-
-        conn.execute(
-            "UPDATE orders SET zammad_ticket_number = ?, erpnext_issue = ? WHERE id = ?",
-            (zammad_ticket_number, erpnext_issue, order_id),
+    if sort == "rank" and offset >= RANK_WINDOW:
+        # Ranking only scores the newest RANK_WINDOW matches; deeper pages need sort=recent.
+        raise HTTPException(
+            status_code=422,
+            detail=f"sort=rank covers the first {RANK_WINDOW} results; use sort=recent to page further",
         )
-        conn.commit()
-        row = conn.execute("SELECT * FROM orders WHERE id = ?", (order_id,)).fetchone()
-        return OrderOut(**dict(row))
+    rows = await db.read(search_orders, match, ORDER_FIELDS, limit=limit + 1, offset=offset, sort=sort)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return [OrderListItem(**dict(r)) for r in rows]
+
+
+@app.get("/api/orders/changes", response_model=OrderChanges, dependencies=[Depends(require_bot_token)])
+async def list_order_changes(
+    since: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000),
+    wait: float = Query(default=0, ge=0),
+) -> OrderChanges:
+    """Orders created or updated after ``since`` (a ``row_version``).
+
+    With ``wait`` > 0 an empty page is held open until a write commits or
+    the wait (capped at ``CHANGES_MAX_WAIT``) runs out.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(wait, settings.changes_max_wait)
+    with db_commits.listen() as changed:
+        while True:
+            # Cleared before the read so a commit landing mid-query still wakes us.
+            changed.clear()
+            rows = await db.read(fetch_order_changes, since, limit + 1)
+            remaining = deadline - loop.time()
+            if rows or remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+    items = [OrderOut(**dict(r)) for r in rows[:limit]]
+    return OrderChanges(
+        items=items,
+        next_since=items[-1].row_version if items else since,
+        has_more=len(rows) > limit,
+    )
+
+
+def _select_order(conn: sqlite3.Connection, number_or_id: str) -> sqlite3.Row | None:
+    if number_or_id.isdigit():
+        return conn.execute("SELECT * FROM orders WHERE id = ?", (int(number_or_id),)).fetchone()
+    return conn.execute("SELECT * FROM orders WHERE number = ?", (number_or_id,)).fetchone()
 
 
 @app.get("/api/orders/{number_or_id}", response_model=OrderOut, dependencies=[Depends(require_bot_token)])
-def get_order(number_or_id: str) -> OrderOut:
-    with get_conn(settings.sqlite_path) as conn:
-        if number_or_id.isdigit():
-            row = conn.execute("SELECT * FROM orders WHERE id = ?", (int(number_or_id),)).fetchone()
-        else:
-            row = conn.execute("SELECT * FROM orders WHERE number = ?", (number_or_id,)).fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Order not found")
-        return OrderOut(**dict(row))
-
-
-@app.get("/api/orders", response_model=list[OrderOut], dependencies=[Depends(require_bot_token)])
-def list_orders(client_telegram: str | None = Query(default=None)) -> list[OrderOut]:
-    with get_conn(settings.sqlite_path) as conn:
-        if client_telegram:
-            rows = conn.execute(
-                "SELECT * FROM orders WHERE client_telegram = ? ORDER BY id DESC",
-                (client_telegram,),
-            ).fetchall()
-        else:
-            rows = conn.execute("SELECT * FROM orders ORDER BY id DESC").fetchall()
-        return [OrderOut(**dict(r)) for r in rows]
+async def get_order(number_or_id: str) -> OrderOut:
+    row = await db.read(_select_order, number_or_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return OrderOut(**dict(row))
+
+
+@app.get(
+    "/api/orders",
+    response_model=list[OrderListItem],
+    response_model_exclude_unset=True,
+    dependencies=[Depends(require_bot_token)],
+)
+async def list_orders(
+    response: Response,
+    client_telegram: str | None = Query(default=None),
+    status_filter: str | None = Query(default=None, alias="status"),
+    branch_id: int | None = Query(default=None),
+    created_from: datetime | None = Query(default=None),
+    created_to: datetime | None = Query(default=None),
+    after_id: int | None = Query(default=None, ge=1),
+    # No limit returns every match, as before pagination existed; paging callers pass one.
+    limit: int | None = Query(default=None, ge=1, le=500),
+    fields: str | None = Query(default=None),
+) -> list[OrderListItem]:
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = sorted(set(requested) - set(ORDER_FIELDS))
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(unknown)}")
+        columns = ["id", *(f for f in ORDER_FIELDS if f in requested and f != "id")]
+    else:
+        columns = list(ORDER_FIELDS)
+
+    where: list[str] = []
+    params: list[object] = []
+    if client_telegram:
+        where.append("client_telegram = ?")
+        params.append(client_telegram)
+    if status_filter:
+        where.append("status = ?")
+        params.append(status_filter)
+    if branch_id is not None:
+        where.append("branch_id = ?")
+        params.append(branch_id)
+    if created_from is not None:
+        where.append("created_at >= ?")
+        params.append(to_sql_datetime(created_from))
+    if created_to is not None:
+        where.append("created_at <= ?")
+        params.append(to_sql_datetime(created_to))
+    if after_id is not None:
+        # Keyset cursor: pages are ordered newest first.
+        where.append("id < ?")
+        params.append(after_id)
+    sql = f"SELECT {', '.join(columns)} FROM orders"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    rows = await db.read(_fetch_all, sql, params)
+    if limit is not None and len(rows) == limit:
+        response.headers["X-Next-After-Id"] = str(rows[-1]["id"])
+    return [OrderListItem(**dict(r)) for r in rows]
 
 
 @app.post("/api/orders/{order_id}/update", response_model=OrderOut, dependencies=[Depends(require_bot_token)])
-def update_order(order_id: int, payload: OrderUpdate) -> OrderOut:
+async def update_order(order_id: int, payload: OrderUpdate) -> OrderOut:
     updates: list[str] = []
     params: list[object] = []
     data = payload.model_dump(exclude_none=True)
@@ -135,45 +312,205 @@ def update_order(order_id: int, payload: OrderUpdate) -> OrderOut:
         updates.append(f"{key} = ?")
         params.append(value)
     if not updates:
-        return get_order(str(order_id))
+        return await get_order(str(order_id))
     params.append(order_id)
-    with get_conn(settings.sqlite_path) as conn:
+
+    def apply(conn: sqlite3.Connection) -> sqlite3.Row | None:
+        before = conn.execute("SELECT status FROM orders WHERE id = ?", (order_id,)).fetchone()
+        if not before:
+            return None
         conn.execute(f"UPDATE orders SET {', '.join(updates)} WHERE id = ?", params)
-        conn.commit()
         row = conn.execute("SELECT * FROM orders WHERE id = ?", (order_id,)).fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Order not found")
-        return OrderOut(**dict(row))
+        if row["status"] != before["status"]:
+            enqueue_status_notification(conn, row, before["status"])
+        return row
+
+    row = await db.write(apply)
+    if not row:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return OrderOut(**dict(row))
+
+
+@app.post(
+    "/api/notifications/claim",
+    response_model=list[NotificationOut],
+    dependencies=[Depends(require_bot_token)],
+)
+async def claim_notifications_endpoint(
+    limit: int = Query(default=50, ge=1, le=500),
+    wait: float = Query(default=0, ge=0),
+) -> list[NotificationOut]:
+    """Lease due customer notifications for delivery; ``wait`` long-polls like the change feed."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(wait, settings.changes_max_wait)
+    with db_commits.listen() as changed:
+        while True:
+            changed.clear()
+            claimed = await db.write(claim_notifications, settings, limit)
+            remaining = deadline - loop.time()
+            if claimed or remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+    return [NotificationOut(**n) for n in claimed]
+
+
+@app.post("/api/notifications/ack", dependencies=[Depends(require_bot_token)])
+async def ack_notifications(payload: NotificationAck) -> dict[str, int]:
+    failed = [f.model_dump() for f in payload.failed]
+    await db.write(record_notification_results, settings, payload.sent, failed)
+    return {"sent": len(payload.sent), "failed": len(failed)}
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
 
 
 @app.get("/api/branches/public", response_model=list[BranchOut], dependencies=[Depends(require_bot_token)])
-def list_branches_public() -> list[BranchOut]:
-    with get_conn(settings.sqlite_path) as conn:
-        rows = conn.execute("SELECT * FROM branches ORDER BY id ASC").fetchall()
-        return [BranchOut(**dict(r)) for r in rows]
+async def list_branches_public(
+    response: Response,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> list[BranchOut] | Response:
+    version, updated_at = await db.read(table_version, "branches")
+    etag = f'"branches-{version}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(updated_at, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    rows = await db.read(_fetch_all, "SELECT * FROM branches ORDER BY id ASC")
+    response.headers.update(headers)
+    return [BranchOut(**dict(r)) for r in rows]
 
 
 @app.get("/api/support-staff", response_model=list[SupportStaffOut], dependencies=[Depends(require_bot_token)])
-def list_support_staff() -> list[SupportStaffOut]:
-    with get_conn(settings.sqlite_path) as conn:
-        rows = conn.execute("SELECT * FROM support_staff ORDER BY id ASC").fetchall()
-        return [SupportStaffOut(**dict(r)) for r in rows]
+async def list_support_staff() -> list[SupportStaffOut]:
+    rows = await db.read(_fetch_all, "SELECT * FROM support_staff ORDER BY id ASC")
+    return [SupportStaffOut(**dict(r)) for r in rows]
+
+
+def _upsert_support_staff(conn: sqlite3.Connection, payload: SupportStaffCreate) -> sqlite3.Row:
+    conn.execute(
+        """
+        INSERT INTO support_staff(telegram_id, name)
+        VALUES(?, ?)
+        ON CONFLICT(telegram_id) DO UPDATE SET name = COALESCE(excluded.name, support_staff.name)
+        """,
+        (payload.telegram_id, payload.name),
+    )
+    return conn.execute("SELECT * FROM support_staff WHERE telegram_id = ?", (payload.telegram_id,)).fetchone()
 
 
 @app.post("/api/support-staff", response_model=SupportStaffOut, dependencies=[Depends(require_bot_token)])
-def add_support_staff(payload: SupportStaffCreate) -> SupportStaffOut:
-    with get_conn(settings.sqlite_path) as conn:
-        conn.execute(
-            """
-            INSERT INTO support_staff(telegram_id, name)
-            VALUES(?, ?)
-            ON CONFLICT(telegram_id) DO UPDATE SET name = COALESCE(excluded.name, support_staff.name)
-            """,
-            (payload.telegram_id, payload.name),
-        )
-        conn.commit()
-        row = conn.execute("SELECT * FROM support_staff WHERE telegram_id = ?", (payload.telegram_id,)).fetchone()
-        return SupportStaffOut(**dict(row))
+async def add_support_staff(payload: SupportStaffCreate) -> SupportStaffOut:
+    row = await db.write(_upsert_support_staff, payload)
+    return SupportStaffOut(**dict(row))
+
+
+def _insert_support_ticket(conn: sqlite3.Connection, payload: SupportTicketCreate) -> sqlite3.Row:
+    return conn.execute(
+        "INSERT INTO support_tickets(user_id, user_name, text) VALUES(?, ?, ?) RETURNING *",
+        (payload.user_id, payload.user_name, payload.text),
+    ).fetchone()
+
+
+def _page_support_tickets(
+    conn: sqlite3.Connection, condition: str, params: list[object], limit: int, offset: int
+) -> tuple[list[sqlite3.Row], int]:
+    # One read snapshot, so the page and the count agree; the pool ends it on release.
+    conn.execute("BEGIN")
+    rows = conn.execute(
+        f"SELECT * FROM support_tickets WHERE {condition} ORDER BY id ASC LIMIT ? OFFSET ?",
+        (*params, limit, offset),
+    ).fetchall()
+    total = conn.execute(f"SELECT COUNT(*) FROM support_tickets WHERE {condition}", params).fetchone()[0]
+    return rows, int(total)
+
+
+@app.post("/api/support-tickets", response_model=SupportTicketOut, dependencies=[Depends(require_bot_token)])
+async def create_support_ticket(payload: SupportTicketCreate) -> SupportTicketOut:
+    row = await db.write(_insert_support_ticket, payload)
+    return SupportTicketOut(**dict(row))
+
+
+@app.get("/api/support-tickets", response_model=list[SupportTicketOut], dependencies=[Depends(require_bot_token)])
+async def list_support_tickets(
+    response: Response,
+    status_filter: Literal["active", "open", "in_progress", "closed"] = Query(default="active", alias="status"),
+    assignee_id: int | None = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=200),
+    offset: int = Query(default=0, ge=0, le=10_000),
+) -> list[SupportTicketOut]:
+    """Tickets oldest first; ``active`` (the default) means every status but ``closed``.
+
+    ``X-Total-Count`` carries the number of matching tickets for page counters.
+    """
+    where: list[str] = []
+    params: list[object] = []
+    if status_filter == "active":
+        # Matches the partial index idx_support_tickets_active.
+        where.append("status != 'closed'")
+    else:
+        where.append("status = ?")
+        params.append(status_filter)
+    if assignee_id is not None:
+        where.append("assignee_id = ?")
+        params.append(assignee_id)
+    condition = " AND ".join(where)
+    rows, total = await db.read(_page_support_tickets, condition, params, limit, offset)
+    response.headers["X-Total-Count"] = str(total)
+    if offset + len(rows) < total:
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return [SupportTicketOut(**dict(r)) for r in rows]
+
+
+@app.get(
+    "/api/support-tickets/{ticket_id}",
+    response_model=SupportTicketOut,
+    dependencies=[Depends(require_bot_token)],
+)
+async def get_support_ticket(ticket_id: int) -> SupportTicketOut:
+    rows = await db.read(_fetch_all, "SELECT * FROM support_tickets WHERE id = ?", (ticket_id,))
+    if not rows:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return SupportTicketOut(**dict(rows[0]))
+
+
+@app.post(
+    "/api/support-tickets/{ticket_id}/update",
+    response_model=SupportTicketOut,
+    dependencies=[Depends(require_bot_token)],
+)
+async def update_support_ticket(ticket_id: int, payload: SupportTicketUpdate) -> SupportTicketOut:
+    data = payload.model_dump(exclude_none=True)
+    updates = [f"{key} = ?" for key in data]
+    params: list[object] = list(data.values())
+
+    def apply(conn: sqlite3.Connection) -> tuple[sqlite3.Row | None, bool]:
+        """Return ``(ticket, applied)``; ``applied`` is False when another staff member holds it."""
+        current = conn.execute("SELECT * FROM support_tickets WHERE id = ?", (ticket_id,)).fetchone()
+        if not current or not updates:
+            return current, True
+        assignee = current["assignee_id"]
+        if payload.assignee_id is not None and assignee is not None and assignee != payload.assignee_id:
+            return current, False
+        conn.execute(f"UPDATE support_tickets SET {', '.join(updates)} WHERE id = ?", (*params, ticket_id))
+        # Read back rather than RETURNING so updated_at from the trigger is included.
+        return conn.execute("SELECT * FROM support_tickets WHERE id = ?", (ticket_id,)).fetchone(), True
+
+    row, applied = await db.write(apply)
+    if not row:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    if not applied:
+        raise HTTPException(status_code=409, detail="Ticket is assigned to another staff member")
+    return SupportTicketOut(**dict(row))
 
 
 @app.get("/api/company-settings", dependencies=[Depends(require_bot_token)])
@@ -188,91 +525,66 @@ def company_settings() -> dict[str, str]:
 
 
 @app.get("/api/analytics/summary", response_model=AnalyticsSummary, dependencies=[Depends(require_bot_token)])
-def analytics_summary(date_from: str, date_to: str) -> AnalyticsSummary:
+async def analytics_summary(date_from: str, date_to: str) -> AnalyticsSummary:
     try:
         dt_from = datetime.fromisoformat(date_from)
         dt_to = datetime.fromisoformat(date_to)
     except Exception as exc:
         raise HTTPException(status_code=422, detail=f"Invalid datetime format: {exc}") from exc
-    with get_conn(settings.sqlite_path) as conn:
-        row = conn.execute(
-            """
-            SELECT
-                COUNT(*) AS orders,
-                COALESCE(SUM(price), 0) AS revenue,
-                COALESCE(SUM(cost), 0) AS costs
-            FROM orders
-            WHERE datetime(created_at) BETWEEN datetime(?) AND datetime(?)
-            """,
-            (dt_from.isoformat(), dt_to.isoformat()),
-        ).fetchone()
-        revenue = float(row["revenue"] or 0)
-        costs = float(row["costs"] or 0)
-        return AnalyticsSummary(
-            orders=int(row["orders"] or 0),
-            revenue=revenue,
-            costs=costs,
-            profit=revenue - costs,
-        )
+    orders, revenue, costs = await db.read(summarize_orders, dt_from, dt_to)
+    return AnalyticsSummary(
+        orders=orders,
+        revenue=revenue,
+        costs=costs,
+        profit=revenue - costs,
+    )
 
 
-def _orders_for_report() -> list[dict]:
-    with get_conn(settings.sqlite_path) as conn:
-        rows = conn.execute("SELECT * FROM orders ORDER BY id DESC").fetchall()
-        return [dict(r) for r in rows]
+def report_filters(
+    date_from: datetime | None = Query(default=None),
+    date_to: datetime | None = Query(default=None),
+    branch_id: int | None = Query(default=None),
+    status_filter: str | None = Query(default=None, alias="status"),
+) -> ReportFilters:
+    return ReportFilters(date_from=date_from, date_to=date_to, branch_id=branch_id, status=status_filter)
+
+
+def _accepts_gzip(accept_encoding: str | None) -> bool:
+    """True if ``Accept-Encoding`` allows gzip with a non-zero q-value (RFC 9110 section 12.5.3)."""
+    if not accept_encoding:
+        return False
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip().lower() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0))) > 0
 
 
 @app.get("/api/reports/csv", dependencies=[Depends(require_bot_token)])
-def export_csv() -> Response:
-    rows = _orders_for_report()
-    header = [
-        "id",
-        "number",
-        "status",
-        "created_at",
-        "branch_name",
-        "client_name",
-        "client_phone",
-        "device_type",
-        "model",
-        "problem_description",
-        "price",
-        "cost",
-    ]
-    stream = io.StringIO()
-    writer = csv.DictWriter(stream, fieldnames=header)
-    writer.writeheader()
-    for row in rows:
-        writer.writerow({k: row.get(k) for k in header})
-    return Response(content=stream.getvalue(), media_type="text/csv; charset=utf-8")
+def export_csv(
+    filters: Annotated[ReportFilters, Depends(report_filters)],
+    accept_encoding: Annotated[str | None, Header()] = None,
+) -> StreamingResponse:
+    chunks = iter_csv(db, filters, settings.report_batch_size)
+    headers = {"Content-Disposition": 'attachment; filename="orders.csv"', "Vary": "Accept-Encoding"}
+    if _accepts_gzip(accept_encoding):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type="text/csv; charset=utf-8", headers=headers)
 
 
 @app.get("/api/reports/xlsx", dependencies=[Depends(require_bot_token)])
-def export_xlsx() -> Response:
-    rows = _orders_for_report()
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "orders"
-    header = [
-        "id",
-        "number",
-        "status",
-        "created_at",
-        "branch_name",
-        "client_name",
-        "client_phone",
-        "device_type",
-        "model",
-        "problem_description",
-        "price",
-        "cost",
-    ]
-    ws.append(header)
-    for row in rows:
-        ws.append([row.get(k) for k in header])
-    output = io.BytesIO()
-    wb.save(output)
-    return Response(
-        content=output.getvalue(),
+def export_xlsx(filters: Annotated[ReportFilters, Depends(report_filters)]) -> StreamingResponse:
+    spool = spool_xlsx(db, filters, settings.report_batch_size)
+    return StreamingResponse(
+        iter_file(spool),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": 'attachment; filename="orders.xlsx"'},
     )
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import json
+import random
+import sqlite3
+from typing import Any
+
+from app.config import Settings
+
+
+def enqueue_status_notification(conn: sqlite3.Connection, order: sqlite3.Row, old_status: str) -> int | None:
+    """Queue a status-change message for the order's client inside the caller's transaction.
+
+    Orders whose ``client_telegram`` is not a numeric chat id are skipped. Older
+    undelivered status messages for the order are marked ``superseded``, so a
+    retry can never reach the client after a newer status.
+    """
+    chat_id = str(order["client_telegram"] or "").strip()
+    if not chat_id.lstrip("-").isdigit():
+        return None
+    payload = {
+        "number": order["number"],
+        "old_status": old_status,
+        "status": order["status"],
+        "model": order["model"],
+    }
+    conn.execute(
+        """
+        UPDATE order_notifications
+        SET status = 'superseded'
+        WHERE order_id = ? AND kind = 'status' AND status = 'pending'
+        """,
+        (order["id"],),
+    )
+    cur = conn.execute(
+        """
+        INSERT INTO order_notifications(order_id, chat_id, kind, payload)
+        VALUES(?, ?, 'status', ?)
+        """,
+        (order["id"], int(chat_id), json.dumps(payload, ensure_ascii=False)),
+    )
+    return int(cur.lastrowid)
+
+
+def claim_notifications(conn: sqlite3.Connection, settings: Settings, limit: int) -> list[dict[str, Any]]:
+    """Lease up to ``limit`` due notifications, oldest first.
+
+    Each lease counts as an attempt, so a message whose lease keeps expiring
+    (e.g. it crashes the consumer) goes ``dead`` after ``NOTIFICATION_MAX_ATTEMPTS``.
+    """
+    rows = conn.execute(
+        """
+        SELECT id, order_id, chat_id, kind, payload, attempts
+        FROM order_notifications
+        WHERE status = 'pending' AND next_attempt_at <= datetime('now')
+        ORDER BY id ASC
+        LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+    exhausted = [row for row in rows if row["attempts"] >= settings.notification_max_attempts]
+    conn.executemany(
+        """
+        UPDATE order_notifications
+        SET status = 'dead', last_error = COALESCE(last_error, 'lease expired without acknowledgement')
+        WHERE id = ?
+        """,
+        [(row["id"],) for row in exhausted],
+    )
+    rows = [row for row in rows if row["attempts"] < settings.notification_max_attempts]
+    # Leased rows come back only if the consumer never acknowledges them.
+    conn.executemany(
+        """
+        UPDATE order_notifications
+        SET attempts = attempts + 1, next_attempt_at = datetime('now', ?)
+        WHERE id = ?
+        """,
+        [(f"+{int(settings.notification_lease_seconds)} seconds", row["id"]) for row in rows],
+    )
+    return [
+        {**dict(row), "payload": json.loads(row["payload"]), "attempts": row["attempts"] + 1} for row in rows
+    ]
+
+
+def notification_backoff(settings: Settings, attempts: int) -> float:
+    base = settings.notification_backoff_base * (2 ** (attempts - 1))
+    capped = min(base, settings.notification_backoff_max)
+    return capped / 2 + random.uniform(0, capped / 2)
+
+
+def record_notification_results(
+    conn: sqlite3.Connection,
+    settings: Settings,
+    sent: list[int],
+    failed: list[dict[str, Any]],
+) -> None:
+    """Mark ``sent`` ids delivered and reschedule (or bury) the ``failed`` ones.
+
+    The attempt was already counted when the row was claimed. Results for rows
+    superseded meanwhile are ignored.
+    """
+    conn.executemany(
+        """
+        UPDATE order_notifications
+        SET status = 'sent', last_error = NULL
+        WHERE id = ? AND status = 'pending'
+        """,
+        [(notification_id,) for notification_id in sent],
+    )
+    for failure in failed:
+        row = conn.execute(
+            "SELECT attempts FROM order_notifications WHERE id = ? AND status = 'pending'",
+            (failure["id"],),
+        ).fetchone()
+        if not row:
+            continue
+        attempts = int(row["attempts"])
+        dead = failure.get("permanent") or attempts >= settings.notification_max_attempts
+        retry_after = failure.get("retry_after")
+        delay = retry_after if retry_after is not None else notification_backoff(settings, attempts)
+        conn.execute(
+            """
+            UPDATE order_notifications
+            SET status = ?, attempts = ?, last_error = ?, next_attempt_at = datetime('now', ?)
+            WHERE id = ?
+            """,
+            ("dead" if dead else "pending", attempts, failure["error"][:1000], f"+{delay:.0f} seconds", failure["id"]),
+        )
+
+
+def notification_depth(conn: sqlite3.Connection) -> dict[str, int]:
+    rows = conn.execute(
+        """
+        SELECT status, COUNT(*) AS cnt FROM order_notifications
+        WHERE status IN ('pending', 'dead')
+        GROUP BY status
+        """
+    ).fetchall()
+    depth = {"pending": 0, "dead": 0}
+    for row in rows:
+        depth[row["status"]] = int(row["cnt"])
+    return depth
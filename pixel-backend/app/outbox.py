@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+from typing import Any
+from uuid import uuid4
+
+from app.config import Settings
+from app.integration import IntegrationClient
+from app.pool import SQLitePool
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_intake(conn: sqlite3.Connection, order_id: int, payload: dict[str, Any]) -> int:
+    """Queue an intake for ``order_id`` inside the caller's transaction."""
+    cur = conn.execute(
+        """
+        INSERT INTO integration_outbox(order_id, idempotency_key, payload)
+        VALUES(?, ?, ?)
+        """,
+        (order_id, str(uuid4()), json.dumps(payload, ensure_ascii=False)),
+    )
+    return int(cur.lastrowid)
+
+
+def _execute(conn: sqlite3.Connection, sql: str, params: tuple[Any, ...]) -> None:
+    conn.execute(sql, params)
+
+
+def outbox_depth(conn: sqlite3.Connection) -> dict[str, int]:
+    rows = conn.execute(
+        "SELECT status, COUNT(*) AS cnt FROM integration_outbox WHERE status != 'done' GROUP BY status"
+    ).fetchall()
+    depth = {"pending": 0, "dead": 0}
+    for row in rows:
+        depth[row["status"]] = int(row["cnt"])
+    return depth
+
+
+class OutboxDispatcher:
+    def __init__(self, settings: Settings, client: IntegrationClient, db: SQLitePool) -> None:
+        self.settings = settings
+        self.client = client
+        self.db = db
+        self._task: asyncio.Task[None] | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup = asyncio.Event()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._loop = None
+
+    def notify(self) -> None:
+        # Called from request worker threads; the event belongs to the loop.
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.dispatch_once()
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+                processed = 0
+            if processed:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.settings.outbox_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def dispatch_once(self) -> int:
+        """Deliver due outbox entries; returns how many entries were attempted."""
+        entries = await self.db.write(self._claim_due)
+        if entries:
+            await asyncio.gather(*(self._deliver(entry) for entry in entries))
+        return len(entries)
+
+    def _claim_due(self, conn: sqlite3.Connection) -> list[dict[str, Any]]:
+        rows = conn.execute(
+            """
+            SELECT id, order_id, idempotency_key, payload, attempts
+            FROM integration_outbox
+            WHERE status = 'pending' AND next_attempt_at <= datetime('now')
+            ORDER BY id ASC
+            LIMIT ?
+            """,
+            (self.settings.outbox_batch_size,),
+        ).fetchall()
+        if not rows:
+            return []
+        # Lease claimed rows so a slow delivery is not picked up twice.
+        conn.executemany(
+            "UPDATE integration_outbox SET next_attempt_at = datetime('now', ?) WHERE id = ?",
+            [(f"+{int(self.settings.outbox_lease_seconds)} seconds", row["id"]) for row in rows],
+        )
+        return [dict(row) for row in rows]
+
+    async def _deliver(self, entry: dict[str, Any]) -> None:
+        try:
+            result = await self.client.create_intake(
+                json.loads(entry["payload"]),
+                idempotency_key=entry["idempotency_key"],
+            )
+        except Exception as exc:
+            await self._record_failure(entry, str(exc) or exc.__class__.__name__)
+            return
+        result = result or {}
+        if result.get("complete") is False:
+            # integration-service answered once the ticket existed and is still creating the ERP
+            # issue; re-sending the same key later replays the finished response.
+            attempts = int(entry["attempts"]) + 1
+            await self.db.write(self._record_partial, entry, result, attempts, self._backoff(attempts))
+            return
+        await self.db.write(self._record_success, entry, result)
+
+    @staticmethod
+    def _update_order(conn: sqlite3.Connection, entry: dict[str, Any], result: dict[str, Any]) -> None:
+        conn.execute(
+            """
+            UPDATE orders
+            SET zammad_ticket_number = COALESCE(?, zammad_ticket_number),
+                erpnext_issue = COALESCE(?, erpnext_issue)
+            WHERE id = ?
+            """,
+            (result.get("zammad_ticket_number"), result.get("erpnext_issue"), entry["order_id"]),
+        )
+
+    @classmethod
+    def _record_success(cls, conn: sqlite3.Connection, entry: dict[str, Any], result: dict[str, Any]) -> None:
+        cls._update_order(conn, entry, result)
+        conn.execute(
+            """
+            UPDATE integration_outbox
+            SET status = 'done', attempts = attempts + 1, last_error = NULL
+            WHERE id = ?
+            """,
+            (entry["id"],),
+        )
+
+    def _record_partial(
+        self,
+        conn: sqlite3.Connection,
+        entry: dict[str, Any],
+        result: dict[str, Any],
+        attempts: int,
+        delay: float,
+    ) -> None:
+        self._update_order(conn, entry, result)
+        status = "dead" if attempts >= self.settings.outbox_max_attempts else "pending"
+        conn.execute(
+            """
+            UPDATE integration_outbox
+            SET status = ?, attempts = ?, last_error = ?, next_attempt_at = datetime('now', ?)
+            WHERE id = ?
+            """,
+            (status, attempts, "intake post-processing pending", f"+{delay:.0f} seconds", entry["id"]),
+        )
+        if status == "dead":
+            logger.warning("Outbox entry %s for order %s never got its ERP issue", entry["id"], entry["order_id"])
+
+    async def _record_failure(self, entry: dict[str, Any], error: str) -> None:
+        attempts = int(entry["attempts"]) + 1
+        status = "dead" if attempts >= self.settings.outbox_max_attempts else "pending"
+        delay = self._backoff(attempts)
+        await self.db.write(
+            _execute,
+            """
+            UPDATE integration_outbox
+            SET status = ?, attempts = ?, last_error = ?, next_attempt_at = datetime('now', ?)
+            WHERE id = ?
+            """,
+            (status, attempts, error[:1000], f"+{delay:.0f} seconds", entry["id"]),
+        )
+        if status == "dead":
+            logger.warning("Outbox entry %s for order %s is dead: %s", entry["id"], entry["order_id"], error)
+
+    def _backoff(self, attempts: int) -> float:
+        base = self.settings.outbox_backoff_base * (2 ** (attempts - 1))
+        capped = min(base, self.settings.outbox_backoff_max)
+        return capped / 2 + random.uniform(0, capped / 2)
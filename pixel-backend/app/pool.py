@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import queue
+import sqlite3
+import threading
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, NamedTuple, TypeVar
+
+from app.config import Settings
+
+T = TypeVar("T")
+
+
+class PoolClosedError(RuntimeError):
+    pass
+
+
+class _WriteOp(NamedTuple):
+    fn: Callable[..., Any]
+    args: tuple[Any, ...]
+    kwargs: dict[str, Any]
+    future: Future
+
+
+class SQLitePool:
+    """One writer and a fixed set of reader connections to a WAL database.
+
+    SQLite serialises writers anyway, so all writes share a single connection
+    guarded by a lock; readers never block the writer under WAL.
+
+    Async code goes through ``read()`` / ``write()`` so the event loop never
+    waits on a query or an fsync. Reads run on a thread pool sized to the
+    reader connections. Writes are queued to a single writer thread that
+    applies whatever has queued up (up to ``SQLITE_WRITE_BATCH_SIZE``
+    operations) in one transaction, each operation inside its own savepoint,
+    and commits once per batch.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self.sqlite_path: str | None = None
+        self._writer: sqlite3.Connection | None = None
+        self._write_lock = threading.Lock()
+        self._readers: queue.Queue[sqlite3.Connection] = queue.Queue()
+        self._all_readers: list[sqlite3.Connection] = []
+        self._executor: ThreadPoolExecutor | None = None
+        self._write_queue: queue.Queue[_WriteOp | None] = queue.Queue()
+        self._write_thread: threading.Thread | None = None
+        self.write_batches = 0
+        self.write_ops = 0
+        self._commit_listeners: list[Callable[[], None]] = []
+
+    def _connect(self, sqlite_path: str, *, read_only: bool) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            sqlite_path,
+            check_same_thread=False,
+            timeout=self.settings.sqlite_busy_timeout_ms / 1000,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL skips the fsync on WAL commits, so a power loss could drop batches the writer
+        # already acknowledged. FULL costs one fsync per group commit, not one per request.
+        conn.execute(f"PRAGMA synchronous={'NORMAL' if read_only else 'FULL'}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.settings.sqlite_busy_timeout_ms)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.settings.sqlite_mmap_size)}")
+        # Negative cache_size is in KiB rather than pages.
+        conn.execute(f"PRAGMA cache_size={-int(self.settings.sqlite_cache_size_kb)}")
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def open(self, sqlite_path: str) -> None:
+        self.close()
+        self._writer = self._connect(sqlite_path, read_only=False)
+        for _ in range(max(1, self.settings.sqlite_readers)):
+            conn = self._connect(sqlite_path, read_only=True)
+            self._all_readers.append(conn)
+            self._readers.put(conn)
+        # One thread per reader: more would only queue on the pool.
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self._all_readers),
+            thread_name_prefix="sqlite-reader",
+        )
+        self._write_queue = queue.Queue()
+        self._write_thread = threading.Thread(
+            target=self._write_loop,
+            args=(self._write_queue,),
+            name="sqlite-writer",
+            daemon=True,
+        )
+        self._write_thread.start()
+        self.sqlite_path = sqlite_path
+
+    def close(self) -> None:
+        if self._write_thread is not None:
+            # Queued writes ahead of the sentinel are still applied.
+            self._write_queue.put(None)
+            self._write_thread.join()
+            self._write_thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        for conn in self._all_readers:
+            conn.close()
+        self._all_readers = []
+        self._readers = queue.Queue()
+        self.sqlite_path = None
+
+    def add_commit_listener(self, listener: Callable[[], None]) -> None:
+        """Call ``listener()`` from the writing thread after each commit that changed rows."""
+        self._commit_listeners.append(listener)
+
+    def _committed(self, changes_before: int, changes_after: int) -> None:
+        if changes_after == changes_before:
+            return
+        for listener in self._commit_listeners:
+            listener()
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        if not self._all_readers:
+            raise PoolClosedError("SQLite pool is not open")
+        readers = self._readers
+        conn = readers.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            readers.put(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Yield the writer connection; commit on success, roll back on error."""
+        with self._write_lock:
+            conn = self._writer
+            if conn is None:
+                raise PoolClosedError("SQLite pool is not open")
+            changes_before = conn.total_changes
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+            changes_after = conn.total_changes
+        self._committed(changes_before, changes_after)
+
+    def _with_reader(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        with self.reader() as conn:
+            return fn(conn, *args, **kwargs)
+
+    async def read(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run ``fn(conn, *args, **kwargs)`` on a reader connection off the event loop."""
+        executor = self._executor
+        if executor is None:
+            raise PoolClosedError("SQLite pool is not open")
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(self._with_reader, fn, *args, **kwargs)
+        )
+
+    def submit_write(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> Future:
+        """Queue ``fn(conn, *args, **kwargs)`` for the writer thread; the future resolves after a synced commit."""
+        if self._write_thread is None:
+            raise PoolClosedError("SQLite pool is not open")
+        future: Future = Future()
+        self._write_queue.put(_WriteOp(fn, args, kwargs, future))
+        return future
+
+    async def write(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run ``fn(conn, *args, **kwargs)`` on the writer; returns once its batch is committed."""
+        return await asyncio.wrap_future(self.submit_write(fn, *args, **kwargs))
+
+    def _write_loop(self, ops: queue.Queue[_WriteOp | None]) -> None:
+        max_batch = max(1, self.settings.sqlite_write_batch_size)
+        while True:
+            op = ops.get()
+            if op is None:
+                return
+            batch = [op]
+            stopping = False
+            while len(batch) < max_batch:
+                try:
+                    op = ops.get_nowait()
+                except queue.Empty:
+                    break
+                if op is None:
+                    stopping = True
+                    break
+                batch.append(op)
+            self._apply_batch(batch)
+            if stopping:
+                return
+
+    def _apply_batch(self, batch: list[_WriteOp]) -> None:
+        done: list[tuple[Future, Any, BaseException | None]] = []
+        with self._write_lock:
+            conn = self._writer
+            if conn is None:
+                for op in batch:
+                    op.future.set_exception(PoolClosedError("SQLite pool is not open"))
+                return
+            changes_before = conn.total_changes
+            try:
+                if not conn.in_transaction:
+                    conn.execute("BEGIN")
+                for op in batch:
+                    if not op.future.set_running_or_notify_cancel():
+                        continue
+                    # A failing operation only rolls back its own savepoint.
+                    conn.execute("SAVEPOINT write_op")
+                    try:
+                        result = op.fn(conn, *op.args, **op.kwargs)
+                    except Exception as exc:
+                        conn.execute("ROLLBACK TO write_op")
+                        conn.execute("RELEASE write_op")
+                        done.append((op.future, None, exc))
+                    else:
+                        conn.execute("RELEASE write_op")
+                        done.append((op.future, result, None))
+                conn.commit()
+            except BaseException as exc:
+                conn.rollback()
+                for op in batch:
+                    if not op.future.done():
+                        op.future.set_exception(exc)
+                return
+            self.write_batches += 1
+            self.write_ops += len(done)
+            changes_after = conn.total_changes
+        self._committed(changes_before, changes_after)
+        for future, result, error in done:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import csv
+import io
+import math
+import re
+import tempfile
+import zipfile
+import zlib
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime
+from typing import IO
+from xml.sax.saxutils import escape
+
+from app.db import to_sql_datetime
+from app.pool import SQLitePool
+
+REPORT_COLUMNS = [
+    "id",
+    "number",
+    "status",
+    "created_at",
+    "branch_name",
+    "client_name",
+    "client_phone",
+    "device_type",
+    "model",
+    "problem_description",
+    "price",
+    "cost",
+]
+
+
+@dataclass
+class ReportFilters:
+    date_from: datetime | None = None
+    date_to: datetime | None = None
+    branch_id: int | None = None
+    status: str | None = None
+
+
+def report_query(
+    filters: ReportFilters, *, before_id: int | None = None, limit: int | None = None
+) -> tuple[str, list[object]]:
+    where: list[str] = []
+    params: list[object] = []
+    if filters.date_from is not None:
+        where.append("created_at >= ?")
+        params.append(to_sql_datetime(filters.date_from))
+    if filters.date_to is not None:
+        where.append("created_at <= ?")
+        params.append(to_sql_datetime(filters.date_to))
+    if filters.branch_id is not None:
+        where.append("branch_id = ?")
+        params.append(filters.branch_id)
+    if filters.status:
+        where.append("status = ?")
+        params.append(filters.status)
+    if before_id is not None:
+        where.append("id < ?")
+        params.append(before_id)
+    sql = f"SELECT {', '.join(REPORT_COLUMNS)} FROM orders"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+
+def iter_report_batches(db: SQLitePool, filters: ReportFilters, batch_size: int) -> Iterator[list[tuple]]:
+    """Yield report rows ``batch_size`` at a time, newest first.
+
+    Each batch is its own keyset query (``id < last id``) on a reader borrowed
+    just for that query. A slow download therefore holds neither a pool
+    connection nor an open read snapshot, which would stop WAL checkpoints.
+    Orders created after the export started are not included.
+    """
+    before_id: int | None = None
+    while True:
+        sql, params = report_query(filters, before_id=before_id, limit=batch_size)
+        with db.reader() as conn:
+            rows = [tuple(row) for row in conn.execute(sql, params)]
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        before_id = rows[-1][0]
+
+
+def iter_csv(db: SQLitePool, filters: ReportFilters, batch_size: int) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REPORT_COLUMNS)
+    for batch in iter_report_batches(db, filters, batch_size):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    "</Types>"
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="orders" sheetId="1" r:id="rId1"/></sheets>'
+    "</workbook>"
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    "</Relationships>"
+)
+# XML 1.0 forbids most C0 control characters even when escaped.
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_cell(value: object) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, int) or (isinstance(value, float) and math.isfinite(value)):
+        return f"<c><v>{value!r}</v></c>"
+    # Excel rejects a workbook with inf/nan in a numeric cell, so those are written as text.
+    text = escape(_XML_ILLEGAL.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values: Iterable[object]) -> str:
+    return "<row>" + "".join(_xlsx_cell(v) for v in values) + "</row>"
+
+
+def write_xlsx(db: SQLitePool, filters: ReportFilters, batch_size: int, target: IO[bytes]) -> None:
+    """Write a single-sheet workbook, streaming rows into the zip one batch at a time.
+
+    Cells are inline strings and plain numbers, so no shared-string table or
+    per-cell objects have to be kept in memory.
+    """
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _XLSX_WORKBOOK)
+        archive.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                (
+                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                    + _xlsx_row(REPORT_COLUMNS)
+                ).encode("utf-8")
+            )
+            for batch in iter_report_batches(db, filters, batch_size):
+                sheet.write("".join(_xlsx_row(row) for row in batch).encode("utf-8"))
+            sheet.write(b"</sheetData></worksheet>")
+
+
+def spool_xlsx(db: SQLitePool, filters: ReportFilters, batch_size: int) -> IO[bytes]:
+    spool = tempfile.TemporaryFile(suffix=".xlsx")
+    try:
+        write_xlsx(db, filters, batch_size, spool)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def iter_file(handle: IO[bytes], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    try:
+        while chunk := handle.read(chunk_size):
+            yield chunk
+    finally:
+        handle.close()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
+from typing import Any, Literal
 
 from pydantic import BaseModel, Field
 
@@ -43,6 +44,31 @@ class OrderOut(BaseModel):
     erpnext_issue: str | None
     price: float
     cost: float
+    row_version: int = 0
+
+
+class OrderListItem(BaseModel):
+    """Order row for list views; only the projected ``fields`` are set."""
+
+    id: int
+    number: str | None = None
+    status: str | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    branch_id: int | None = None
+    branch_name: str | None = None
+    branch_address: str | None = None
+    client_name: str | None = None
+    client_phone: str | None = None
+    client_telegram: str | None = None
+    device_type: str | None = None
+    model: str | None = None
+    problem_description: str | None = None
+    zammad_ticket_number: str | None = None
+    erpnext_issue: str | None = None
+    price: float | None = None
+    cost: float | None = None
+    row_version: int | None = None
 
 
 class BranchOut(BaseModel):
@@ -66,8 +92,66 @@ class SupportStaffOut(BaseModel):
     created_at: datetime
 
 
+TicketStatus = Literal["open", "in_progress", "closed"]
+
+
+class SupportTicketCreate(BaseModel):
+    user_id: int
+    user_name: str = Field(default="", max_length=200)
+    text: str = Field(max_length=4000)
+
+
+class SupportTicketUpdate(BaseModel):
+    """``assignee_id`` claims the ticket; it fails with 409 if another staff member holds it."""
+
+    status: TicketStatus | None = None
+    assignee_id: int | None = None
+
+
+class SupportTicketOut(BaseModel):
+    id: int
+    user_id: int
+    user_name: str
+    text: str
+    status: TicketStatus
+    assignee_id: int | None
+    created_at: datetime
+    updated_at: datetime
+
+
 class AnalyticsSummary(BaseModel):
     orders: int
     revenue: float
     costs: float
     profit: float
+
+
+class OrderChanges(BaseModel):
+    """One page of the order change feed; poll again with ``since=next_since``."""
+
+    items: list[OrderOut]
+    next_since: int
+    has_more: bool
+
+
+class NotificationOut(BaseModel):
+    id: int
+    order_id: int
+    chat_id: int
+    kind: str
+    payload: dict[str, Any]
+    attempts: int
+
+
+class NotificationFailure(BaseModel):
+    id: int
+    error: str = Field(max_length=1000)
+    retry_after: float | None = Field(default=None, ge=0)
+    permanent: bool = False
+
+
+class NotificationAck(BaseModel):
+    """Delivery results for claimed notifications; ``permanent`` failures are not retried."""
+
+    sent: list[int] = Field(default_factory=list)
+    failed: list[NotificationFailure] = Field(default_factory=list)
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+from collections.abc import Sequence
+
+from app.db import PHONE_SEPARATORS
+
+# bm25 weights per orders_fts column: number, client_name, client_phone, model, problem_description.
+_BM25 = "bm25(orders_fts, 10.0, 4.0, 6.0, 3.0, 1.0)"
+_PHONE_TERM = re.compile(r"^[\d" + re.escape(PHONE_SEPARATORS) + r"]+$")
+MIN_TERM_LENGTH = 3
+# Relevance ranking scores at most this many of the newest matches, so a very
+# common term ("iphone") costs the same as a rare one.
+RANK_WINDOW = 2000
+
+
+def build_match_query(q: str) -> str | None:
+    """Turn free text into an FTS5 query: every term must appear as a substring.
+
+    Phone-like terms are reduced to digits, as ``client_phone`` is indexed.
+    Terms shorter than the trigram size can't match and are dropped; returns
+    None when nothing searchable is left.
+    """
+    terms: list[str] = []
+    for term in q.split():
+        if _PHONE_TERM.match(term):
+            term = re.sub(r"\D", "", term)
+        if len(term) >= MIN_TERM_LENGTH:
+            terms.append('"' + term.replace('"', '""') + '"')
+    return " AND ".join(terms) or None
+
+
+def search_orders(
+    conn: sqlite3.Connection,
+    match: str,
+    columns: Sequence[str],
+    *,
+    limit: int,
+    offset: int,
+    sort: str = "rank",
+) -> list[sqlite3.Row]:
+    """Matching orders, best match first (or newest first with ``sort='recent'``).
+
+    Ranked results cover the newest ``RANK_WINDOW`` matches; FTS5 walks the
+    index by rowid and stops there instead of scoring every match.
+    """
+    select = ", ".join(f"o.{col}" for col in columns)
+    if sort == "recent":
+        sql = f"""
+            SELECT {select}
+            FROM orders_fts
+            JOIN orders AS o ON o.id = orders_fts.rowid
+            WHERE orders_fts MATCH ?
+            ORDER BY orders_fts.rowid DESC
+            LIMIT ? OFFSET ?
+        """
+        return conn.execute(sql, (match, limit, offset)).fetchall()
+    sql = f"""
+        SELECT {select}
+        FROM (
+            SELECT rowid AS id, {_BM25} AS score
+            FROM orders_fts
+            WHERE orders_fts MATCH ?
+            ORDER BY rowid DESC
+            LIMIT ?
+        ) AS hits
+        JOIN orders AS o ON o.id = hits.id
+        ORDER BY hits.score, hits.id DESC
+        LIMIT ? OFFSET ?
+    """
+    return conn.execute(sql, (match, RANK_WINDOW, limit, offset)).fetchall()
@@ -0,0 +1,89 @@
+"""Latency of /api/analytics/summary queries as the orders table grows.
+
+Compares the old ``datetime(created_at) BETWEEN ...`` scan with the rollup-backed
+summarize_orders() for a 30-day window.
+
+Run from pixel-backend/:  python -m benchmarks.bench_analytics [--sizes 10000,100000,500000]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app.analytics import summarize_orders
+from app.config import load_settings
+from app.db import init_db
+from app.pool import SQLitePool
+
+OLD_QUERY = """
+    SELECT COUNT(*) AS orders, COALESCE(SUM(price), 0) AS revenue, COALESCE(SUM(cost), 0) AS costs
+    FROM orders
+    WHERE datetime(created_at) BETWEEN datetime(?) AND datetime(?)
+"""
+
+
+def _grow(db: SQLitePool, start_id: int, count: int, now: datetime) -> None:
+    rng = random.Random(start_id)
+    rows = []
+    for idx in range(start_id, start_id + count):
+        created = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        rows.append(
+            (
+                f"PIX-BENCH-{idx:07d}",
+                created.strftime("%Y-%m-%d %H:%M:%S"),
+                rng.randint(1, 3),
+                rng.choice(["new", "in_progress", "done"]),
+                rng.randint(10, 300) * 100,
+                rng.randint(5, 150) * 100,
+            )
+        )
+    with db.writer() as conn:
+        conn.executemany(
+            """
+            INSERT INTO orders(number, created_at, branch_id, status, price, cost, client_name, client_phone,
+                               client_telegram, device_type, problem_description)
+            VALUES(?, ?, ?, ?, ?, ?, 'Bench', '+79990000000', '1', 'Смартфон', 'Не включается')
+            """,
+            rows,
+        )
+
+
+def _time(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,500000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    sizes = [int(x) for x in args.sizes.split(",")]
+
+    now = datetime(2026, 6, 30, 18, 0, 0)
+    dt_from, dt_to = now - timedelta(days=30), now
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_path = str(Path(tmp) / "bench.db")
+        init_db(sqlite_path)
+        db = SQLitePool(load_settings())
+        db.open(sqlite_path)
+        seeded = 0
+        print(f"{'orders':>10} {'old scan, ms':>14} {'rollup, ms':>12}")
+        for size in sizes:
+            _grow(db, seeded, size - seeded, now)
+            seeded = size
+            with db.reader() as conn:
+                old = _time(lambda: conn.execute(OLD_QUERY, (dt_from.isoformat(), dt_to.isoformat())).fetchone(), args.repeat)
+                new = _time(lambda: summarize_orders(conn, dt_from, dt_to), args.repeat)
+            print(f"{size:>10} {old:>14.2f} {new:>12.2f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
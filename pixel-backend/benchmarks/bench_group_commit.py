@@ -0,0 +1,88 @@
+"""Order-creation throughput: one commit per request vs the group-commit writer.
+
+"per-request" runs each insert in its own ``SQLitePool.writer()`` transaction
+from a thread pool, which is how handlers committed before; "group-commit"
+awaits ``SQLitePool.write()`` for every order at once and lets the writer
+thread commit them in batches.
+
+Run from pixel-backend/:  python -m benchmarks.bench_group_commit [--orders 500] [--synchronous FULL]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.config import load_settings
+from app.db import init_db
+from app.main import _insert_order
+from app.pool import SQLitePool
+from app.schemas import OrderCreate
+
+
+def _payload(idx: int) -> OrderCreate:
+    return OrderCreate(
+        branch_id=1 + idx % 3,
+        client_name=f"Bench {idx}",
+        client_phone="+79990000000",
+        client_telegram=str(100000 + idx),
+        device_type="Смартфон",
+        model="Pixel 8",
+        problem_description="Не включается",
+    )
+
+
+def _open(tmp: str, label: str, synchronous: str) -> SQLitePool:
+    sqlite_path = str(Path(tmp) / f"{label}.db")
+    init_db(sqlite_path)
+    db = SQLitePool(load_settings())
+    db.open(sqlite_path)
+    with db.writer() as conn:
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+    return db
+
+
+def _per_request(db: SQLitePool, orders: int, threads: int) -> None:
+    def create(idx: int) -> None:
+        with db.writer() as conn:
+            _insert_order(conn, _payload(idx))
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(create, range(orders)))
+
+
+async def _group_commit(db: SQLitePool, orders: int) -> None:
+    await asyncio.gather(*(db.write(_insert_order, _payload(idx)) for idx in range(orders)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--synchronous", default="FULL", choices=["OFF", "NORMAL", "FULL"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.orders} parallel order creations, synchronous={args.synchronous}")
+        results = {}
+        for label in ("per-request", "group-commit"):
+            db = _open(tmp, label, args.synchronous)
+            started = time.perf_counter()
+            if label == "per-request":
+                _per_request(db, args.orders, args.threads)
+                commits = args.orders
+            else:
+                asyncio.run(_group_commit(db, args.orders))
+                commits = db.write_batches
+            elapsed = time.perf_counter() - started
+            db.close()
+            results[label] = args.orders / elapsed
+            print(f"{label:<13} {elapsed:6.2f}s  {results[label]:8.1f} orders/s  {commits} commits")
+        print(f"speedup: {results['group-commit'] / results['per-request']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
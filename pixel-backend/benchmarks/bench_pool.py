@@ -0,0 +1,79 @@
+"""Compare per-request sqlite3.connect() with the pooled connection layer.
+
+Run from pixel-backend/:  python -m benchmarks.bench_pool [--orders N] [--requests N] [--threads N]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.config import load_settings
+from app.db import get_conn, init_db
+from app.pool import SQLitePool
+
+
+def _seed(sqlite_path: str, orders: int) -> None:
+    init_db(sqlite_path)
+    conn = get_conn(sqlite_path)
+    conn.executemany(
+        """
+        INSERT INTO orders(number, branch_id, client_name, client_phone, client_telegram, device_type,
+                           problem_description)
+        VALUES(?, 1, 'Bench', '+79990000000', ?, 'Смартфон', 'Не включается')
+        """,
+        [(f"PIX-BENCH-{i:07d}", str(i % 500)) for i in range(orders)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _run(label: str, fn, requests: int, threads: int, orders: int) -> float:
+    ids = [random.randint(1, orders) for _ in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(fn, ids))
+    elapsed = time.perf_counter() - started
+    rps = requests / elapsed
+    print(f"{label:<28} {rps:>10.0f} req/s  ({elapsed:.2f}s for {requests} lookups)")
+    return rps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_path = str(Path(tmp) / "bench.db")
+        _seed(sqlite_path, args.orders)
+
+        def per_request(order_id: int) -> None:
+            # Mirrors the old handlers: a fresh connection per request. Closed
+            # explicitly here, otherwise the leaked handles exhaust the fd limit.
+            with closing(get_conn(sqlite_path)) as conn:
+                conn.execute("SELECT * FROM orders WHERE id = ?", (order_id,)).fetchone()
+
+        settings = load_settings()
+        settings.sqlite_readers = args.threads
+        db = SQLitePool(settings)
+        db.open(sqlite_path)
+
+        def pooled(order_id: int) -> None:
+            with db.reader() as conn:
+                conn.execute("SELECT * FROM orders WHERE id = ?", (order_id,)).fetchone()
+
+        before = _run("connect per request", per_request, args.requests, args.threads, args.orders)
+        after = _run("SQLitePool.reader()", pooled, args.requests, args.threads, args.orders)
+        db.close()
+        print(f"speedup: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Time and peak RSS of the CSV/XLSX report builders.
+
+"old" rebuilds the previous in-memory implementations (list of dicts + StringIO /
+regular openpyxl Workbook + BytesIO); "new" uses app.reports. Each case runs in
+its own interpreter so peak RSS is not shared between cases.
+
+Run from pixel-backend/:  python -m benchmarks.bench_reports [--rows 100000]
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from openpyxl import Workbook
+
+from app.config import load_settings
+from app.db import init_db
+from app.pool import SQLitePool
+from app.reports import REPORT_COLUMNS, ReportFilters, iter_csv, iter_file, spool_xlsx
+
+
+def _seed(db: SQLitePool, rows: int) -> None:
+    with db.writer() as conn:
+        conn.executemany(
+            """
+            INSERT INTO orders(number, branch_id, branch_name, client_name, client_phone, client_telegram,
+                               device_type, model, problem_description, price, cost)
+            VALUES(?, 1, 'Белореченская', 'Иван Петров', '+79990000000', '1', 'Смартфон', 'iPhone 13',
+                   'Не включается после падения в воду', 12000, 7000)
+            """,
+            [(f"PIX-BENCH-{idx:07d}",) for idx in range(rows)],
+        )
+
+
+def _old_rows(db: SQLitePool) -> list[dict]:
+    with db.reader() as conn:
+        return [dict(r) for r in conn.execute("SELECT * FROM orders ORDER BY id DESC").fetchall()]
+
+
+def old_csv(db: SQLitePool) -> int:
+    stream = io.StringIO()
+    writer = csv.DictWriter(stream, fieldnames=REPORT_COLUMNS)
+    writer.writeheader()
+    for row in _old_rows(db):
+        writer.writerow({k: row.get(k) for k in REPORT_COLUMNS})
+    return len(stream.getvalue().encode("utf-8"))
+
+
+def new_csv(db: SQLitePool) -> int:
+    return sum(len(chunk) for chunk in iter_csv(db, ReportFilters(), 500))
+
+
+def old_xlsx(db: SQLitePool) -> int:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "orders"
+    ws.append(REPORT_COLUMNS)
+    for row in _old_rows(db):
+        ws.append([row.get(k) for k in REPORT_COLUMNS])
+    output = io.BytesIO()
+    wb.save(output)
+    return len(output.getvalue())
+
+
+def new_xlsx(db: SQLitePool) -> int:
+    return sum(len(chunk) for chunk in iter_file(spool_xlsx(db, ReportFilters(), 500)))
+
+
+CASES = {"csv_old": old_csv, "csv_new": new_csv, "xlsx_old": old_xlsx, "xlsx_new": new_xlsx}
+
+
+def _run_case(case: str, sqlite_path: str) -> None:
+    db = SQLitePool(load_settings())
+    db.open(sqlite_path)
+    started = time.perf_counter()
+    size = CASES[case](db)
+    elapsed = time.perf_counter() - started
+    db.close()
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{case:<10} {elapsed:>8.2f}s  peak RSS {peak_mib:>7.1f} MiB  output {size / 1024 / 1024:.1f} MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--case", choices=sorted(CASES))
+    parser.add_argument("--db")
+    args = parser.parse_args()
+    if args.case:
+        _run_case(args.case, args.db)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_path = str(Path(tmp) / "bench.db")
+        init_db(sqlite_path)
+        db = SQLitePool(load_settings())
+        db.open(sqlite_path)
+        _seed(db, args.rows)
+        db.close()
+        print(f"{args.rows} orders")
+        for case in CASES:
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_reports", "--case", case, "--db", sqlite_path],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Latency of GET /api/orders/search queries as the orders table grows.
+
+Compares a ``LIKE '%term%'`` scan over the searchable columns with the FTS5
+trigram index behind search_orders(), for rare and common terms and a phone
+fragment.
+
+Run from pixel-backend/:  python -m benchmarks.bench_search [--sizes 10000,100000,500000]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from app.config import load_settings
+from app.db import init_db
+from app.pool import SQLitePool
+from app.search import build_match_query, search_orders
+
+FIRST = ["Иван", "Мария", "Пётр", "Анна", "Сергей", "Ольга", "Дмитрий", "Елена"]
+LAST = ["Петров", "Иванова", "Сидоров", "Кузнецова", "Смирнов", "Попова", "Волков", "Морозова"]
+MODELS = ["iPhone 13", "iPhone 15 Pro", "Pixel 8", "Galaxy S24", "Redmi Note 12", "MacBook Air", "iPad 9"]
+RARE_NAME = "Зинаида Ферапонтова"
+PROBLEMS = ["Разбит экран", "Не заряжается", "Не включается", "Попала вода", "Не работает динамик"]
+
+LIKE_QUERY = """
+    SELECT id, number, client_name, model FROM orders
+    WHERE number LIKE ?1 OR client_name LIKE ?1 OR client_phone LIKE ?1 OR model LIKE ?1
+        OR problem_description LIKE ?1
+    ORDER BY id DESC LIMIT 20
+"""
+
+
+def _grow(db: SQLitePool, start_id: int, count: int) -> None:
+    rng = random.Random(start_id)
+    rows = [
+        (
+            f"PIX-2026{1 + idx // 50000 % 12:02d}-{idx % 50000:05d}",
+            RARE_NAME if idx == start_id + count // 2 else f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+            f"+7999{rng.randint(0, 9_999_999):07d}",
+            rng.choice(MODELS),
+            rng.choice(PROBLEMS),
+        )
+        for idx in range(start_id, start_id + count)
+    ]
+    with db.writer() as conn:
+        conn.executemany(
+            """
+            INSERT INTO orders(number, branch_id, client_name, client_phone, client_telegram, device_type,
+                               model, problem_description)
+            VALUES(?, 1, ?, ?, '1', 'Смартфон', ?, ?)
+            """,
+            rows,
+        )
+
+
+def _time(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,500000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    sizes = sorted(int(x) for x in args.sizes.split(","))
+
+    queries = {
+        "rare name": "Ферапонтова",
+        "common name": "Иван",
+        "phone fragment": "123-45",
+        "number fragment": "202603-00042",
+        "common model": "iphone",
+    }
+    columns = ["id", "number", "client_name", "model"]
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_path = str(Path(tmp) / "bench.db")
+        init_db(sqlite_path)
+        db = SQLitePool(load_settings())
+        db.open(sqlite_path)
+        loaded = 0
+        print(f"{'orders':>8}  {'query':<16} {'LIKE scan':>10} {'fts rank':>10} {'fts recent':>11}")
+        for size in sizes:
+            _grow(db, loaded, size - loaded)
+            loaded = size
+            with db.reader() as conn:
+                for label, q in queries.items():
+                    match = build_match_query(q)
+                    like = f"%{q.split()[0]}%"
+                    scan = _time(lambda: conn.execute(LIKE_QUERY, (like,)).fetchall(), max(1, args.repeat // 4))
+                    ranked = _time(lambda: search_orders(conn, match, columns, limit=20, offset=0), args.repeat)
+                    recent = _time(
+                        lambda: search_orders(conn, match, columns, limit=20, offset=0, sort="recent"), args.repeat
+                    )
+                    print(f"{size:>8}  {label:<16} {scan:>8.2f}ms {ranked:>8.2f}ms {recent:>9.2f}ms")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,24 @@
 from __future__ import annotations
 
+import asyncio
+import csv
+import io
+import random
+import threading
+import time
+import tracemalloc
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 from pathlib import Path
 
 from fastapi.testclient import TestClient
+from openpyxl import load_workbook
 
+from app import db as db_module
 from app import main as main_module
+from app.reports import ReportFilters, iter_csv
 
 
 def _client(tmp_path: Path) -> TestClient:
@@ -15,8 +29,35 @@ def _client(tmp_path: Path) -> TestClient:
     return TestClient(main_module.app)
 
 
+def _skip_intake(monkeypatch) -> None:
+    """Answer new orders' intake with nothing, so tests never reach integration-service."""
+
+    async def fake_intake(payload, idempotency_key=None):
+        return None
+
+    monkeypatch.setattr(main_module.integration_client, "create_intake", fake_intake)
+
+
+def _order_payload(**fields: object) -> dict:
+    return {
+        "branch_id": 1,
+        "client_name": "Иван",
+        "client_phone": "+79990000000",
+        "client_telegram": "123",
+        "device_type": "Смартфон",
+        "problem_description": "Не включается",
+        **fields,
+    }
+
+
+def _create_order(client: TestClient, **fields: object) -> dict:
+    resp = client.post("/api/orders", headers={"X-Bot-Token": "test-token"}, json=_order_payload(**fields))
+    assert resp.status_code == 200
+    return resp.json()
+
+
 def test_orders_lifecycle(monkeypatch, tmp_path: Path):
-    async def fake_intake(payload):
+    async def fake_intake(payload, idempotency_key=None):
         return {"zammad_ticket_number": "20001", "erpnext_issue": None}
 
     monkeypatch.setattr(main_module.integration_client, "create_intake", fake_intake)
@@ -39,13 +80,665 @@ def test_orders_lifecycle(monkeypatch, tmp_path: Path):
     assert create.status_code == 200
     number = create.json()["number"]
     assert number.startswith("PIX-")
-    assert create.json()["zammad_ticket_number"] == "20001"
+    assert create.json()["zammad_ticket_number"] is None
+
+    assert asyncio.run(main_module.outbox_dispatcher.dispatch_once()) == 1
 
     get_one = client.get(f"/api/orders/{number}", headers=headers)
     assert get_one.status_code == 200
     assert get_one.json()["client_name"] == "Иван"
+    assert get_one.json()["zammad_ticket_number"] == "20001"
 
     list_resp = client.get("/api/orders", headers=headers, params={"client_telegram": "123"})
     assert list_resp.status_code == 200
     assert len(list_resp.json()) == 1
 
+
+def test_outbox_retries_failed_intake(monkeypatch, tmp_path: Path):
+    calls: list[str | None] = []
+
+    async def flaky_intake(payload, idempotency_key=None):
+        calls.append(idempotency_key)
+        if len(calls) == 1:
+            raise RuntimeError("zammad is down")
+        return {"zammad_ticket_number": "20002", "erpnext_issue": "ISS-1"}
+
+    monkeypatch.setattr(main_module.integration_client, "create_intake", flaky_intake)
+    monkeypatch.setattr(main_module.settings, "outbox_backoff_base", 0)
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+
+    create = _create_order(
+        client, branch_id=2, client_name="Пётр", device_type="Ноутбук", problem_description="Перегрев"
+    )
+    assert "pixel_integration_outbox_depth{status=\"pending\"} 1" in client.get("/metrics").text
+
+    asyncio.run(main_module.outbox_dispatcher.dispatch_once())
+    asyncio.run(main_module.outbox_dispatcher.dispatch_once())
+
+    order = client.get(f"/api/orders/{create['id']}", headers=headers).json()
+    assert order["zammad_ticket_number"] == "20002"
+    assert order["erpnext_issue"] == "ISS-1"
+    assert len(calls) == 2 and calls[0] == calls[1]
+    assert "pixel_integration_outbox_depth{status=\"pending\"} 0" in client.get("/metrics").text
+
+
+def test_outbox_waits_for_deferred_erp_issue(monkeypatch, tmp_path: Path):
+    # integration-service in INTAKE_DEFER_POST_PROCESSING mode: the first answer has no ERP issue
+    # yet, and a replay of the same key returns the finished response once post-processing is done.
+    keys: list[str | None] = []
+
+    async def deferred_intake(payload, idempotency_key=None):
+        keys.append(idempotency_key)
+        finished = len(keys) > 1
+        return {
+            "zammad_ticket_number": "20003",
+            "erpnext_issue": "ISS-2" if finished else None,
+            "job_id": 7,
+            "complete": finished,
+            "replayed": finished,
+        }
+
+    monkeypatch.setattr(main_module.integration_client, "create_intake", deferred_intake)
+    monkeypatch.setattr(main_module.settings, "outbox_backoff_base", 0)
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+
+    order_id = _create_order(client, client_name="Анна", device_type="Планшет")["id"]
+
+    asyncio.run(main_module.outbox_dispatcher.dispatch_once())
+    order = client.get(f"/api/orders/{order_id}", headers=headers).json()
+    assert order["zammad_ticket_number"] == "20003"
+    assert order["erpnext_issue"] is None
+    assert "pixel_integration_outbox_depth{status=\"pending\"} 1" in client.get("/metrics").text
+
+    asyncio.run(main_module.outbox_dispatcher.dispatch_once())
+    order = client.get(f"/api/orders/{order_id}", headers=headers).json()
+    assert order["erpnext_issue"] == "ISS-2"
+    assert len(keys) == 2 and keys[0] == keys[1]
+    assert "pixel_integration_outbox_depth{status=\"pending\"} 0" in client.get("/metrics").text
+
+
+def test_pool_connections_use_wal(tmp_path: Path):
+    _client(tmp_path)
+    with main_module.db.reader() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA query_only").fetchone()[0] == 1
+    with main_module.db.writer() as conn:
+        # FULL: a commit the writer acknowledged survives a power loss.
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+
+
+def test_order_numbers_unique_and_gap_free_under_concurrency(monkeypatch, tmp_path: Path):
+    _skip_intake(monkeypatch)
+    client = _client(tmp_path)
+
+    def create(_: int) -> str:
+        return _create_order(client, branch_id=3, client_name="Нагрузка", device_type="Планшет")["number"]
+
+    total = 2000
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        numbers = list(pool.map(create, range(total)))
+
+    assert len(set(numbers)) == total
+    assert sorted(int(n.rsplit("-", 1)[1]) for n in numbers) == list(range(1, total + 1))
+
+
+def test_order_sequence_rolls_over_by_month(monkeypatch, tmp_path: Path):
+    class FakeDatetime(datetime):
+        current = datetime(2026, 1, 31, 23, 59)
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.current
+
+    monkeypatch.setattr(db_module, "datetime", FakeDatetime)
+    _client(tmp_path)
+    with main_module.db.writer() as conn:
+        assert db_module.next_order_number(conn) == "PIX-202601-0001"
+        assert db_module.next_order_number(conn) == "PIX-202601-0002"
+        FakeDatetime.current = datetime(2026, 2, 1, 0, 0)
+        assert db_module.next_order_number(conn) == "PIX-202602-0001"
+
+
+def test_list_orders_keyset_pagination_and_projection(monkeypatch, tmp_path: Path):
+    _skip_intake(monkeypatch)
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+    for idx in range(5):
+        _create_order(client, branch_id=1 + idx % 2, client_name=f"Клиент {idx}", client_telegram="321")
+
+    first = client.get("/api/orders", headers=headers, params={"limit": 2, "fields": "number,status"})
+    assert first.status_code == 200
+    assert [set(item) for item in first.json()] == [{"id", "number", "status"}] * 2
+    cursor = first.headers["X-Next-After-Id"]
+
+    second = client.get("/api/orders", headers=headers, params={"limit": 2, "after_id": cursor})
+    assert [item["id"] for item in second.json()] == [3, 2]
+    assert "problem_description" in second.json()[0]
+
+    branch = client.get("/api/orders", headers=headers, params={"branch_id": 2, "status": "new"})
+    assert [item["id"] for item in branch.json()] == [4, 2]
+    assert "X-Next-After-Id" not in branch.headers
+
+    bad = client.get("/api/orders", headers=headers, params={"fields": "number,secret"})
+    assert bad.status_code == 422
+
+    # Callers that never pass a limit (the bot's "my orders") still get every match.
+    _seed_orders(60)
+    everything = client.get("/api/orders", headers=headers, params={"client_telegram": "1", "fields": "number"})
+    assert len(everything.json()) == 60
+    assert "X-Next-After-Id" not in everything.headers
+
+    with main_module.db.reader() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM orders WHERE client_telegram = ? AND id < ? ORDER BY id DESC LIMIT 50",
+            ("321", 10),
+        ).fetchall()
+    assert "idx_orders_client_telegram" in " ".join(row["detail"] for row in plan)
+
+
+def test_analytics_summary_matches_raw_query(tmp_path: Path):
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+    rng = random.Random(42)
+    base = datetime(2026, 3, 1)
+    with main_module.db.writer() as conn:
+        for idx in range(400):
+            created = base + timedelta(minutes=rng.randint(0, 60 * 24 * 20))
+            conn.execute(
+                """
+                INSERT INTO orders(number, status, created_at, branch_id, client_name, client_phone,
+                                   client_telegram, device_type, problem_description, price, cost)
+                VALUES(?, ?, ?, ?, 'A', '1', '1', 'Смартфон', 'x', ?, ?)
+                """,
+                (
+                    f"PIX-TEST-{idx:04d}",
+                    rng.choice(["new", "done"]),
+                    created.strftime("%Y-%m-%d %H:%M:%S"),
+                    rng.randint(1, 3),
+                    rng.randint(0, 50) * 100,
+                    rng.randint(0, 30) * 100,
+                ),
+            )
+        conn.execute("UPDATE orders SET price = price + 500, status = 'done' WHERE id % 7 = 0")
+        conn.execute("UPDATE orders SET created_at = datetime(created_at, '+1 day') WHERE id % 11 = 0")
+        conn.execute("DELETE FROM orders WHERE id % 13 = 0")
+
+    windows = [
+        (datetime(2026, 3, 2), datetime(2026, 3, 9, 23, 59, 59)),
+        (datetime(2026, 3, 2, 13, 30, 15, 500), datetime(2026, 3, 15, 8, 0)),
+        (datetime(2026, 3, 5, 1), datetime(2026, 3, 5, 22)),
+        (datetime(2026, 3, 5, 12), datetime(2026, 3, 6, 12)),
+        (datetime(2026, 3, 10), datetime(2026, 3, 3)),
+        (datetime(2026, 3, 4, 3, tzinfo=timezone(timedelta(hours=5))), datetime(2026, 3, 18, 20)),
+    ]
+    for _ in range(30):
+        start = base + timedelta(seconds=rng.randint(0, 60 * 60 * 24 * 21))
+        windows.append((start, start + timedelta(seconds=rng.randint(0, 60 * 60 * 24 * 10))))
+
+    for dt_from, dt_to in windows:
+        with main_module.db.reader() as conn:
+            expected = conn.execute(
+                """
+                SELECT COUNT(*) AS orders, COALESCE(SUM(price), 0) AS revenue, COALESCE(SUM(cost), 0) AS costs
+                FROM orders
+                WHERE datetime(created_at) BETWEEN datetime(?) AND datetime(?)
+                """,
+                (dt_from.isoformat(), dt_to.isoformat()),
+            ).fetchone()
+        resp = client.get(
+            "/api/analytics/summary",
+            headers=headers,
+            params={"date_from": dt_from.isoformat(), "date_to": dt_to.isoformat()},
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert (body["orders"], body["revenue"], body["costs"]) == (
+            expected["orders"],
+            expected["revenue"],
+            expected["costs"],
+        ), (dt_from, dt_to)
+
+
+def test_analytics_summary_is_exact_with_fractional_prices(tmp_path: Path):
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+    rng = random.Random(7)
+    base = datetime(2026, 3, 1)
+    with main_module.db.writer() as conn:
+        for idx in range(300):
+            conn.execute(
+                """
+                INSERT INTO orders(number, status, created_at, branch_id, client_name, client_phone,
+                                   client_telegram, device_type, problem_description, price, cost)
+                VALUES(?, ?, ?, ?, 'A', '1', '1', 'Смартфон', 'x', ?, ?)
+                """,
+                (
+                    f"PIX-FRAC-{idx:04d}",
+                    rng.choice(["new", "done"]),
+                    (base + timedelta(minutes=rng.randint(0, 60 * 24 * 10))).strftime("%Y-%m-%d %H:%M:%S"),
+                    rng.randint(1, 3),
+                    rng.randint(0, 500_000) / 100,
+                    rng.choice([0.1, 0.2, 0.3, 19.99, 333.33]),
+                ),
+            )
+        # Repeated edits subtract and re-add the same amounts on the same rollup rows.
+        for _ in range(20):
+            conn.execute(
+                "UPDATE orders SET price = round(price + 0.07, 2), cost = round(cost + 0.1, 2) WHERE id % 3 = 0"
+            )
+        conn.execute("UPDATE orders SET status = 'done' WHERE id % 3 = 0")
+        conn.execute("UPDATE orders SET created_at = datetime(created_at, '+1 day') WHERE id % 5 = 0")
+        conn.execute("DELETE FROM orders WHERE id % 7 = 0")
+
+    for first_day, last_day in [(2, 8), (1, 11), (4, 4)]:
+        dt_from, dt_to = datetime(2026, 3, first_day), datetime(2026, 3, last_day, 23, 59, 59)
+        with main_module.db.reader() as conn:
+            rows = conn.execute(
+                "SELECT price, cost FROM orders WHERE created_at BETWEEN ? AND ?",
+                (dt_from.strftime("%Y-%m-%d %H:%M:%S"), dt_to.strftime("%Y-%m-%d %H:%M:%S")),
+            ).fetchall()
+        body = client.get(
+            "/api/analytics/summary",
+            headers=headers,
+            params={"date_from": dt_from.isoformat(), "date_to": dt_to.isoformat()},
+        ).json()
+        assert body["orders"] == len(rows)
+        assert body["revenue"] == float(sum(Decimal(str(row["price"])) for row in rows))
+        assert body["costs"] == float(sum(Decimal(str(row["cost"])) for row in rows))
+
+
+def _seed_orders(count: int, *, start: datetime = datetime(2026, 4, 1)) -> None:
+    with main_module.db.writer() as conn:
+        conn.executemany(
+            """
+            INSERT INTO orders(number, status, created_at, branch_id, branch_name, client_name, client_phone,
+                               client_telegram, device_type, model, problem_description, price, cost)
+            VALUES(?, ?, ?, ?, 'Филиал', 'Клиент', '+79990000000', '1', 'Смартфон', 'Pixel 8', ?, 1000, 400)
+            """,
+            [
+                (
+                    f"PIX-SEED-{idx:06d}",
+                    "done" if idx % 2 else "new",
+                    (start + timedelta(hours=idx)).strftime("%Y-%m-%d %H:%M:%S"),
+                    1 + idx % 3,
+                    "Не включается после падения " * 4,
+                )
+                for idx in range(count)
+            ],
+        )
+
+
+def test_csv_report_streams_with_filters_and_gzip(tmp_path: Path):
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+    _seed_orders(48)
+
+    resp = client.get(
+        "/api/reports/csv",
+        headers=headers,
+        params={"date_from": "2026-04-01T00:00:00", "date_to": "2026-04-01T23:59:59", "branch_id": 1},
+    )
+    assert resp.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert len(rows) == 8
+    assert {row["created_at"][:10] for row in rows} == {"2026-04-01"}
+
+    gz = client.get(
+        "/api/reports/csv",
+        headers={**headers, "Accept-Encoding": "gzip"},
+        params={"status": "done"},
+    )
+    assert gz.headers["content-encoding"] == "gzip"
+    assert len(list(csv.DictReader(io.StringIO(gz.text)))) == 24
+
+    refused = client.get(
+        "/api/reports/csv",
+        headers={**headers, "Accept-Encoding": "gzip;q=0, identity"},
+        params={"status": "done"},
+    )
+    assert "content-encoding" not in refused.headers
+    assert len(list(csv.DictReader(io.StringIO(refused.text)))) == 24
+
+
+def test_report_export_does_not_hold_a_reader_between_batches(tmp_path: Path):
+    _client(tmp_path)
+    _seed_orders(50)
+
+    chunks = iter_csv(main_module.db, ReportFilters(), batch_size=10)
+    exported = next(chunks) + next(chunks)
+    # A paused download (slow client) must leave every pool reader available.
+    readers = [main_module.db._readers.get(timeout=1) for _ in main_module.db._all_readers]
+    for conn in readers:
+        main_module.db._readers.put(conn)
+    exported += b"".join(chunks)
+
+    rows = list(csv.DictReader(io.StringIO(exported.decode("utf-8"))))
+    assert [int(row["id"]) for row in rows] == list(range(50, 0, -1))
+
+
+def test_csv_report_memory_is_bounded_by_batch(tmp_path: Path):
+    _client(tmp_path)
+    _seed_orders(20000)
+    filters = ReportFilters()
+
+    tracemalloc.start()
+    total = 0
+    for chunk in iter_csv(main_module.db, filters, batch_size=200):
+        total += len(chunk)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert total > 5_000_000
+    # A 200-row batch is ~50 KB of CSV; the whole export is >5 MB.
+    assert peak < 1_000_000
+
+
+def test_xlsx_report_uses_filters(tmp_path: Path):
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+    _seed_orders(30)
+
+    resp = client.get("/api/reports/xlsx", headers=headers, params={"branch_id": 2, "status": "done"})
+    assert resp.status_code == 200
+    ws = load_workbook(io.BytesIO(resp.content), read_only=True)["orders"]
+    rows = list(ws.iter_rows(values_only=True))
+    assert rows[0][:3] == ("id", "number", "status")
+    assert len(rows) == 1 + 5
+    assert {row[2] for row in rows[1:]} == {"done"}
+
+
+def test_xlsx_report_writes_non_finite_numbers_as_text(tmp_path: Path):
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+    _seed_orders(2)
+    with main_module.db.writer() as conn:
+        conn.execute("UPDATE orders SET price = 1e999 WHERE id = 1")
+
+    resp = client.get("/api/reports/xlsx", headers=headers)
+    assert resp.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(resp.content)) as archive:
+        assert b"<v>inf</v>" not in archive.read("xl/worksheets/sheet1.xml")
+    ws = load_workbook(io.BytesIO(resp.content), read_only=True)["orders"]
+    prices = {row[0]: row[10] for row in ws.iter_rows(min_row=2, values_only=True)}
+    assert prices == {2: 1000, 1: "inf"}
+
+
+def test_branches_public_etag_revalidation(tmp_path: Path):
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+
+    first = client.get("/api/branches/public", headers=headers)
+    assert first.status_code == 200
+    assert len(first.json()) == 3
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"].endswith("GMT")
+
+    cached = client.get("/api/branches/public", headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    with main_module.db.writer() as conn:
+        conn.execute("UPDATE branches SET schedule = '08:00-22:00' WHERE id = 1")
+
+    changed = client.get("/api/branches/public", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()[0]["schedule"] == "08:00-22:00"
+
+
+def test_pool_runs_queries_off_the_event_loop(tmp_path: Path):
+    _client(tmp_path)
+
+    def thread_name(conn) -> str:
+        conn.execute("SELECT 1").fetchone()
+        return threading.current_thread().name
+
+    async def scenario() -> tuple[str, str]:
+        return await main_module.db.read(thread_name), await main_module.db.write(thread_name)
+
+    read_thread, write_thread = asyncio.run(scenario())
+    assert read_thread.startswith("sqlite") and write_thread.startswith("sqlite")
+    assert read_thread != threading.current_thread().name
+
+
+def test_group_commit_batches_writes_and_isolates_failures(tmp_path: Path):
+    _client(tmp_path)
+    pool = main_module.db
+
+    def insert(conn, idx: int) -> int:
+        if idx == 7:
+            conn.execute("INSERT INTO support_staff(telegram_id, name) VALUES(?, 'doomed')", (idx,))
+            raise ValueError("boom")
+        conn.execute("INSERT INTO support_staff(telegram_id, name) VALUES(?, ?)", (idx, f"staff {idx}"))
+        return idx
+
+    async def scenario() -> list[object]:
+        # Hold the writer while all 300 writes queue up, as under a burst of requests.
+        with pool._write_lock:
+            tasks = [asyncio.ensure_future(pool.write(insert, idx)) for idx in range(300)]
+            await asyncio.sleep(0)
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    batches_before, ops_before = pool.write_batches, pool.write_ops
+    results = asyncio.run(scenario())
+
+    assert isinstance(results[7], ValueError)
+    assert [r for i, r in enumerate(results) if i != 7] == [i for i in range(300) if i != 7]
+    with pool.reader() as conn:
+        names = {row["telegram_id"]: row["name"] for row in conn.execute("SELECT * FROM support_staff")}
+    assert len(names) == 299 and 7 not in names
+    assert pool.write_ops - ops_before == 300
+    # Queued writes share transactions of up to SQLITE_WRITE_BATCH_SIZE operations.
+    assert pool.write_batches - batches_before <= 2 + 300 // main_module.settings.sqlite_write_batch_size
+
+
+def test_search_orders_by_substring_phone_and_pagination(monkeypatch, tmp_path: Path):
+    _skip_intake(monkeypatch)
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+    for idx, (name, phone, model) in enumerate(
+        [
+            ("Иван Петров", "+7 (999) 123-45-67", "iPhone 13"),
+            ("Мария Иванова", "+79990000001", "Pixel 8"),
+            ("Пётр Сидоров", "+79990000002", "iPhone 15 Pro"),
+        ]
+    ):
+        problem = "Разбит экран" if idx != 1 else "Не заряжается"
+        _create_order(client, client_name=name, client_phone=phone, model=model, problem_description=problem)
+
+    def search(**params):
+        return client.get("/api/orders/search", headers=headers, params=params)
+
+    assert {o["client_name"] for o in search(q="иван").json()} == {"Иван Петров", "Мария Иванова"}
+    assert [o["model"] for o in search(q="1234567").json()] == ["iPhone 13"]
+    assert [o["model"] for o in search(q="123-45-67").json()] == ["iPhone 13"]
+    assert [o["client_name"] for o in search(q="iphone экран", sort="recent").json()] == ["Пётр Сидоров", "Иван Петров"]
+
+    page = search(q="экран", limit=1, sort="recent")
+    assert page.headers["X-Next-Offset"] == "1"
+    last = search(q="экран", limit=1, offset=1, sort="recent")
+    assert [o["client_name"] for o in last.json()] == ["Иван Петров"]
+    assert "X-Next-Offset" not in last.headers
+
+    assert search(q="ab").status_code == 422
+    assert search(q="экран", offset=2000).status_code == 422
+    assert search(q="экран", offset=2000, sort="recent").json() == []
+
+    client.post("/api/orders/2/update", headers=headers, json={"status": "done"})
+    with main_module.db.writer() as conn:
+        conn.execute("UPDATE orders SET model = 'Galaxy S24' WHERE id = 2")
+    assert search(q="pixel").json() == []
+    assert [o["id"] for o in search(q="galaxy").json()] == [2]
+
+
+def test_order_change_feed_and_long_poll(monkeypatch, tmp_path: Path):
+    _skip_intake(monkeypatch)
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+    for idx in range(3):
+        _create_order(client, client_name=f"Клиент {idx}", client_telegram=str(idx))
+
+    def changes(**params):
+        resp = client.get("/api/orders/changes", headers=headers, params=params)
+        assert resp.status_code == 200
+        return resp.json()
+
+    first = changes(since=0, limit=2)
+    assert [o["id"] for o in first["items"]] == [1, 2]
+    assert first["has_more"] is True
+    rest = changes(since=first["next_since"])
+    assert [o["id"] for o in rest["items"]] == [3]
+    assert rest["has_more"] is False
+    cursor = rest["next_since"]
+    assert changes(since=cursor)["items"] == []
+
+    client.post("/api/orders/1/update", headers=headers, json={"status": "done"})
+    updated = changes(since=cursor)
+    assert [(o["id"], o["status"]) for o in updated["items"]] == [(1, "done")]
+    assert updated["next_since"] > cursor
+    cursor = updated["next_since"]
+
+    def late_update():
+        time.sleep(0.3)
+        main_module.db.submit_write(
+            lambda conn: conn.execute("UPDATE orders SET price = 1500 WHERE id = 2")
+        ).result()
+
+    worker = threading.Thread(target=late_update)
+    started = time.monotonic()
+    worker.start()
+    polled = changes(since=cursor, wait=10)
+    worker.join()
+    assert [(o["id"], o["price"]) for o in polled["items"]] == [(2, 1500)]
+    assert time.monotonic() - started < 5
+
+    started = time.monotonic()
+    assert changes(since=polled["next_since"], wait=0.2)["items"] == []
+    assert time.monotonic() - started >= 0.2
+
+
+def test_status_change_queues_customer_notification(monkeypatch, tmp_path: Path):
+    _skip_intake(monkeypatch)
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+    for telegram in ("555001", "@not_a_chat_id"):
+        _create_order(client, client_telegram=telegram)
+
+    def claim(**params):
+        resp = client.post("/api/notifications/claim", headers=headers, params=params)
+        assert resp.status_code == 200
+        return resp.json()
+
+    client.post("/api/orders/1/update", headers=headers, json={"price": 1000})
+    client.post("/api/orders/2/update", headers=headers, json={"status": "in_work"})
+    assert claim() == []
+
+    client.post("/api/orders/1/update", headers=headers, json={"status": "in_work"})
+    client.post("/api/orders/1/update", headers=headers, json={"status": "in_work", "cost": 10})
+    first = claim()
+    assert [(n["chat_id"], n["payload"]["old_status"], n["payload"]["status"], n["attempts"]) for n in first] == [
+        (555001, "new", "in_work", 1),
+    ]
+    # Leased until acknowledged.
+    assert claim() == []
+
+    client.post("/api/orders/1/update", headers=headers, json={"status": "done"})
+    second = claim()
+    assert [(n["payload"]["old_status"], n["payload"]["status"]) for n in second] == [("in_work", "done")]
+    ack = client.post(
+        "/api/notifications/ack",
+        headers=headers,
+        json={
+            "failed": [
+                {"id": first[0]["id"], "error": "Too Many Requests", "retry_after": 0},
+                {"id": second[0]["id"], "error": "Too Many Requests", "retry_after": 0},
+            ]
+        },
+    )
+    assert ack.json() == {"sent": 0, "failed": 2}
+    # The in_work message was superseded by "done", so only "done" is retried.
+    retried = claim()
+    assert [(n["id"], n["attempts"]) for n in retried] == [(second[0]["id"], 2)]
+
+    client.post(
+        "/api/notifications/ack",
+        headers=headers,
+        json={"failed": [{"id": second[0]["id"], "error": "Forbidden: bot was blocked", "permanent": True}]},
+    )
+    metrics = client.get("/metrics").text
+    assert 'pixel_order_notifications_depth{status="dead"} 1' in metrics
+    assert 'pixel_order_notifications_depth{status="pending"} 0' in metrics
+
+
+def test_notification_lease_counts_as_an_attempt(monkeypatch, tmp_path: Path):
+    _skip_intake(monkeypatch)
+    monkeypatch.setattr(main_module.settings, "notification_lease_seconds", 0)
+    monkeypatch.setattr(main_module.settings, "notification_max_attempts", 2)
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+    _create_order(client, client_telegram="555002")
+    client.post("/api/orders/1/update", headers=headers, json={"status": "in_work"})
+
+    # A consumer that crashes on the message never acknowledges it; each lease still counts.
+    for attempt in (1, 2):
+        claimed = client.post("/api/notifications/claim", headers=headers).json()
+        assert [n["attempts"] for n in claimed] == [attempt]
+    assert client.post("/api/notifications/claim", headers=headers).json() == []
+    assert 'pixel_order_notifications_depth{status="dead"} 1' in client.get("/metrics").text
+
+
+def test_support_tickets_persist_and_claims_conflict(tmp_path: Path):
+    client = _client(tmp_path)
+    headers = {"X-Bot-Token": "test-token"}
+    ids = []
+    for idx in range(3):
+        resp = client.post(
+            "/api/support-tickets",
+            headers=headers,
+            json={"user_id": 1000 + idx, "user_name": f"Клиент {idx}", "text": "Где мой телефон?"},
+        )
+        assert resp.status_code == 200
+        assert resp.json()["status"] == "open"
+        ids.append(resp.json()["id"])
+
+    def update(ticket_id: int, **payload):
+        return client.post(f"/api/support-tickets/{ticket_id}/update", headers=headers, json=payload)
+
+    taken = update(ids[0], status="in_progress", assignee_id=77)
+    assert taken.status_code == 200
+    assert (taken.json()["status"], taken.json()["assignee_id"]) == ("in_progress", 77)
+    assert update(ids[0], assignee_id=88).status_code == 409
+    assert update(ids[0], assignee_id=77).status_code == 200
+    assert update(ids[1], status="closed").json()["status"] == "closed"
+    assert update(999, status="closed").status_code == 404
+
+    def listed(**params):
+        resp = client.get("/api/support-tickets", headers=headers, params=params)
+        assert resp.status_code == 200
+        return [t["id"] for t in resp.json()]
+
+    assert listed() == [ids[0], ids[2]]
+    assert listed(status="open") == [ids[2]]
+    assert listed(status="closed") == [ids[1]]
+    assert listed(assignee_id=77) == [ids[0]]
+    assert listed(limit=1) == [ids[0]]
+
+    for idx in range(25):
+        client.post("/api/support-tickets", headers=headers, json={"user_id": idx, "text": f"Вопрос {idx}"})
+    page = client.get("/api/support-tickets", headers=headers, params={"limit": 10, "offset": 20})
+    assert page.headers["X-Total-Count"] == "27"
+    assert len(page.json()) == 7
+    assert "X-Next-Offset" not in page.headers
+    first_page = client.get("/api/support-tickets", headers=headers, params={"limit": 10})
+    assert first_page.headers["X-Next-Offset"] == "10"
+    assert [t["id"] for t in first_page.json()][:2] == [ids[0], ids[2]]
+
+    # Tickets survive a restart of the service.
+    main_module.db.close()
+    main_module.startup()
+    one = client.get(f"/api/support-tickets/{ids[0]}", headers=headers)
+    assert one.json()["assignee_id"] == 77
+    assert client.get("/api/support-tickets/999", headers=headers).status_code == 404